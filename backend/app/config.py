@@ -9,6 +9,7 @@ class Settings(BaseSettings):
     algorithm: str
     access_token_expire_minutes: int
     gemini_api_key: str # Added for the Gemini API
+    max_upload_bytes: int = 10 * 1024 * 1024 # Largest accepted image upload
 
     class Config:
         env_file = ".env"
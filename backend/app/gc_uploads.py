@@ -0,0 +1,150 @@
+"""
+Removes uploaded image files that nothing refers to any more. Run it from
+the backend directory, e.g. nightly:
+
+    python -m app.gc_uploads --dry-run
+    python -m app.gc_uploads --grace-hours 24
+
+1. Recounts every StoredImage's `ref_count` from the journal_images rows
+   (rows also disappear through database cascades, e.g. when a user is
+   deleted, which do not decrement the count).
+2. Deletes StoredImage rows with no references and their files.
+3. Deletes files in the uploads directory that no row refers to: left-over
+   temporary uploads, and files of deleted journals from before
+   deduplication.
+4. Deletes cached thumbnail/medium variants of files that are gone.
+
+Files modified within the last `--grace-hours` are never deleted, so an
+upload that is being stored right now is not collected.
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from . import database, models
+from .services import image_variants, journal_images
+
+
+def _remove_if_old(path: str, cutoff: float, dry_run: bool) -> Optional[int]:
+    """
+    Deletes a file not modified since `cutoff` and returns its size (0 if it
+    is already gone), or None if it is recent and was kept.
+
+    The file is renamed away before its age is checked. An upload that moves
+    a new copy into place (os.replace, which refreshes the mtime) either
+    happened before the rename, so the copy is recent and is put back, or
+    happens after it, and the new copy is left alone.
+    """
+    if dry_run:
+        try:
+            return os.path.getsize(path) if os.path.getmtime(path) < cutoff else None
+        except FileNotFoundError:
+            return 0
+    claimed = f"{path}.gc-{uuid.uuid4().hex}"
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return 0
+    info = os.stat(claimed)
+    if info.st_mtime >= cutoff:
+        os.replace(claimed, path)  # Same content as any copy uploaded meanwhile
+        return None
+    os.remove(claimed)
+    return info.st_size
+
+
+def collect(grace_hours: float, dry_run: bool) -> dict:
+    cutoff = time.time() - grace_hours * 3600
+    cutoff_at = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    report = {"recounted": 0, "stored_deleted": 0, "orphan_files_deleted": 0, "bytes_freed": 0}
+
+    db = database.SessionLocal()
+    try:
+        # 1. Recount references.
+        report["recounted"] = db.execute(text("""
+            UPDATE stored_images s SET ref_count = counts.refs
+            FROM (
+                SELECT s2.content_hash, count(j.id) AS refs
+                FROM stored_images s2 LEFT JOIN journal_images j ON j.content_hash = s2.content_hash
+                GROUP BY s2.content_hash
+            ) counts
+            WHERE s.content_hash = counts.content_hash AND s.ref_count <> counts.refs
+        """)).rowcount
+        if not dry_run:
+            db.commit()  # A dry run keeps one transaction, rolled back when the session closes
+
+        # 2. Unreferenced stored files. Each row is locked and its conditions
+        # checked again (an upload may have referenced it since the query), so
+        # an upload of the same file blocks in journal_images.add_image until
+        # the row is deleted, and then inserts it again.
+        unreferenced = db.query(models.StoredImage.content_hash).filter(
+            models.StoredImage.ref_count == 0,
+            models.StoredImage.last_referenced_at < cutoff_at
+        ).all()
+        for (content_hash,) in unreferenced:
+            stored = db.query(models.StoredImage).filter(
+                models.StoredImage.content_hash == content_hash,
+                models.StoredImage.ref_count == 0,
+                models.StoredImage.last_referenced_at < cutoff_at
+            ).with_for_update(skip_locked=True).first()
+            if stored is None:
+                continue
+            freed = _remove_if_old(journal_images.upload_path(stored.file_path), cutoff, dry_run)
+            if freed is not None:
+                report["bytes_freed"] += freed
+                report["stored_deleted"] += 1
+                if not dry_run:
+                    db.delete(stored)
+            if not dry_run:
+                db.commit()
+
+        # 3. Files no row refers to.
+        referenced = {os.path.basename(path) for (path,) in db.query(models.StoredImage.file_path)}
+        referenced |= {os.path.basename(path) for (path,) in db.query(models.JournalImage.file_path)}
+    finally:
+        db.close()
+
+    for entry in os.scandir(journal_images.UPLOAD_DIR):
+        if entry.is_file() and entry.name not in referenced:
+            freed = _remove_if_old(entry.path, cutoff, dry_run)
+            if freed is not None:
+                report["bytes_freed"] += freed
+                report["orphan_files_deleted"] += 1
+
+    # 4. Variants are named <source file name>.<format>.
+    for variant in image_variants.VARIANT_SIZES:
+        variant_dir = os.path.join(image_variants.VARIANT_DIR, variant)
+        if not os.path.isdir(variant_dir):
+            continue
+        for entry in os.scandir(variant_dir):
+            source_name = entry.name.rsplit(".", 1)[0]
+            if entry.is_file() and source_name not in referenced:
+                freed = _remove_if_old(entry.path, cutoff, dry_run)
+                if freed is not None:
+                    report["bytes_freed"] += freed
+                    report["orphan_files_deleted"] += 1
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deletes uploaded image files that nothing refers to.")
+    parser.add_argument("--grace-hours", type=float, default=24.0,
+                        help="Never delete files changed more recently than this.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted.")
+    args = parser.parse_args()
+
+    report = collect(args.grace_hours, args.dry_run)
+    prefix = "GC (dry run)" if args.dry_run else "GC"
+    print(f"{prefix}: {report['recounted']} reference counts corrected, "
+          f"{report['stored_deleted']} unreferenced stored files and "
+          f"{report['orphan_files_deleted']} orphaned files deleted, "
+          f"{report['bytes_freed'] / (1024 * 1024):.1f} MB freed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from . import models
 from .database import engine
-from .routers import auth, journals, ai, progress, admin
+from .request_limits import BodySizeLimitMiddleware
+from .routers import auth, journals, ai, progress, admin, images
+from .services import grammar_precheck
+import gemini_api_client
 import os
 
 # This line creates the database tables.
@@ -11,6 +14,10 @@ models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
 
+# Oversized uploads are refused before their body is read. Added before CORS,
+# so CORS wraps it and the browser can read the 413.
+app.add_middleware(BodySizeLimitMiddleware)
+
 # --- CORS Middleware Configuration ---
 # This is the crucial part to fix the frontend connection errors.
 # It tells the browser that it's safe for your frontend to make requests to this backend.
@@ -43,6 +50,16 @@ os.makedirs(os.path.join(static_files_dir, "uploads"), exist_ok=True) # Ensure u
 app.mount("/static", StaticFiles(directory=static_files_dir), name="static")
 # --- End of Static Files Configuration ---
 
+@app.on_event("startup")
+def load_grammar_dictionary():
+    # The quick-correction pre-check's dictionary takes a moment to load; do it before serving.
+    grammar_precheck.load_dictionary()
+
+@app.on_event("shutdown")
+async def close_ai_client():
+    # Release the shared keep-alive pool used by the async AI calls.
+    await gemini_api_client.aclose_default_async_client()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the LingoJourn API!"}
@@ -54,3 +71,4 @@ app.include_router(journals.router)
 app.include_router(ai.router)
 app.include_router(progress.router)
 app.include_router(admin.router)
+app.include_router(images.router)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, TIMESTAMP, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey, TIMESTAMP, Enum, Boolean, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import text
@@ -51,6 +51,9 @@ class StudentWhitelist(Base):
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("timezone('utc', now())"))
 
 
+# session_state key holding the completion pipeline's progress.
+COMPLETION_STATE_KEY = "completion"
+
 class Journal(Base):
     __tablename__ = "journals"
     id = Column(Integer, primary_key=True, index=True)
@@ -72,6 +75,11 @@ class Journal(Base):
     chat_messages = relationship("ChatMessage", back_populates="journal", cascade="all, delete-orphan", order_by="ChatMessage.timestamp")
     images = relationship("JournalImage", back_populates="journal", cascade="all, delete-orphan", order_by="JournalImage.id") # New relationship
 
+    @property
+    def completion_status(self):
+        """Progress of the background completion pipeline (see services/completion_pipeline.py), if it ran."""
+        return (self.session_state or {}).get(COMPLETION_STATE_KEY)
+
 # --- NEW Journal Image Model ---
 class JournalImage(Base):
     __tablename__ = "journal_images"
@@ -80,11 +88,27 @@ class JournalImage(Base):
     file_path = Column(String(512), nullable=False)
     ai_description = Column(Text, nullable=True)
     user_caption = Column(Text, nullable=True) # New field for user's caption
+    description_status = Column(String(20), server_default='done', nullable=False) # pending, done, failed (see services/journal_images.py)
+    content_hash = Column(String(64), ForeignKey("stored_images.content_hash"), nullable=True, index=True) # None for uploads from before deduplication
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("timezone('utc', now())"))
 
     journal = relationship("Journal", back_populates="images")
 
 
+# --- Content-Addressed Upload Storage ---
+# One row per distinct uploaded file; the same photo uploaded twice shares
+# the file and its description. See services/journal_images.py and gc_uploads.py.
+class StoredImage(Base):
+    __tablename__ = "stored_images"
+    content_hash = Column(String(64), primary_key=True) # SHA-256 of the file
+    file_path = Column(String(512), nullable=False) # URL path, as in JournalImage.file_path
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False) # JournalImage rows using the file (recounted by gc_uploads)
+    ai_description = Column(Text, nullable=True) # Reused for later uploads of the same file
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    last_referenced_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
     id = Column(Integer, primary_key=True, index=True)
@@ -147,3 +171,26 @@ class UserLearningHistory(Base):
     learning_point_id = Column(Integer, ForeignKey("learning_points.id"), nullable=False)
     timestamp = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("timezone('utc', now())"))
     error_instance = relationship("UserError", back_populates="history")
+
+
+# --- Background Job Queue (see services/job_queue.py) ---
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    status = Column(String(20), default='queued', nullable=False) # queued, running, done, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    # Compared against now() when claiming, so stored as a real timestamptz rather than timezone('utc', now()).
+    run_after = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("now()"))
+    locked_until = Column(TIMESTAMP(timezone=True), nullable=True) # Visibility timeout of a running job
+    locked_by = Column(String(100), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("timezone('utc', now())"))
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_claim", "status", "run_after"),
+    )
@@ -0,0 +1,164 @@
+"""
+Rebuilds every user's context profile, e.g. nightly or after a change to the
+context agent's prompts. Run it from the backend directory:
+
+    python -m app.reprofile --concurrency 4 --rate-limit 120
+
+Each user's profile is rebuilt from their latest completed journal (the
+profile reflects the most recent entry, see context_agent.process_journal).
+Journals are streamed with a server-side cursor in user order and analyzed by
+a bounded thread pool; `--rate-limit` caps the upstream calls per minute of
+the whole process.
+
+Progress is checkpointed to `--checkpoint` after every journal. Running the
+command again resumes after the last user whose journal (and every earlier
+one) is done; `--restart` starts over. Throughput is reported in journals
+per minute.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import gemini_api_client
+from sqlalchemy import func
+
+from . import database, models
+from .services import context_agent
+
+DEFAULT_CHECKPOINT = "reprofile.checkpoint.json"
+PROGRESS_EVERY = 25  # Print throughput after this many journals
+
+
+def _latest_completed_journals(db, after_user_id: int):
+    """(journal_id, user_id) of each user's latest completed journal, in user order, streamed."""
+    latest = db.query(
+        models.Journal.user_id,
+        func.max(models.Journal.journal_date).label("journal_date")
+    ).filter(
+        models.Journal.writing_phase == models.JournalPhase.completed,
+        models.Journal.user_id > after_user_id
+    ).group_by(models.Journal.user_id).subquery()
+
+    return db.query(models.Journal.id, models.Journal.user_id).join(
+        latest, (models.Journal.user_id == latest.c.user_id) & (models.Journal.journal_date == latest.c.journal_date)
+    ).order_by(models.Journal.user_id).yield_per(100)
+
+
+class Checkpoint:
+    """
+    Resumable progress of a run, saved as JSON. `last_user_id` only advances
+    past users whose journals, and all earlier users' journals, are finished,
+    so journals still running when the command stops are redone on resume.
+    """
+
+    def __init__(self, path: str, data: dict):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._last_submitted = data["last_user_id"]
+
+    @classmethod
+    def load(cls, path: str, restart: bool) -> "Checkpoint":
+        if not restart and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f))
+        return cls(path, {
+            "started_at": datetime.utcnow().isoformat(),
+            "last_user_id": 0,
+            "processed": 0,
+            "failed": 0,
+            "failed_journal_ids": [],
+            "elapsed_seconds": 0.0,
+        })
+
+    def submitted(self, user_id: int) -> None:
+        with self._lock:
+            self._in_flight.add(user_id)
+            self._last_submitted = user_id
+
+    def finished(self, user_id: int, journal_id: int, ok: bool, elapsed: float) -> None:
+        with self._lock:
+            self._in_flight.discard(user_id)
+            self.data["processed"] += 1
+            if not ok:
+                self.data["failed"] += 1
+                self.data["failed_journal_ids"].append(journal_id)
+            self.data["last_user_id"] = min(self._in_flight) - 1 if self._in_flight else self._last_submitted
+            self.data["elapsed_seconds"] = elapsed
+            self._save()
+
+    def _save(self) -> None:
+        # Write-then-rename, so a crash mid-write never leaves a corrupt checkpoint.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def reprofile(concurrency: int, checkpoint: Checkpoint) -> None:
+    done_before = checkpoint.data["processed"]
+    elapsed_before = checkpoint.data["elapsed_seconds"]
+    started = time.perf_counter()
+    # Bounds the journals queued for the pool, so the cursor is read as fast as they are analyzed.
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    def throughput() -> float:
+        minutes = (time.perf_counter() - started) / 60.0
+        return (checkpoint.data["processed"] - done_before) / minutes if minutes else 0.0
+
+    def analyze(journal_id: int, user_id: int) -> None:
+        try:
+            ok = context_agent.process_journal(journal_id, user_id)
+        except Exception as e:
+            print(f"Reprofile: journal {journal_id} failed: {e}")
+            ok = False
+        finally:
+            slots.release()
+        checkpoint.finished(user_id, journal_id, ok, elapsed_before + time.perf_counter() - started)
+        if checkpoint.data["processed"] % PROGRESS_EVERY == 0:
+            print(f"Reprofile: {checkpoint.data['processed']} journals "
+                  f"({checkpoint.data['failed']} failed), {throughput():.1f} journals/min")
+
+    db = database.SessionLocal()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reprofile") as pool:
+            for journal_id, user_id in _latest_completed_journals(db, checkpoint.data["last_user_id"]):
+                slots.acquire()
+                checkpoint.submitted(user_id)
+                pool.submit(analyze, journal_id, user_id)
+    finally:
+        db.close()
+
+    processed = checkpoint.data["processed"] - done_before
+    print(f"Reprofile: done, {processed} journals in {time.perf_counter() - started:.1f}s "
+          f"({throughput():.1f} journals/min), {checkpoint.data['failed']} failed in total.")
+    for name, stage in context_agent.get_context_agent_stats()["stages"].items():
+        print(f"  stage {name}: avg {stage['avg_seconds']:.2f}s, max {stage['max_seconds']:.2f}s, "
+              f"{stage['failures']} failures")
+    print(f"  upstream rate limit: {gemini_api_client.get_rate_limit_stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuilds all users' context profiles from their latest completed journal.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Journals analyzed at the same time.")
+    parser.add_argument("--rate-limit", type=float, default=120.0,
+                        help="Max upstream model calls per minute for the whole run (0 for no limit).")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first user.")
+    args = parser.parse_args()
+
+    gemini_api_client.configure_rate_limit(args.rate_limit)
+    checkpoint = Checkpoint.load(args.checkpoint, args.restart)
+    if checkpoint.data["last_user_id"]:
+        print(f"Reprofile: resuming after user {checkpoint.data['last_user_id']} "
+              f"({checkpoint.data['processed']} journals already done).")
+    reprofile(max(1, args.concurrency), checkpoint)
+
+
+if __name__ == "__main__":
+    main()
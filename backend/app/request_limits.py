@@ -0,0 +1,59 @@
+"""
+Request body size limit, enforced before the body is read.
+
+FastAPI parses a multipart form (spooling its files to disk) before the
+route's dependencies or handler run, so a size check in the upload route
+only happens after the whole body has arrived. `BodySizeLimitMiddleware`
+answers 413 straight away when Content-Length is over the limit, and stops
+a chunked body (no Content-Length) as soon as more than the limit has been
+received. journal_images.save_upload still checks the exact file size.
+"""
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from .config import settings
+
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Boundaries and part headers around the uploaded file
+
+
+def _too_large_detail() -> str:
+    return f"Images can be at most {settings.max_upload_bytes // (1024 * 1024)} MB."
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies larger than `max_bytes` (default: the largest image
+    upload plus its multipart framing). A pure ASGI middleware, so streamed
+    (SSE) responses and WebSockets pass through untouched.
+    """
+
+    def __init__(self, app, max_bytes: Optional[int] = None):
+        self.app = app
+        self.max_bytes = settings.max_upload_bytes + MULTIPART_OVERHEAD_BYTES if max_bytes is None else max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": _too_large_detail()}, status_code=status.HTTP_413_CONTENT_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes a 413 response.
+                    raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=_too_large_detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
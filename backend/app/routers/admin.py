@@ -3,8 +3,10 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, cast, Date as SQLDate
 from typing import List
 from datetime import date, timedelta
+import gemini_api_client
 
 from .. import database, schemas, models, security
+from ..services import chat_history, grammar_precheck, image_preprocess, job_queue, paragraph_feedback, prompt_builder
 
 router = APIRouter(
     prefix="/api/admin",
@@ -205,3 +207,40 @@ def remove_student_from_whitelist(student_id: str, db: Session = Depends(databas
     db.delete(student_to_delete)
     db.commit()
     return 
+
+# --- AI Client Monitoring ---
+@router.get("/ai-client/stats", response_model=schemas.AIClientStats)
+def get_ai_client_stats():
+    """
+    Returns this worker's AI client counters, one section per component:
+    - cache, coalescing: proxy requests saved by the response cache and by sharing in-flight requests
+    - models: circuit breaker state and adaptive concurrency limit per model
+    - endpoints: load and health of each proxy endpoint
+    - hedging: hedged requests sent, and latency before and after hedging
+    - chat_history: history length before and after compaction in scaffolding prompts
+    - prompts: estimated prompt size and trimming per AI call site
+    - grammar_precheck: quick corrections answered without the model
+    - paragraph_feedback: evaluation paragraphs served from the cache
+    - image_preprocess: image bytes saved on vision calls
+    """
+    return {
+        "cache": gemini_api_client.get_cache_stats(),
+        "coalescing": gemini_api_client.get_coalescing_stats(),
+        "models": gemini_api_client.get_resilience_stats(),
+        "endpoints": gemini_api_client.get_endpoint_stats(),
+        "hedging": gemini_api_client.get_hedging_stats(),
+        "chat_history": chat_history.get_history_compaction_stats(),
+        "prompts": prompt_builder.get_prompt_stats(),
+        "grammar_precheck": grammar_precheck.get_precheck_stats(),
+        "paragraph_feedback": paragraph_feedback.get_paragraph_feedback_stats(),
+        "image_preprocess": image_preprocess.get_image_preprocess_stats(),
+    }
+
+@router.get("/jobs/stats", response_model=schemas.JobQueueStats)
+def get_job_queue_stats(db: Session = Depends(database.get_db)):
+    """
+    Returns the background job queue's counts per kind and status, and how
+    long the oldest due job has been waiting (a growing value means the
+    workers are not keeping up, or none are running).
+    """
+    return job_queue.get_queue_stats(db)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import date, datetime
 from sqlalchemy.orm import joinedload
+from typing import List, Optional, Union
+from pydantic import ValidationError
+import asyncio
 import json
 import aiofiles
 
 from .. import schemas, security, models, database
-from ..services import ai_service
+from ..services import ai_service, chat_history, image_preprocess, paragraph_feedback
+from ..services.journal_delta import DeltaCursor, get_delta_cursor, build_journal_delta
 
 router = APIRouter(
     prefix="/api/ai",
@@ -15,18 +21,9 @@ router = APIRouter(
 
 # Define the chat turn limit as a constant
 MAX_CHAT_TURNS = 40
+DEFAULT_AI_REPLY = "I'm not sure how to respond to that."
 
-@router.post("/feedback/{journal_date}", response_model=schemas.AIFeedbackResponse)
-def get_and_save_ai_feedback(
-    journal_date: date,
-    request: schemas.AIFeedbackRequest,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(security.get_current_user)
-):
-    """
-    Analyzes a journal entry's content for the 'evaluation' phase, returns structured AI feedback,
-    and saves any learning points derived from the feedback to the database.
-    """
+def _load_feedback_cache(db: Session, current_user: models.User, journal_date: date):
     journal = db.query(models.Journal).filter(
         models.Journal.user_id == current_user.id,
         models.Journal.journal_date == journal_date
@@ -37,14 +34,11 @@ def get_and_save_ai_feedback(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Journal entry for date {journal_date} not found."
         )
+    return journal, dict((journal.session_state or {}).get(paragraph_feedback.SESSION_STATE_KEY) or {})
 
-    feedback_data = ai_service.get_evaluation_feedback(request.text)
-
-    if not feedback_data or "feedback_items" not in feedback_data:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The AI service is currently unavailable or returned invalid data."
-        )
+def _save_feedback(db: Session, journal: models.Journal, current_user: models.User, cache: dict, feedback_data: dict) -> None:
+    journal.session_state = {**(journal.session_state or {}), paragraph_feedback.SESSION_STATE_KEY: cache}
+    db.commit()
 
     # Save learning points logic
     for item_data in feedback_data["feedback_items"]:
@@ -97,19 +91,48 @@ def get_and_save_ai_feedback(
         db.add(history_record)
         db.commit()
 
-    return feedback_data
-
-@router.post("/chat/{journal_date}", response_model=schemas.JournalOut)
-async def chat_with_ai(
+@router.post("/feedback/{journal_date}", response_model=schemas.AIFeedbackResponse)
+async def get_and_save_ai_feedback(
     journal_date: date,
-    request: schemas.AIChatRequest,
+    request: schemas.AIFeedbackRequest,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(security.get_current_user)
 ):
     """
-    Handles a real-time conversation turn with the AI, including image captions.
-    Optionally provides a quick correction if requested.
-    Returns the entire updated journal object to prevent race conditions.
+    Analyzes a journal entry's content for the 'evaluation' phase, returns structured AI feedback,
+    and saves any learning points derived from the feedback to the database.
+
+    Each paragraph is evaluated separately and cached by its content, so after
+    an edit only the changed paragraphs go to the model; the paragraph results
+    are merged into one response of at most 7 non-overlapping items. If only
+    some paragraphs could be evaluated, the response is marked `partial`; a
+    draft with no text gets an empty result.
+    """
+    journal, cache = await run_in_threadpool(_load_feedback_cache, db, current_user, journal_date)
+
+    results, cache = await paragraph_feedback.evaluate_paragraphs(request.text, cache)
+    succeeded = [result for result in results if result is not None]
+    if results and not succeeded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The AI service is currently unavailable or returned invalid data."
+        )
+    feedback_data = paragraph_feedback.merge_feedback(succeeded)
+    feedback_data["partial"] = len(succeeded) < len(results)
+
+    await run_in_threadpool(_save_feedback, db, journal, current_user, cache, feedback_data)
+    return feedback_data
+
+def _load_chat_turn(
+    db: Session,
+    current_user: models.User,
+    journal_date: date,
+    request: schemas.AIChatRequest
+) -> dict:
+    """
+    Blocking half of a chat turn, run in the threadpool: loads the journal,
+    enforces the turn limit, stages the user's message and snapshots everything
+    the AI calls need as plain data so the event loop never touches the session.
     """
     journal = db.query(models.Journal).options(
         joinedload(models.Journal.chat_messages).joinedload(models.ChatMessage.image), # Eager load image data
@@ -140,8 +163,7 @@ async def chat_with_ai(
     }
 
     image_for_context = None
-    image_bytes_for_api = None # Variable to hold image data for AI
-    
+
     if request.image_id:
         image = db.query(models.JournalImage).filter(
             models.JournalImage.id == request.image_id, 
@@ -153,15 +175,6 @@ async def chat_with_ai(
             user_message_params["image_id"] = request.image_id
             user_message_params["message_type"] = models.MessageType.image
             image_for_context = image
-            
-            # Read image file bytes to pass to the AI
-            full_file_path = "app" + image.file_path
-            try:
-                async with aiofiles.open(full_file_path, 'rb') as f:
-                    image_bytes_for_api = await f.read()
-            except FileNotFoundError:
-                print(f"ERROR: Image file not found at {full_file_path}")
-                image_bytes_for_api = None
         else:
             user_message_params["message_type"] = models.MessageType.conversation
     else:
@@ -171,70 +184,500 @@ async def chat_with_ai(
     db.add(user_message)
 
     # 2. Build rich chat history for the AI prompt
-    temp_chat_history = []
-    for msg in journal.chat_messages:
-        content = f"{msg.sender.name}: {msg.message_text}"
-        if msg.message_type == models.MessageType.image and msg.image and msg.image.ai_description:
-             content += f" (related to image: {msg.image.ai_description})"
-        temp_chat_history.append(content)
+    temp_chat_history = [_history_line(msg) for msg in journal.chat_messages]
     
     temp_chat_history.append(f"user: {request.message}")
 
-    # 3. Get AI responses
-    ai_message_text = "I'm not sure how to respond to that."
-    if journal.writing_phase == models.JournalPhase.scaffolding:
-        session_state = {
-            "current_outline": journal.outline_content,
-            "chat_history": "\n".join(temp_chat_history),
-        }
-        if image_for_context:
-            session_state["image_description"] = image_for_context.ai_description
-            session_state["user_caption"] = image_for_context.user_caption
-
-        user_context = journal.owner.context_profile.profile_data if journal.owner.context_profile and journal.owner.context_profile.profile_data else {}
-        
-        ai_response = ai_service.get_scaffolding_response(user_context, session_state, image_bytes=image_bytes_for_api)
+    user_context = journal.owner.context_profile.profile_data if journal.owner.context_profile and journal.owner.context_profile.profile_data else {}
+
+    return {
+        "journal": journal,
+        "writing_phase": journal.writing_phase,
+        "outline_content": journal.outline_content,
+        "content": journal.content,
+        "chat_history": temp_chat_history,
+        "history_summary": (journal.session_state or {}).get(chat_history.SESSION_STATE_KEY),
+        "user_context": user_context,
+        # Read image file bytes later (asynchronously) to pass to the AI
+        "image_file_path": "app" + image_for_context.file_path if image_for_context else None,
+        "image_description": image_for_context.ai_description if image_for_context else None,
+        "user_caption": image_for_context.user_caption if image_for_context else None,
+    }
+
+def _history_line(msg: models.ChatMessage) -> str:
+    """How a stored chat message appears in the chat history given to the AI."""
+    content = f"{msg.sender.name}: {msg.message_text}"
+    if msg.message_type == models.MessageType.image and msg.image and msg.image.ai_description:
+        content += f" (related to image: {msg.image.ai_description})"
+    return content
+
+async def _read_image_bytes(full_file_path: str) -> Optional[bytes]:
+    """Reads an uploaded image and prepares it for the model (downscaled, without metadata)."""
+    try:
+        async with aiofiles.open(full_file_path, 'rb') as f:
+            image_bytes = await f.read()
+    except FileNotFoundError:
+        print(f"ERROR: Image file not found at {full_file_path}")
+        return None
+    return await run_in_threadpool(image_preprocess.prepare_for_model, image_bytes)
+
+async def _get_conversation_reply(turn: dict, request: schemas.AIChatRequest) -> dict:
+    """Runs the phase-specific model call (scaffolding or writing partner)."""
+    image_bytes_for_api = None # Variable to hold image data for AI
+    if turn["image_file_path"]:
+        image_bytes_for_api = await _read_image_bytes(turn["image_file_path"])
+
+    reply = {"ai_message_text": DEFAULT_AI_REPLY, "outline_addition": None}
+
+    if turn["writing_phase"] == models.JournalPhase.scaffolding:
+        # Recent messages verbatim, older ones via the running summary.
+        history = chat_history.compact_history(turn["chat_history"], turn["history_summary"])
+        session_state = {"current_outline": turn["outline_content"]}
+        if history.summary:
+            session_state["earlier_conversation_summary"] = history.summary
+        session_state["chat_history"] = "\n".join(history.verbatim)
+        if turn["image_file_path"]:
+            session_state["image_description"] = turn["image_description"]
+            session_state["user_caption"] = turn["user_caption"]
+        chat_history.record_history_sizes(turn["chat_history"], history)
+
+        scaffolding_call = ai_service.async_get_scaffolding_response(turn["user_context"], session_state, image_bytes=image_bytes_for_api)
+        if history.needs_summary:
+            # Not needed for this turn's prompt, so it runs alongside the reply.
+            ai_response, new_summary = await asyncio.gather(
+                scaffolding_call, ai_service.async_summarize_chat_history(history.summary, history.to_summarize)
+            )
+            chat_history.record_summary(new_summary is not None)
+            if new_summary:
+                reply["history_summary"] = history.next_state(new_summary)
+        else:
+            ai_response = await scaffolding_call
 
         action = ai_response.get("action")
         payload = ai_response.get("payload", {})
 
         if action == "ADD_TO_OUTLINE":
-            journal.outline_content = (journal.outline_content or "") + payload.get("text_to_add", "")
-            ai_message_text = payload.get("follow_up_question", "I've added that. What's next?")
+            reply["outline_addition"] = payload.get("text_to_add", "")
+            reply["ai_message_text"] = payload.get("follow_up_question", "I've added that. What's next?")
         else:
-            ai_message_text = payload.get("question", "What would you like to discuss?")
+            reply["ai_message_text"] = payload.get("question", "What would you like to discuss?")
 
-    elif journal.writing_phase == models.JournalPhase.writing:
-        ai_message_text = ai_service.get_writing_partner_response(
-            user_message=request.message, outline=journal.outline_content, current_draft=journal.content
+    elif turn["writing_phase"] == models.JournalPhase.writing:
+        reply["ai_message_text"] = await ai_service.async_get_writing_partner_response(
+            user_message=request.message, outline=turn["outline_content"], current_draft=turn["content"]
         )
-    
+
+    return reply
+
+async def _get_correction_feedback(message: str) -> dict:
+    correction_data = await ai_service.async_get_quick_correction(message)
+    if (correction_data and 'incorrect_phrase' in correction_data and correction_data.get('incorrect_phrase')):
+        return correction_data
+    return {"status": "no_errors"}
+
+async def _generate_ai_replies(turn: dict, request: schemas.AIChatRequest) -> dict:
+    """
+    Non-blocking half of a chat turn. The conversation reply and the optional
+    quick correction are independent, so both model calls run concurrently and
+    the turn costs max(latencies) rather than their sum. A failure in one call
+    never discards the other's result.
+    """
+    calls = [_get_conversation_reply(turn, request)]
     if request.enable_correction:
-        correction_data = ai_service.get_quick_correction(request.message)
-        if (correction_data and 'incorrect_phrase' in correction_data and correction_data.get('incorrect_phrase')):
-            feedback_payload = correction_data
-        else:
+        calls.append(_get_correction_feedback(request.message))
+
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    reply = results[0]
+    if isinstance(reply, Exception):
+        print(f"ERROR: Conversation reply failed: {reply!r}")
+        reply = {"ai_message_text": DEFAULT_AI_REPLY, "outline_addition": None}
+
+    feedback_payload = None
+    if request.enable_correction:
+        feedback_payload = results[1]
+        if isinstance(feedback_payload, Exception):
+            print(f"ERROR: Quick correction failed: {feedback_payload!r}")
             feedback_payload = {"status": "no_errors"}
 
+    return {**reply, "feedback_payload": feedback_payload}
+
+def _save_chat_turn(
+    db: Session,
+    journal: models.Journal,
+    replies: dict,
+    cursor: Optional[DeltaCursor] = None
+) -> Union[schemas.JournalOut, schemas.JournalDelta]:
+    """
+    Blocking tail of a chat turn, run in the threadpool: stores the AI replies,
+    commits, and serializes the refreshed journal (or, with a cursor, just the
+    changes) while still off the event loop.
+    """
+    if replies["outline_addition"] is not None:
+        journal.outline_content = (journal.outline_content or "") + replies["outline_addition"]
+
+    if replies.get("history_summary"):
+        # Assign a new dict so the JSONB change is picked up.
+        journal.session_state = {**(journal.session_state or {}), chat_history.SESSION_STATE_KEY: replies["history_summary"]}
+
+    if replies["feedback_payload"] is not None:
         feedback_message = models.ChatMessage(
             journal_id=journal.id, sender=models.MessageSender.ai,
-            message_text=json.dumps(feedback_payload), message_type=models.MessageType.feedback
+            message_text=json.dumps(replies["feedback_payload"]), message_type=models.MessageType.feedback
         )
         db.add(feedback_message)
 
     ai_conv_message = models.ChatMessage(
         journal_id=journal.id, sender=models.MessageSender.ai,
-        message_text=ai_message_text, message_type=models.MessageType.conversation
+        message_text=replies["ai_message_text"], message_type=models.MessageType.conversation
     )
     db.add(ai_conv_message)
 
     # 4. Commit all changes and re-fetch the journal to ensure all relationships are loaded for the response
     db.commit()
+    if cursor is not None:
+        db.refresh(journal)
+        changed_fields = ["outline_content"] if replies["outline_addition"] is not None else []
+        return build_journal_delta(db, journal, cursor, changed_fields)
     
     refreshed_journal = db.query(models.Journal).options(
         joinedload(models.Journal.images),
         joinedload(models.Journal.chat_messages).joinedload(models.ChatMessage.image)
     ).filter(models.Journal.id == journal.id).first()
 
-    return refreshed_journal
+    return schemas.JournalOut.model_validate(refreshed_journal)
+
+@router.post("/chat/{journal_date}", response_model=Union[schemas.JournalOut, schemas.JournalDelta], response_model_exclude_unset=True)
+async def chat_with_ai(
+    journal_date: date,
+    request: schemas.AIChatRequest,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_user),
+    cursor: Optional[DeltaCursor] = Depends(get_delta_cursor)
+):
+    """
+    Handles a real-time conversation turn with the AI, including image captions.
+    Optionally provides a quick correction if requested.
+    Returns the entire updated journal object to prevent race conditions, or
+    with a `since_message_id`/`since_image_id` cursor only what is new since then.
+
+    Database work runs in the threadpool and the AI calls are awaited on the
+    async client, so a slow model call never stalls the worker's event loop.
+    """
+    turn = await run_in_threadpool(_load_chat_turn, db, current_user, journal_date, request)
+
+    # 3. Get AI responses
+    replies = await _generate_ai_replies(turn, request)
+
+    return await run_in_threadpool(_save_chat_turn, db, turn["journal"], replies, cursor)
+
+class _SessionStreamingResponse(StreamingResponse):
+    """
+    Closes `db` however the response ends. Neither the body generator's
+    `finally` nor a background task runs if the client is gone before the
+    body starts (Starlette skips the background task on ClientDisconnect).
+    """
+
+    def __init__(self, content, db: Session, **kwargs):
+        super().__init__(content, **kwargs)
+        self.db = db
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.db.close()
+
+def _sse_event(event: str, data: str) -> str:
+    """Formats one server-sent event; `data` must already be JSON."""
+    return f"event: {event}\ndata: {data}\n\n"
+
+@router.post("/chat/{journal_date}/stream")
+async def stream_chat_with_ai(
+    journal_date: date,
+    request: schemas.AIChatRequest,
+    current_user: models.User = Depends(security.get_current_user),
+    cursor: Optional[DeltaCursor] = Depends(get_delta_cursor)
+):
+    """
+    Streaming variant of `chat_with_ai` as server-sent events, so writing help
+    starts appearing as soon as the model produces its first words:
+
+        event: delta       data: {"text": "..."}   (repeated)
+        event: correction  data: {...}             (if enable_correction)
+        event: done        data: <JournalOut>      (after the turn is saved;
+                                                    a JournalDelta with a cursor)
+
+    In the writing phase the reply is streamed from the model; in other
+    phases it arrives as a single delta. The turn is saved once the reply is
+    complete, exactly as the non-streaming endpoint saves it. If the client
+    disconnects first, nothing is saved.
+    """
+    # The response outlives the request handler, so the turn gets its own
+    # session rather than the request-scoped one, closed when the response ends.
+    db = database.SessionLocal()
+    try:
+        turn = await run_in_threadpool(_load_chat_turn, db, current_user, journal_date, request)
+    except BaseException:
+        db.close()
+        raise
+
+    async def events():
+        correction = asyncio.ensure_future(_get_correction_feedback(request.message)) if request.enable_correction else None
+        try:
+            reply = {"ai_message_text": DEFAULT_AI_REPLY, "outline_addition": None}
+            if turn["writing_phase"] == models.JournalPhase.writing:
+                pieces = []
+                async for chunk in ai_service.async_stream_writing_partner_response(
+                    user_message=request.message, outline=turn["outline_content"], current_draft=turn["content"]
+                ):
+                    pieces.append(chunk)
+                    yield _sse_event("delta", json.dumps({"text": chunk}))
+                reply["ai_message_text"] = "".join(pieces) or DEFAULT_AI_REPLY
+            else:
+                try:
+                    reply = await _get_conversation_reply(turn, request)
+                except Exception as e:
+                    print(f"ERROR: Conversation reply failed: {e!r}")
+                yield _sse_event("delta", json.dumps({"text": reply["ai_message_text"]}))
+
+            feedback_payload = None
+            if correction is not None:
+                try:
+                    feedback_payload = await correction
+                except Exception as e:
+                    print(f"ERROR: Quick correction failed: {e!r}")
+                    feedback_payload = {"status": "no_errors"}
+                yield _sse_event("correction", json.dumps(feedback_payload))
+
+            journal_out = await run_in_threadpool(
+                _save_chat_turn, db, turn["journal"], {**reply, "feedback_payload": feedback_payload}, cursor
+            )
+            yield _sse_event("done", journal_out.model_dump_json(exclude_unset=True))
+        finally:
+            if correction is not None and not correction.done():
+                correction.cancel()
+
+    return _SessionStreamingResponse(
+        events(),
+        db,
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream into one late response.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- WebSocket Chat Channel ---
+# A long-lived connection per open journal. The user is authenticated and the
+# journal's chat history loaded once; each turn then only re-reads the few
+# journal columns other endpoints may have changed (draft, outline, phase),
+# and answers with small events instead of the whole journal.
+#
+# Client -> server: {"type": "chat", "message": "...", "enable_correction": false, "image_id": null}
+# Server -> client:
+#   {"type": "ready", "journal_id": 1, "writing_phase": "writing", "turns_left": 40}
+#   {"type": "reply_delta", "text": "..."}     (writing phase, while the reply is generated)
+#   {"type": "message", "message": {...}}      (each stored ChatMessageOut: user, feedback, ai)
+#   {"type": "outline", "addition": "..."}     (text appended to the outline)
+#   {"type": "turn_done", "turns_left": 39}
+#   {"type": "error", "detail": "..."}         (the turn was rejected or failed; the connection stays open)
+#
+# Each step uses its own short-lived DB session so an idle connection never
+# holds a database connection.
+
+class _ChatChannelState:
+    """What an open chat connection keeps warm between turns."""
+
+    def __init__(self, journal: models.Journal):
+        self.journal_id = journal.id
+        self.writing_phase = journal.writing_phase
+        self.chat_history = [_history_line(msg) for msg in journal.chat_messages]
+        self.conversation_turns = sum(1 for msg in journal.chat_messages if msg.message_type == models.MessageType.conversation)
+        profile = journal.owner.context_profile
+        self.user_context = profile.profile_data if profile and profile.profile_data else {}
 
+    @property
+    def turns_left(self) -> int:
+        return max(0, MAX_CHAT_TURNS - self.conversation_turns)
+
+def _open_chat_channel(token: str, journal_date: date) -> Optional[_ChatChannelState]:
+    """Authenticates the token and loads the journal once; None if either fails."""
+    try:
+        token_data = security.verify_access_token(token, HTTPException(status_code=status.HTTP_401_UNAUTHORIZED))
+    except HTTPException:
+        return None
+    with database.SessionLocal() as db:
+        journal = db.query(models.Journal).options(
+            joinedload(models.Journal.chat_messages).joinedload(models.ChatMessage.image),
+            joinedload(models.Journal.owner).joinedload(models.User.context_profile)
+        ).filter(
+            models.Journal.user_id == token_data.id,
+            models.Journal.journal_date == journal_date
+        ).first()
+        return _ChatChannelState(journal) if journal else None
+
+def _prepare_channel_turn(state: _ChatChannelState, request: schemas.AIChatRequest) -> dict:
+    """
+    Builds the same turn snapshot as `_load_chat_turn` from the warm state plus
+    a single-row read of the journal's mutable columns.
+    """
+    with database.SessionLocal() as db:
+        writing_phase, outline_content, content, session_state = db.query(
+            models.Journal.writing_phase, models.Journal.outline_content, models.Journal.content,
+            models.Journal.session_state
+        ).filter(models.Journal.id == state.journal_id).one()
+        state.writing_phase = writing_phase
+        image = None
+        if request.image_id:
+            image = db.query(models.JournalImage).filter(
+                models.JournalImage.id == request.image_id,
+                models.JournalImage.journal_id == state.journal_id
+            ).first()
+
+    return {
+        "journal_id": state.journal_id,
+        "writing_phase": writing_phase,
+        "outline_content": outline_content,
+        "content": content,
+        "chat_history": state.chat_history + [f"user: {request.message}"],
+        "history_summary": (session_state or {}).get(chat_history.SESSION_STATE_KEY),
+        "user_context": state.user_context,
+        "image_id": image.id if image else None,
+        "image_file_path": "app" + image.file_path if image else None,
+        "image_description": image.ai_description if image else None,
+        "user_caption": request.message if image else None,
+    }
+
+def _save_channel_turn(state: _ChatChannelState, turn: dict, request: schemas.AIChatRequest, replies: dict) -> List[dict]:
+    """
+    Stores the turn like `_load_chat_turn` + `_save_chat_turn` do, updates the
+    warm state, and returns the new messages serialized for the client.
+    """
+    with database.SessionLocal() as db:
+        journal = db.query(models.Journal).filter(models.Journal.id == state.journal_id).one()
+
+        user_message = models.ChatMessage(
+            journal_id=journal.id, sender=models.MessageSender.user, message_text=request.message,
+            message_type=models.MessageType.conversation
+        )
+        if turn["image_id"]:
+            image = db.query(models.JournalImage).filter(models.JournalImage.id == turn["image_id"]).one()
+            image.user_caption = request.message
+            user_message.image_id = image.id
+            user_message.message_type = models.MessageType.image
+        new_messages = [user_message]
+
+        if replies["outline_addition"] is not None:
+            journal.outline_content = (journal.outline_content or "") + replies["outline_addition"]
+
+        if replies.get("history_summary"):
+            journal.session_state = {**(journal.session_state or {}), chat_history.SESSION_STATE_KEY: replies["history_summary"]}
+
+        if replies["feedback_payload"] is not None:
+            new_messages.append(models.ChatMessage(
+                journal_id=journal.id, sender=models.MessageSender.ai,
+                message_text=json.dumps(replies["feedback_payload"]), message_type=models.MessageType.feedback
+            ))
+
+        new_messages.append(models.ChatMessage(
+            journal_id=journal.id, sender=models.MessageSender.ai,
+            message_text=replies["ai_message_text"], message_type=models.MessageType.conversation
+        ))
+        db.add_all(new_messages)
+        db.commit()
+
+        serialized = []
+        for msg in new_messages:
+            db.refresh(msg)
+            state.chat_history.append(_history_line(msg))
+            serialized.append(schemas.ChatMessageOut.model_validate(msg).model_dump(mode="json"))
+        state.conversation_turns += sum(1 for msg in new_messages if msg.message_type == models.MessageType.conversation)
+        return serialized
+
+async def _run_channel_turn(websocket: WebSocket, state: _ChatChannelState, request: schemas.AIChatRequest) -> None:
+    turn = await run_in_threadpool(_prepare_channel_turn, state, request)
+
+    correction = asyncio.ensure_future(_get_correction_feedback(request.message)) if request.enable_correction else None
+    try:
+        reply = {"ai_message_text": DEFAULT_AI_REPLY, "outline_addition": None}
+        if turn["writing_phase"] == models.JournalPhase.writing:
+            pieces = []
+            async for chunk in ai_service.async_stream_writing_partner_response(
+                user_message=request.message, outline=turn["outline_content"], current_draft=turn["content"]
+            ):
+                pieces.append(chunk)
+                await websocket.send_json({"type": "reply_delta", "text": chunk})
+            reply["ai_message_text"] = "".join(pieces) or DEFAULT_AI_REPLY
+        else:
+            try:
+                reply = await _get_conversation_reply(turn, request)
+            except Exception as e:
+                print(f"ERROR: Conversation reply failed: {e!r}")
+
+        feedback_payload = None
+        if correction is not None:
+            try:
+                feedback_payload = await correction
+            except Exception as e:
+                print(f"ERROR: Quick correction failed: {e!r}")
+                feedback_payload = {"status": "no_errors"}
+    finally:
+        if correction is not None and not correction.done():
+            correction.cancel()
+
+    new_messages = await run_in_threadpool(
+        _save_channel_turn, state, turn, request, {**reply, "feedback_payload": feedback_payload}
+    )
+    for message in new_messages:
+        await websocket.send_json({"type": "message", "message": message})
+    if reply["outline_addition"] is not None:
+        await websocket.send_json({"type": "outline", "addition": reply["outline_addition"]})
+    await websocket.send_json({"type": "turn_done", "turns_left": state.turns_left})
+
+@router.websocket("/ws/{journal_date}")
+async def chat_channel(
+    websocket: WebSocket,
+    journal_date: date,
+    token: str = Query(...)
+):
+    """
+    Chat over one WebSocket per open journal (see the protocol above). The
+    access token goes in the `token` query parameter, since browsers cannot
+    set headers on WebSocket requests. The connection is refused with 1008 if
+    the token is invalid or the journal does not exist.
+    """
+    state = await run_in_threadpool(_open_chat_channel, token, journal_date)
+    if state is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await websocket.send_json({
+        "type": "ready",
+        "journal_id": state.journal_id,
+        "writing_phase": state.writing_phase.value,
+        "turns_left": state.turns_left,
+    })
+    try:
+        while True:
+            frame = await websocket.receive_json()
+            if not isinstance(frame, dict) or frame.get("type") != "chat":
+                await websocket.send_json({"type": "error", "detail": "Expected a frame of type 'chat'."})
+                continue
+            try:
+                request = schemas.AIChatRequest.model_validate(frame)
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "detail": e.errors(include_url=False, include_context=False)})
+                continue
+            if state.turns_left == 0:
+                await websocket.send_json({"type": "error", "detail": "Chat turn limit has been reached for this journal entry."})
+                continue
+            try:
+                await _run_channel_turn(websocket, state, request)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                # Report the failed turn and keep the channel open for the next one.
+                print(f"ERROR: Chat channel turn failed: {e!r}")
+                await websocket.send_json({"type": "error", "detail": "The message could not be processed. Please try again."})
+    except WebSocketDisconnect:
+        pass
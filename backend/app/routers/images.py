@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from PIL import Image, UnidentifiedImageError
+
+from ..services import image_variants, journal_images
+
+router = APIRouter(
+    prefix=image_variants.VARIANT_URL_PREFIX,
+    tags=["Images"]
+)
+
+# Variant URLs never change content (see services/image_variants.py).
+IMMUTABLE_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+@router.get("/{variant}/{filename}")
+def get_image_variant(variant: str, filename: str):
+    """
+    Serves a thumbnail or medium-size variant of an uploaded image, e.g.
+    /api/images/v1/thumb/<source file name>.webp, generating it on first use.
+    Like the originals under /static, variants need no authentication.
+    """
+    source_name, _, fmt = filename.rpartition(".")
+    if variant not in image_variants.VARIANT_SIZES or fmt not in image_variants.VARIANT_FORMATS \
+            or not source_name or "/" in source_name or source_name.startswith("."):
+        raise HTTPException(status_code=404, detail="Image not found.")
+
+    try:
+        path = image_variants.get_variant(journal_images.upload_path(source_name), variant, fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    except Image.DecompressionBombError:
+        # More pixels than PIL will decode (a small file can hold a huge image).
+        raise HTTPException(status_code=413, detail="Image is too large to process.")
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=415, detail="Image could not be decoded.")
+
+    return FileResponse(path, media_type=image_variants.VARIANT_FORMATS[fmt][1], headers=IMMUTABLE_CACHE_HEADERS)
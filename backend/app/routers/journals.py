@@ -1,24 +1,18 @@
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session, joinedload
 from datetime import date
-from typing import List
-import os
-import uuid
-import aiofiles
+from typing import List, Optional, Union
 
 
 from .. import database, schemas, models, security
-from ..services import context_agent, ai_service
+from ..services import ai_service, completion_pipeline, journal_images
+from ..services.journal_delta import DeltaCursor, get_delta_cursor, build_journal_delta
 
 router = APIRouter(
     prefix="/api/journals",
     tags=["Journals"]
 )
 
-# Directory for storing user-uploaded images
-UPLOAD_DIR = "app/static/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 @router.post("/", response_model=schemas.JournalOut, status_code=status.HTTP_201_CREATED)
 def create_journal(
     journal: schemas.JournalCreate, 
@@ -92,15 +86,18 @@ def get_journal_by_date(
     
     return journal
 
-@router.put("/{journal_date}", response_model=schemas.JournalOut)
+@router.put("/{journal_date}", response_model=Union[schemas.JournalOut, schemas.JournalDelta], response_model_exclude_unset=True)
 def update_journal(
     journal_date: date,
     updated_journal: schemas.JournalUpdate,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(security.get_current_user)
+    current_user: models.User = Depends(security.get_current_user),
+    cursor: Optional[DeltaCursor] = Depends(get_delta_cursor)
 ):
     """
     Updates the content of a specific journal entry by date for the current user.
+    With a `since_message_id`/`since_image_id` cursor, returns a JournalDelta
+    (the saved content is not echoed back) instead of the whole journal.
     """
     journal_query = db.query(models.Journal).filter(
         models.Journal.user_id == current_user.id,
@@ -120,25 +117,33 @@ def update_journal(
         journal.outline_content = updated_journal.outline_content
 
     db.commit()
+    if cursor is not None:
+        db.refresh(journal)
+        return build_journal_delta(db, journal, cursor)
+
     # After commit, refetch with relations for the response
     updated_journal_response = journal_query.options(
         joinedload(models.Journal.images),
         joinedload(models.Journal.chat_messages).joinedload(models.ChatMessage.image)
     ).first()
     
-    return updated_journal_response
+    return schemas.JournalOut.model_validate(updated_journal_response)
 
-@router.put("/{journal_date}/phase", response_model=schemas.JournalOut)
+@router.put("/{journal_date}/phase", response_model=Union[schemas.JournalOut, schemas.JournalDelta], response_model_exclude_unset=True)
 def update_journal_phase(
     journal_date: date,
     updated_phase: schemas.JournalPhaseUpdate,
     background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(security.get_current_user)
+    current_user: models.User = Depends(security.get_current_user),
+    cursor: Optional[DeltaCursor] = Depends(get_delta_cursor)
 ):
     """
     Updates the writing phase of a specific journal entry.
-    If the phase is 'completed', it triggers AI analysis for grading metrics.
+    If the phase is 'completed', it queues the completion pipeline (grading
+    metrics, evaluation, context profile) to run after the response is sent;
+    its progress is reported in `completion_status`.
+    With a cursor, returns a JournalDelta instead of the whole journal.
     """
     journal_query = db.query(models.Journal).filter(
         models.Journal.user_id == current_user.id,
@@ -153,27 +158,27 @@ def update_journal_phase(
         )
 
     journal.writing_phase = updated_phase.phase
-    
-    # --- REVISED: Trigger grading metrics on completion ---
-    print(journal.writing_phase.value == models.JournalPhase.completed.value)
-    print(models.JournalPhase.completed)
-    print(journal.writing_phase)
-    print(type(models.JournalPhase.completed))
-    print(type(journal.writing_phase))
+
+    # --- Queue the completion pipeline instead of grading on the request path ---
+    changed_fields = []
+    completion_status = None
     if journal.writing_phase.value == models.JournalPhase.completed.value and journal.content:
-        # Generate and save the writing metrics
-        print(journal.writing_phase)
-        metrics = ai_service.get_writing_metrics(journal.content)
-        journal.completion_metrics = metrics
-        
-    # Commit the changes (phase and metrics) to the database first.
+        completion_status = completion_pipeline.new_completion_status()
+        journal.session_state = {**(journal.session_state or {}), models.COMPLETION_STATE_KEY: completion_status}
+        changed_fields.append("completion_status")
+
+    # Commit the changes (phase and pipeline status) to the database first.
     db.commit()
 
     # Schedule the background task AFTER the data is safely committed.
-    # if journal.writing_phase == models.JournalPhase.completed and journal.content:
-    #     background_tasks.add_task(
-    #         context_agent.process_journal, journal.id, current_user.id
-    #     )
+    if completion_status is not None:
+        background_tasks.add_task(
+            completion_pipeline.run_completion_pipeline, journal.id, current_user.id, completion_status["run_id"]
+        )
+
+    if cursor is not None:
+        db.refresh(journal)
+        return build_journal_delta(db, journal, cursor, changed_fields)
 
     # After commit, refetch with relations for the response to ensure it's fresh.
     updated_journal_response = journal_query.options(
@@ -181,18 +186,22 @@ def update_journal_phase(
         joinedload(models.Journal.chat_messages).joinedload(models.ChatMessage.image)
     ).first()
 
-    return updated_journal_response
+    return schemas.JournalOut.model_validate(updated_journal_response)
 
-@router.post("/{journal_date}/images", response_model=schemas.JournalOut)
+@router.post("/{journal_date}/images", response_model=Union[schemas.JournalOut, schemas.JournalDelta], response_model_exclude_unset=True)
 async def upload_journal_image(
     journal_date: date,
     file: UploadFile = File(...),
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(security.get_current_user)
+    current_user: models.User = Depends(security.get_current_user),
+    cursor: Optional[DeltaCursor] = Depends(get_delta_cursor)
 ):
     """
-    Uploads an image for a specific journal entry and generates an AI description.
+    Uploads an image for a specific journal entry. The AI description is
+    generated in the background: the new image has description_status
+    "pending" until then (poll GET /{journal_date}/images/{image_id}).
     This endpoint no longer creates a chat message directly.
+    With a cursor, returns a JournalDelta instead of the whole journal.
     """
     journal = db.query(models.Journal).filter(
         models.Journal.user_id == current_user.id,
@@ -205,32 +214,47 @@ async def upload_journal_image(
     if journal.writing_phase != models.JournalPhase.scaffolding:
         raise HTTPException(status_code=400, detail="Images can only be added during the scaffolding phase.")
 
-    # 1. Save the file
-    safe_filename = file.filename.replace("..", "").replace("/", "")
-    filename = f"{uuid.uuid4()}-{safe_filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    image_bytes = await file.read()
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        await out_file.write(image_bytes)
-    
-    # 2. Get AI description
-    description = ai_service.get_image_description(image_bytes)
-    
-    # 3. Save to DB
-    db_image = models.JournalImage(
-        journal_id=journal.id,
-        file_path=f"/static/uploads/{filename}", # URL path for frontend
-        ai_description=description
-    )
-    db.add(db_image)
+    # 1. Save the file (stored once per distinct content)
+    try:
+        upload = await journal_images.save_upload(file)
+    except journal_images.UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # 2. Save to DB and queue the AI description, unless this file was described before
+    journal_images.add_image(db, journal, upload)
     db.commit()
-    
-    # 4. Return the updated journal object
+
+    # 4. Return the changes, or the updated journal object
+    if cursor is not None:
+        db.refresh(journal)
+        return build_journal_delta(db, journal, cursor)
+
     updated_journal = db.query(models.Journal).options(
         joinedload(models.Journal.images),
         joinedload(models.Journal.chat_messages).joinedload(models.ChatMessage.image)
     ).filter(models.Journal.id == journal.id).first()
     
-    return updated_journal
+    return schemas.JournalOut.model_validate(updated_journal)
+
+
+@router.get("/{journal_date}/images/{image_id}", response_model=schemas.JournalImageOut)
+def get_journal_image(
+    journal_date: date,
+    image_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_user)
+):
+    """
+    Retrieves one image of a journal entry; poll it until its
+    description_status is no longer "pending".
+    """
+    image = db.query(models.JournalImage).join(models.Journal).filter(
+        models.JournalImage.id == image_id,
+        models.Journal.user_id == current_user.id,
+        models.Journal.journal_date == journal_date
+    ).first()
+
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found.")
 
+    return image
@@ -1,10 +1,11 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, computed_field
 from datetime import datetime, date
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 import enum
 
 # --- Import the new Enums from models ---
 from .models import MessageSender, MessageType
+from .services import image_variants
 
 # --- User Schemas ---
 
@@ -49,6 +50,13 @@ class JournalImageOut(BaseModel):
     file_path: str
     ai_description: Optional[str] = None
     user_caption: Optional[str] = None # New field for user's caption
+    description_status: str = "done" # pending until the background description is ready
+
+    @computed_field
+    @property
+    def variants(self) -> Optional[Dict[str, Dict[str, str]]]:
+        """Thumbnail and medium-size URLs, by size and then format (webp, jpg)."""
+        return image_variants.variant_urls(self.file_path)
 
     class Config:
         from_attributes = True
@@ -108,6 +116,7 @@ class JournalOut(JournalBase):
     outline_content: Optional[str] = None
     writing_phase: JournalPhase
     completion_metrics: Optional[List[WritingMetric]] = None # NEW: Add metrics field
+    completion_status: Optional[Dict[str, Any]] = None # Background completion pipeline progress
     created_at: datetime
     updated_at: datetime
     chat_messages: List[ChatMessageOut] = []
@@ -116,6 +125,28 @@ class JournalOut(JournalBase):
     class Config:
         from_attributes = True
         
+class JournalDelta(BaseModel):
+    """
+    Sent instead of JournalOut when the client passes a cursor: only chat
+    messages and images newer than the cursor, plus the scalar fields the
+    server changed. Optional fields are left out entirely when unchanged.
+    """
+    id: int
+    journal_date: date
+    writing_phase: JournalPhase
+    updated_at: datetime
+    title: Optional[str] = None
+    outline_content: Optional[str] = None
+    content: Optional[str] = None
+    completion_metrics: Optional[List[WritingMetric]] = None
+    completion_status: Optional[Dict[str, Any]] = None
+    new_chat_messages: List[ChatMessageOut] = []
+    new_images: List[JournalImageOut] = []
+
+    class Config:
+        # Keeps a full JournalOut from also validating as a delta.
+        extra = "forbid"
+
 # --- AI Schemas ---
 
 class AIFeedbackRequest(BaseModel):
@@ -133,6 +164,7 @@ class AIFeedbackResponse(BaseModel):
     """The overall response schema for the AI feedback endpoint."""
     high_level_summary: str
     feedback_items: List[AIFeedbackItem]
+    partial: bool = Field(False, description="True if some paragraphs could not be evaluated; asking again retries only those.")
 
 class AIConceptualFeedbackResponse(BaseModel):
     """Schema for high-level conceptual feedback."""
@@ -208,6 +240,25 @@ class StudentWhitelistOut(StudentWhitelistBase):
     class Config:
         from_attributes = True
 
+# --- Admin Schema for AI Client Monitoring ---
+class AIClientStats(BaseModel):
+    """Per-worker counters of the Gemini API client."""
+    cache: Dict[str, Any]
+    coalescing: Dict[str, Any]
+    models: Dict[str, Any]
+    endpoints: List[Dict[str, Any]]
+    hedging: Dict[str, Any]
+    chat_history: Dict[str, Any]
+    prompts: Dict[str, Any]
+    grammar_precheck: Dict[str, Any]
+    paragraph_feedback: Dict[str, Any]
+    image_preprocess: Dict[str, Any]
+
+class JobQueueStats(BaseModel):
+    """Background job counts per kind and status (see services/job_queue.py)."""
+    jobs: Dict[str, Dict[str, int]]
+    oldest_due_seconds: float
+
 # --- New Schemas for Learning Hub ---
 
 class TopicDetail(BaseModel):
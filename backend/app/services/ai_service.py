@@ -1,29 +1,33 @@
 import gemini_api_client
-from gemini_api_client import query_api_with_retries, MODEL_LITE, MODEL_FLASH
+from gemini_api_client import query_api_with_retries, async_query_api_with_retries, MODEL_LITE, MODEL_FLASH
 from ..config import settings
+from .prompt_builder import Section, build_prompt, build_context_prompt, HIGH, NORMAL, LOW
+from . import grammar_precheck, image_preprocess
 import json
-import io
-from PIL import Image
+from typing import List, Optional
 
 # Configure the Gemini API client
 
 # --- NEW FUNCTION for image description ---
-def get_image_description(image_bytes: bytes) -> str:
+IMAGE_DESCRIPTION_FALLBACK = "Could not generate a description for the image."
+
+def get_image_description(image_bytes: bytes) -> Optional[str]:
     """
     Generates a description for an image using the Gemini Vision model.
+    Returns None if the model could not be reached, so the caller can retry.
     """
     try:
         prompt = "Briefly describe this image for a journal entry. Focus on objects, actions, and the overall mood. Keep it concise, like a caption."
         response = query_api_with_retries(
             prompt=prompt,
             model=MODEL_FLASH,
-            image=image_bytes,
+            image=image_preprocess.prepare_for_model(image_bytes),
             outjson=False
         )
-        return response
+        return response.strip() if response else None
     except Exception as e:
         print(f"An error occurred with Gemini Vision API: {e}")
-        return "Could not generate a description for the image."
+        return None
 
 SCAFFOLDING_PROMPT_TEMPLATE = """
 You are Lingo, an insightful and encouraging AI writing partner for an English language learner.
@@ -32,7 +36,9 @@ Your tone must be curious, encouraging, and concise (10-50 words).
 
 **CONTEXT PROVIDED (as a JSON object):**
 - `user_context`: A profile of the user's learning patterns and common topics.
-- `session_state`: The current journal outline and recent chat history.
+- `current_outline`: The current journal outline.
+- `earlier_conversation_summary` (if any): A summary of the earlier conversation.
+- `chat_history`: The recent chat history.
 - `image_description` (if an image is provided): A brief, AI-generated description of the image.
 - `user_caption`: The user's own caption for the image.
 
@@ -151,6 +157,35 @@ For each feedback item, include:
 - Dont overlap the error. eg text is contained in other error.
 """
 
+PARAGRAPH_FEEDBACK_PROMPT_TEMPLATE = """
+You are Lingo, a meticulous and encouraging English writing coach.
+Your task is to analyze ONE paragraph of a student's journal entry and point out what would most help them learn and improve.
+Your tone must be positive and empowering.
+
+**YOUR TASK:**
+Analyze the paragraph. Return a single, valid JSON object with the following structure:
+- `note`: One short, positive and encouraging sentence about this paragraph.
+- `feedback_items`: A list of specific feedback points, most important first.
+
+For each feedback item, include:
+- `category`: e.g., "Grammar: Verb Tense", "Vocabulary: Phrasing"
+- `incorrect_phrase`: The exact phrase from the paragraph.
+- `suggestion`: The corrected version of the phrase.
+- `explanation`: A concise, easy-to-understand explanation of the correction.
+
+**RULES:**
+- ALWAYS respond in the specified JSON format.
+- Limit feedback to the {max_items} most important points of this paragraph; use an empty list if there is nothing meaningful to improve.
+- Phrase suggestions constructively (e.g., "Consider saying..." instead of "This is wrong.").
+- No need to be so strict. Only points out most meaningfull error or most meaningfull sugesstion.
+- Dont overlap the error. eg text is contained in other error.
+
+**Paragraph to analyze:**
+---
+{paragraph}
+---
+"""
+
 QUICK_CORRECTION_PROMPT_TEMPLATE = """
 You are an automated English grammar and spelling checker. Your ONLY output must be a single, valid JSON object. Do not include any explanatory text, markdown, or any characters outside of the JSON structure.
 
@@ -264,71 +299,199 @@ For each metric, you MUST provide:
 ---
 """
 
+CHAT_SUMMARY_PROMPT_TEMPLATE = """
+You keep a running summary of a conversation between an English language learner ("user") and their AI writing partner ("ai") while they plan a journal entry.
+Update the summary with the new messages below. Keep every fact the user shared (events, people, places, feelings, reasons) and the ideas already agreed for the outline; drop greetings, repetition and grammar feedback.
+Write at most 120 words of plain text, no JSON, no headings.
+
+**CURRENT SUMMARY:**
+---
+{summary}
+---
+
+**NEW MESSAGES:**
+---
+{messages}
+---
+"""
+
+SCAFFOLDING_FALLBACK_RESPONSE = {
+    "action": "ASK_QUESTION",
+    "payload": { "question": "I'm sorry, I'm having a little trouble thinking. Could you rephrase that?" }
+}
+WRITING_PARTNER_FALLBACK_RESPONSE = "I'm sorry, I'm unable to help with that right now."
+QUICK_CORRECTION_BUDGET = 2000 # tokens
+WRITING_METRICS_FALLBACK = [
+    {"name": "Analysis", "score": 0, "max_score": 10, "feedback": "Could not analyze the text due to an error."}
+]
+PARAGRAPH_FEEDBACK_ITEM_KEYS = ("category", "incorrect_phrase", "suggestion", "explanation")
+
+# --- Request builders / parsers shared by the sync and async call paths ---
+
+# How much of each scaffolding context field survives when the prompt is over budget:
+# the latest chat messages matter most, then the outline and summary, then the profile.
+SCAFFOLDING_SECTIONS = {
+    "chat_history": dict(priority=HIGH, keep="tail", min_tokens=400),
+    "current_outline": dict(priority=NORMAL, keep="ends"),
+    "earlier_conversation_summary": dict(priority=NORMAL),
+}
+
+def _build_scaffolding_prompt(user_context: dict, session_state: dict, model: str) -> str:
+    state = {
+        key: Section(value, **SCAFFOLDING_SECTIONS[key]) if key in SCAFFOLDING_SECTIONS else value
+        for key, value in session_state.items()
+    }
+    context = {
+        "user_context": Section.from_value(user_context, priority=LOW),
+        **state
+    }
+    return build_context_prompt("scaffolding", model, SCAFFOLDING_PROMPT_TEMPLATE, context)
+
+def _build_scaffolding_request(user_context: dict, session_state: dict, image_bytes: bytes = None) -> dict:
+    # The prompt remains the same, but we conditionally change the model and add image data
+    model_to_use = MODEL_FLASH if image_bytes else MODEL_LITE
+
+    # Prepare API call arguments
+    api_args = {
+        "prompt": _build_scaffolding_prompt(user_context, session_state, model_to_use),
+        "model": model_to_use,
+        "hedge": True # Interactive chat turn: cut tail latency with a hedged request
+    }
+
+    if image_bytes:
+        api_args["image"] = image_bytes
+        api_args["outjson"] = True # Vision model can be instructed to return JSON
+    return api_args
+
+def _parse_scaffolding_response(response) -> dict:
+    # The vision model might wrap the JSON in markdown, so we clean it.
+    if isinstance(response, str):
+        cleaned_text = response.strip().replace("```json", "").replace("```", "").strip()
+        response = json.loads(cleaned_text)
+    if not isinstance(response, dict):
+        raise ValueError(f"Unexpected scaffolding response: {response!r}")
+    return response
+
+def _build_writing_partner_prompt(user_message: str, outline: str, current_draft: str) -> str:
+    return build_prompt(
+        "writing_partner", MODEL_LITE, WRITING_PARTNER_PROMPT_TEMPLATE,
+        user_message=Section(user_message, priority=HIGH, keep="ends"),
+        # Over budget, keep the end of the draft (where the user is writing) and both ends of the outline.
+        outline=Section(outline or "No outline provided.", priority=LOW, keep="ends"), # Handle empty outline
+        current_draft=Section(current_draft or "The user has not written anything yet.", keep="tail", min_tokens=1000) # Handle empty draft
+    )
+
 def get_scaffolding_response(user_context: dict, session_state: dict, image_bytes: bytes = None) -> dict:
     """
     Generates a response for the 'scaffolding' phase. Uses vision model if image is provided.
     """
     try:
-        context_payload = {
-            "user_context": user_context,
-            "session_state": session_state
-        }
-        
-        # The prompt remains the same, but we conditionally change the model and add image data
-        model_to_use = MODEL_FLASH if image_bytes else MODEL_LITE
-        
-        # Prepare API call arguments
-        api_args = {
-            "prompt": f"{SCAFFOLDING_PROMPT_TEMPLATE}\n\nHere is the current context:\n\n---\n{json.dumps(context_payload, indent=2)}\n---",
-            "model": model_to_use
-        }
-        
-        if image_bytes:
-            api_args["image"] = image_bytes
-            api_args["outjson"] = True # Vision model can be instructed to return JSON
-
-        response = query_api_with_retries(**api_args)
-        
-        # The vision model might wrap the JSON in markdown, so we clean it.
-        if isinstance(response, str):
-            cleaned_text = response.strip().replace("```json", "").replace("```", "").strip()
-            return json.loads(cleaned_text)
-        return response
+        response = query_api_with_retries(**_build_scaffolding_request(user_context, session_state, image_bytes))
+        return _parse_scaffolding_response(response)
 
     except Exception as e:
         print(f"An error occurred with the Gemini API during scaffolding: {e}")
         # Return a safe default response
-        return {
-            "action": "ASK_QUESTION",
-            "payload": { "question": "I'm sorry, I'm having a little trouble thinking. Could you rephrase that?" }
-        }
+        return dict(SCAFFOLDING_FALLBACK_RESPONSE)
+
+async def async_get_scaffolding_response(user_context: dict, session_state: dict, image_bytes: bytes = None) -> dict:
+    """
+    Non-blocking variant of `get_scaffolding_response` for async request handlers.
+    """
+    try:
+        response = await async_query_api_with_retries(**_build_scaffolding_request(user_context, session_state, image_bytes))
+        return _parse_scaffolding_response(response)
+
+    except Exception as e:
+        print(f"An error occurred with the Gemini API during scaffolding: {e}")
+        return dict(SCAFFOLDING_FALLBACK_RESPONSE)
 
 def get_writing_partner_response(user_message: str, outline: str, current_draft: str) -> str:
     """
     Generates a helpful, context-aware response for the 'writing' phase.
     """
     try:
-        full_prompt = WRITING_PARTNER_PROMPT_TEMPLATE.format(
-            user_message=user_message,
-            outline=outline or "No outline provided.", # Handle empty outline
-            current_draft=current_draft or "The user has not written anything yet." # Handle empty draft
-        )
         response = query_api_with_retries(
-            prompt=full_prompt,
+            prompt=_build_writing_partner_prompt(user_message, outline, current_draft),
             model=MODEL_LITE,
-            outjson=False
+            outjson=False,
+            hedge=True
         )
-        return response
+        return response or WRITING_PARTNER_FALLBACK_RESPONSE
     except Exception as e:
         print(f"An error occurred with the Gemini API during writing assistance: {e}")
-        return "I'm sorry, I'm unable to help with that right now."
+        return WRITING_PARTNER_FALLBACK_RESPONSE
+
+async def async_get_writing_partner_response(user_message: str, outline: str, current_draft: str) -> str:
+    """
+    Non-blocking variant of `get_writing_partner_response` for async request handlers.
+    """
+    try:
+        response = await async_query_api_with_retries(
+            prompt=_build_writing_partner_prompt(user_message, outline, current_draft),
+            model=MODEL_LITE,
+            outjson=False,
+            hedge=True
+        )
+        return response or WRITING_PARTNER_FALLBACK_RESPONSE
+    except Exception as e:
+        print(f"An error occurred with the Gemini API during writing assistance: {e}")
+        return WRITING_PARTNER_FALLBACK_RESPONSE
+
+async def async_stream_writing_partner_response(user_message: str, outline: str, current_draft: str):
+    """
+    Streaming variant of `async_get_writing_partner_response`: an async
+    iterator over the reply text as the model produces it. Falls back to the
+    default reply if nothing arrives; if the stream breaks midway, the text
+    received so far stands.
+    """
+    received = False
+    stream = gemini_api_client.async_stream_query_api(
+        prompt=_build_writing_partner_prompt(user_message, outline, current_draft),
+        model=MODEL_LITE
+    )
+    try:
+        async for chunk in stream:
+            received = True
+            yield chunk
+    except Exception as e:
+        print(f"An error occurred with the Gemini API during streamed writing assistance: {e}")
+    finally:
+        # Ends the upstream request now if our caller stopped reading.
+        await stream.aclose()
+    if not received:
+        yield WRITING_PARTNER_FALLBACK_RESPONSE
+
+async def async_summarize_chat_history(summary: str, messages: List[str]) -> Optional[str]:
+    """
+    Folds older chat messages into the running conversation summary.
+    Returns None if the model call fails, so the caller keeps the old summary.
+    """
+    try:
+        response = await async_query_api_with_retries(
+            prompt=build_prompt(
+                "chat_summary", MODEL_LITE, CHAT_SUMMARY_PROMPT_TEMPLATE,
+                summary=Section(summary or "No summary yet.", priority=LOW),
+                messages=Section("\n".join(messages), keep="tail")
+            ),
+            model=MODEL_LITE,
+            outjson=False
+        )
+        return response.strip() if response else None
+    except Exception as e:
+        print(f"An error occurred with the Gemini API during chat summarization: {e}")
+        return None
 
 def get_evaluation_feedback(text: str) -> dict:
     """
     Generates final, structured feedback for the 'evaluation' phase.
     """
     try:
-        full_prompt = f"{EVALUATION_FEEDBACK_PROMPT_TEMPLATE}\n\nHere is the user's journal entry to analyze:\n\n---\n{text}\n---"
+        full_prompt = build_prompt(
+            "evaluation_feedback", MODEL_LITE,
+            EVALUATION_FEEDBACK_PROMPT_TEMPLATE + "\n\nHere is the user's journal entry to analyze:\n\n---\n{text}\n---",
+            text=Section(text, keep="ends")
+        )
         response = query_api_with_retries(
             prompt=full_prompt,
             model=MODEL_LITE
@@ -348,16 +511,55 @@ def get_evaluation_feedback(text: str) -> dict:
             "feedback_items": []
         }
 
+async def async_get_paragraph_feedback(paragraph: str, max_items: int = 3) -> Optional[dict]:
+    """
+    Evaluates one paragraph of a draft (see services/paragraph_feedback.py),
+    asking for at most `max_items` feedback items. Returns {"note": ...,
+    "feedback_items": [...]}, or None if the model call fails so the
+    paragraph is not cached and is retried next time.
+    """
+    try:
+        response = await async_query_api_with_retries(
+            prompt=build_prompt(
+                "paragraph_feedback", MODEL_LITE, PARAGRAPH_FEEDBACK_PROMPT_TEMPLATE,
+                paragraph=Section(paragraph, keep="ends"), max_items=str(max_items)
+            ),
+            model=MODEL_LITE
+        )
+        if not isinstance(response, dict) or not isinstance(response.get("feedback_items"), list):
+            return None
+        # Drop malformed items here, so they are neither cached nor saved as learning points.
+        items = [
+            item for item in response["feedback_items"]
+            if isinstance(item, dict) and all(isinstance(item.get(key), str) and item[key] for key in PARAGRAPH_FEEDBACK_ITEM_KEYS)
+        ]
+        return {"note": str(response.get("note") or ""), "feedback_items": items}
+    except Exception as e:
+        print(f"An error occurred with the Gemini API during paragraph feedback: {e}")
+        return None
+
+def _build_quick_correction_prompt(user_message: str) -> str:
+    # Only one error is reported, so a very long message is cut rather than sent whole.
+    return build_prompt(
+        "quick_correction", MODEL_LITE, QUICK_CORRECTION_PROMPT_TEMPLATE, budget=QUICK_CORRECTION_BUDGET,
+        user_message=Section(user_message, keep="head")
+    )
+
 def get_quick_correction(user_message: str) -> dict:
     """
     Analyzes a short user message and returns a single grammar/spelling correction.
+    Messages the local pre-check can settle never reach the model.
     """
+    local_result = grammar_precheck.precheck(user_message)
+    if local_result is not None:
+        return local_result
 
     # try:
-    full_prompt = QUICK_CORRECTION_PROMPT_TEMPLATE.format(user_message=user_message)
+    full_prompt = _build_quick_correction_prompt(user_message)
     response = gemini_api_client.query_api_with_retries(
             prompt=full_prompt,
-            model=gemini_api_client.MODEL_LITE
+            model=gemini_api_client.MODEL_LITE,
+            hedge=True
         )
     
     if not response:
@@ -373,22 +575,45 @@ def get_quick_correction(user_message: str) -> dict:
     #     # --- END NEW LOGGING ---
     #     return {"status": "no_errors"}
 
+async def async_get_quick_correction(user_message: str) -> dict:
+    """
+    Non-blocking variant of `get_quick_correction` for async request handlers.
+    """
+    local_result = grammar_precheck.precheck(user_message)
+    if local_result is not None:
+        return local_result
+
+    full_prompt = _build_quick_correction_prompt(user_message)
+    response = await gemini_api_client.async_query_api_with_retries(
+            prompt=full_prompt,
+            model=gemini_api_client.MODEL_LITE,
+            hedge=True
+        )
+
+    if not response:
+        return {"status": "no_errors"}
+
+    return response
+
 # --- NEW FUNCTION for Completion Metrics ---
 def get_writing_metrics(journal_text: str) -> list:
     """
     Generates a holistic evaluation of a journal entry across several metrics.
     """
     # try:
-    print(COMPLETION_METRICS_PROMPT_TEMPLATE)
-    full_prompt = COMPLETION_METRICS_PROMPT_TEMPLATE.format(journal_text=journal_text)
-
-    print(full_prompt)
+    full_prompt = build_prompt(
+        "writing_metrics", MODEL_LITE, COMPLETION_METRICS_PROMPT_TEMPLATE,
+        journal_text=Section(journal_text, keep="ends")
+    )
 
     response = query_api_with_retries(
         prompt=full_prompt,
         model=gemini_api_client.MODEL_LITE
     )
     print(response)
+    if response is None:
+        # All retries failed or the model's circuit is open: fall back instead of failing the request.
+        return [dict(metric) for metric in WRITING_METRICS_FALLBACK]
     # The AI should return a list of dictionaries directly.
     if isinstance(response, list):
         return response
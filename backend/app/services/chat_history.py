@@ -0,0 +1,88 @@
+"""
+Rolling compaction of the chat history sent with scaffolding prompts.
+
+The last `RECENT_MESSAGES` messages are always sent verbatim. Older messages
+are folded, a batch at a time, into a running summary kept in
+`Journal.session_state["history_summary"]`:
+
+    {"text": "<summary>", "message_count": <messages covered by the summary>}
+
+Older messages that are not summarized yet are still sent verbatim, so a late
+or failed summary never loses context; it only leaves the prompt longer.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+RECENT_MESSAGES = 12   # Messages always sent word for word
+SUMMARY_BATCH = 8      # Fold older messages into the summary once this many have piled up
+SESSION_STATE_KEY = "history_summary"
+
+
+class CompactedHistory:
+    """The history as it goes into the prompt, plus what still needs summarizing."""
+
+    def __init__(self, summary: str, verbatim: List[str], to_summarize: List[str], summarized_count: int):
+        self.summary = summary
+        self.verbatim = verbatim
+        self.to_summarize = to_summarize
+        self.summarized_count = summarized_count
+
+    @property
+    def needs_summary(self) -> bool:
+        return len(self.to_summarize) >= SUMMARY_BATCH
+
+    def next_state(self, new_summary: str) -> Dict[str, Any]:
+        """The session_state entry once `to_summarize` has been folded into `new_summary`."""
+        return {"text": new_summary, "message_count": self.summarized_count + len(self.to_summarize)}
+
+    def sent_chars(self) -> int:
+        """Length of the history as it goes into the prompt: the summary plus the verbatim messages."""
+        return len(self.summary) + len("\n".join(self.verbatim))
+
+
+def compact_history(history: List[str], stored: Optional[Dict[str, Any]]) -> CompactedHistory:
+    """
+    Splits the full history (oldest first) into the stored summary, the
+    messages to send verbatim and the older messages not yet summarized.
+    """
+    stored = stored or {}
+    summary = stored.get("text") or ""
+    summarized_count = min(int(stored.get("message_count") or 0), len(history))
+    if not summary:
+        summarized_count = 0
+
+    window_start = max(summarized_count, len(history) - RECENT_MESSAGES)
+    to_summarize = history[summarized_count:window_start]
+    # Until it is summarized, older history is sent as is.
+    verbatim = history[summarized_count:]
+    return CompactedHistory(summary, verbatim, to_summarize, summarized_count)
+
+
+# --- History Size Reporting ---
+_stats_lock = threading.Lock()
+_stats = {
+    "turns": 0,
+    "history_chars_before": 0,
+    "history_chars_after": 0,
+    "summaries": 0,
+    "summary_failures": 0,
+}
+
+def record_history_sizes(history: List[str], compacted: CompactedHistory) -> None:
+    """Counts one scaffolding turn: the length of its full history and of the compacted one sent instead."""
+    with _stats_lock:
+        _stats["turns"] += 1
+        _stats["history_chars_before"] += len("\n".join(history))
+        _stats["history_chars_after"] += compacted.sent_chars()
+
+def record_summary(ok: bool) -> None:
+    with _stats_lock:
+        _stats["summaries" if ok else "summary_failures"] += 1
+
+def get_history_compaction_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    turns = stats["turns"]
+    stats["avg_history_chars_before"] = stats["history_chars_before"] / turns if turns else 0.0
+    stats["avg_history_chars_after"] = stats["history_chars_after"] / turns if turns else 0.0
+    return stats
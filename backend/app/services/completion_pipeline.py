@@ -0,0 +1,165 @@
+"""
+Background work that follows a journal's move to the `completed` phase.
+
+`update_journal_phase` only commits the phase change and queues
+`run_completion_pipeline`, which then runs these stages in the background:
+
+    metrics     grades the entry and fills in Journal.completion_metrics
+    evaluation  evaluates the final text paragraph by paragraph, so the
+                paragraph feedback cache is warm for the next feedback request
+    profile     updates the user's context profile (context_agent); queued as a
+                durable job and run by the worker process (app/worker.py),
+                since it is the slowest stage and should survive API restarts
+
+A failed stage does not stop the others. Progress is kept in
+`Journal.session_state["completion"]` and exposed on JournalOut as
+`completion_status`:
+
+    {"run_id": "...", "status": "pending" | "running" | "done" | "failed",
+     "stages": {"metrics": "pending" | "queued" | "running" | "done" | "failed", ...},
+     "queued_at": "...", "finished_at": "..."}
+
+The overall status becomes "done" or "failed" once every stage has finished;
+"failed" means at least one stage failed. If the journal is completed again
+while a run is in progress, the newer run takes over the status and the older
+one stops at its next stage.
+"""
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from .. import database, models
+from . import ai_service, context_agent, job_queue, paragraph_feedback
+
+STAGES = ("metrics", "evaluation", "profile")
+FINISHED_STATES = ("done", "failed")
+PROFILE_JOB_KIND = "context_profile"
+
+
+def new_completion_status() -> Dict[str, Any]:
+    """The status of a freshly queued run; store it before queuing the run."""
+    return {
+        "run_id": uuid.uuid4().hex,
+        "status": "pending",
+        "stages": {stage: "pending" for stage in STAGES},
+        "queued_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+    }
+
+
+def _update_status(journal_id: int, run_id: str, stage: Optional[str] = None, state: Optional[str] = None,
+                   status: Optional[str] = None, metrics: Optional[List[dict]] = None,
+                   feedback_cache: Optional[dict] = None, job: Optional[dict] = None) -> bool:
+    """
+    Records progress of run `run_id` (and a stage's output) under a row lock.
+    `job` ({"kind", "payload"}) is enqueued in the same transaction.
+    Returns False if the journal is gone or a newer run has replaced this one.
+    """
+    db = database.SessionLocal()
+    try:
+        journal = db.query(models.Journal).filter(models.Journal.id == journal_id).with_for_update().first()
+        current = journal.completion_status if journal else None
+        if not current or current.get("run_id") != run_id:
+            return False
+
+        updated = {**current, "stages": dict(current["stages"])}
+        if stage:
+            updated["stages"][stage] = state
+        if status:
+            updated["status"] = status
+        # Stages finish in different processes, so whichever finishes last closes the run.
+        stages = updated["stages"].values()
+        if updated["status"] not in FINISHED_STATES and all(s in FINISHED_STATES for s in stages):
+            updated["status"] = "failed" if "failed" in stages else "done"
+            updated["finished_at"] = datetime.utcnow().isoformat()
+            print(f"Completion pipeline: journal {journal_id} finished ({updated['status']}).")
+        session_state = {**(journal.session_state or {}), models.COMPLETION_STATE_KEY: updated}
+        if feedback_cache is not None:
+            session_state[paragraph_feedback.SESSION_STATE_KEY] = feedback_cache
+        journal.session_state = session_state
+        if metrics is not None:
+            journal.completion_metrics = metrics
+        if job is not None:
+            job_queue.enqueue(db, job["kind"], job["payload"])
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def _load_journal(journal_id: int):
+    db = database.SessionLocal()
+    try:
+        journal = db.query(models.Journal).filter(models.Journal.id == journal_id).first()
+        if not journal:
+            return None, {}
+        return journal.content or "", dict((journal.session_state or {}).get(paragraph_feedback.SESSION_STATE_KEY) or {})
+    finally:
+        db.close()
+
+
+async def _run_metrics(journal_id: int, run_id: str, content: str) -> bool:
+    metrics = await run_in_threadpool(ai_service.get_writing_metrics, content)
+    if not isinstance(metrics, list) or metrics == ai_service.WRITING_METRICS_FALLBACK:
+        return False
+    return await run_in_threadpool(_update_status, journal_id, run_id, "metrics", "done", metrics=metrics)
+
+
+async def _run_evaluation(journal_id: int, run_id: str, content: str, cache: dict) -> bool:
+    results, cache = await paragraph_feedback.evaluate_paragraphs(content, cache)
+    # Keep the paragraphs that were evaluated even if others failed.
+    ok = all(result is not None for result in results)
+    saved = await run_in_threadpool(_update_status, journal_id, run_id, "evaluation", "done" if ok else "failed",
+                                    feedback_cache=cache)
+    return ok and saved
+
+
+def _queue_profile(journal_id: int, run_id: str, user_id: int) -> bool:
+    job = {"kind": PROFILE_JOB_KIND, "payload": {"journal_id": journal_id, "user_id": user_id, "run_id": run_id}}
+    return _update_status(journal_id, run_id, "profile", "queued", job=job)
+
+
+def run_profile_job(journal_id: int, user_id: int, run_id: str) -> None:
+    """Worker handler for the profile stage; raising lets the job queue retry it."""
+    if not _update_status(journal_id, run_id, "profile", "running"):
+        return  # Superseded: the newer run queued its own profile job
+    if not context_agent.process_journal(journal_id, user_id):
+        raise RuntimeError(f"Context agent could not process journal {journal_id}")
+    _update_status(journal_id, run_id, "profile", "done")
+
+
+def profile_job_failed(journal_id: int, user_id: int, run_id: str) -> None:
+    """Called by the worker once the profile job has used all its attempts."""
+    _update_status(journal_id, run_id, "profile", "failed")
+
+
+async def run_completion_pipeline(journal_id: int, user_id: int, run_id: str) -> None:
+    """
+    Runs the metrics and evaluation stages for run `run_id` and queues the
+    profile job. Meant for FastAPI's BackgroundTasks: it runs on the event
+    loop after the response is sent, with database work and blocking model
+    calls in the threadpool.
+    """
+    content, cache = await run_in_threadpool(_load_journal, journal_id)
+    if content is None or not await run_in_threadpool(_update_status, journal_id, run_id, status="running"):
+        return
+
+    # Queued first, so a worker can build the profile while the stages below run.
+    if not await run_in_threadpool(_queue_profile, journal_id, run_id, user_id):
+        return
+
+    for stage, run in (
+        ("metrics", lambda: _run_metrics(journal_id, run_id, content)),
+        ("evaluation", lambda: _run_evaluation(journal_id, run_id, content, cache)),
+    ):
+        if not await run_in_threadpool(_update_status, journal_id, run_id, stage, "running"):
+            return  # Superseded by a newer run
+        try:
+            ok = await run()
+        except Exception as e:
+            print(f"Completion pipeline: stage '{stage}' failed for journal {journal_id}: {e}")
+            ok = False
+        if not ok and not await run_in_threadpool(_update_status, journal_id, run_id, stage, "failed"):
+            return
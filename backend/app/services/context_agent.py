@@ -1,7 +1,11 @@
 from gemini_api_client import query_api_with_retries, MODEL_LITE, MODEL_FLASH
 from sqlalchemy.orm import Session, joinedload
 import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from typing import Any, Dict, Optional
 
 from .. import models, database
 from ..config import settings
@@ -10,12 +14,14 @@ from ..config import settings
 def _call_gemini_api(prompt):
     """A helper to safely call the Gemini API and parse JSON."""
 
+    # The client already extracts and parses the JSON; None means every attempt failed.
     response = query_api_with_retries(
             prompt=prompt,
             model=MODEL_LITE
         )
-    cleaned_response = response["text"].strip().replace("```json", "").replace("```", "").strip()
-    return json.loads(cleaned_response)
+    if not isinstance(response, dict):
+        raise ValueError(f"Expected a JSON object from the model, got {response!r}")
+    return response
 
 
 def get_thematic_summary(text: str) -> str:
@@ -23,9 +29,12 @@ def get_thematic_summary(text: str) -> str:
     prompt = f"Summarize the key events, topics, and overall sentiment of this journal entry in a few sentences.\n\n---\n{text}\n---"
     response = query_api_with_retries(
             prompt=prompt,
-            model=MODEL_LITE
+            model=MODEL_LITE,
+            outjson=False
         )
-    return response["text"].strip()
+    if not response:
+        raise ValueError("The model returned no summary")
+    return response.strip()
 
 def get_cognitive_patterns(summary: str) -> dict:
     """Extracts cognitive patterns from the summary."""
@@ -53,51 +62,165 @@ Text:
 """
     return _call_gemini_api(prompt)
 
-def process_journal(journal_id: int, user_id: int):
+# The profile pipeline as a dependency graph: stage -> (stages it needs, function).
+# A stage's function gets the journal texts and the results of earlier stages.
+# Stages whose dependencies are done run concurrently, so the linguistic
+# analysis runs alongside summary -> cognitive instead of after it.
+PROFILE_STAGES = {
+    "summary": ((), lambda texts, results: get_thematic_summary(texts["full_text"])),
+    "cognitive": (("summary",), lambda texts, results: get_cognitive_patterns(results["summary"])),
+    "linguistic": ((), lambda texts, results: get_linguistic_patterns(texts["content"])),
+}
+
+# Which profile_data key each stage's result is saved under.
+PROFILE_KEYS = {
+    "cognitive": "cognitive_profile",
+    "linguistic": "linguistic_profile",
+}
+
+_stage_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="context-agent")
+
+
+def run_stages(stages: dict, texts: dict) -> tuple:
     """
-    The main function for the asynchronous context agent.
-    Fetches a completed journal, analyzes it, and updates the user's context profile.
+    Runs a stage graph, each stage as soon as its dependencies are done.
+    A failed stage only skips the stages that depend on it.
+    Returns (results, errors, timings): results and errors by stage name,
+    and each stage's duration in seconds.
     """
-    db = next(database.get_db())
+    results, errors, timings = {}, {}, {}
+    running = {}
+    pending = dict(stages)
+    while pending or running:
+        for name, (deps, func) in list(pending.items()):
+            failed_deps = [dep for dep in deps if dep in errors]
+            if failed_deps:
+                errors[name] = f"skipped, needs {', '.join(failed_deps)}"
+                del pending[name]
+            elif all(dep in results for dep in deps):
+                running[_stage_executor.submit(_timed_stage, name, func, texts, dict(results))] = name
+                del pending[name]
+        if not running:
+            break  # Only stages with unknown dependencies are left
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            result, elapsed, error = future.result()
+            timings[name] = elapsed
+            if error is None:
+                results[name] = result
+            else:
+                errors[name] = error
+    for name in pending:
+        errors[name] = "skipped, unknown dependency"
+    return results, errors, timings
+
+
+def _timed_stage(name: str, func, texts: dict, results: dict) -> tuple:
+    started = time.perf_counter()
+    try:
+        return func(texts, results), time.perf_counter() - started, None
+    except Exception as e:
+        return None, time.perf_counter() - started, f"{type(e).__name__}: {e}"
+
+
+def _load_journal_texts(journal_id: int) -> Optional[dict]:
+    db = database.SessionLocal()
     try:
         journal = db.query(models.Journal).options(
             joinedload(models.Journal.chat_messages)
         ).filter(models.Journal.id == journal_id).first()
-
         if not journal:
-            print(f"Context Agent: Journal with id {journal_id} not found.")
-            return
-
-        full_text = journal.content + "\n\nChat History:\n" + "\n".join(
+            return None
+        content = journal.content or ""
+        full_text = content + "\n\nChat History:\n" + "\n".join(
             [f"{msg.sender.name}: {msg.message_text}" for msg in journal.chat_messages]
         )
+        return {"content": content, "full_text": full_text}
+    finally:
+        db.close()
 
-        # Step 1: Thematic Summary
-        summary = get_thematic_summary(full_text)
-
-        # Steps 2 & 3: Cognitive and Linguistic Extraction
-        cognitive_insights = get_cognitive_patterns(summary)
-        linguistic_insights = get_linguistic_patterns(journal.content)
 
-        # Step 4: Consolidation
-        profile = db.query(models.UserContextProfile).filter(models.UserContextProfile.user_id == user_id).first()
+def _save_profile(user_id: int, results: dict) -> None:
+    """Merges the stages that succeeded into the user's profile, keeping earlier values for the rest."""
+    db = database.SessionLocal()
+    try:
+        profile = db.query(models.UserContextProfile).filter(
+            models.UserContextProfile.user_id == user_id
+        ).with_for_update().first()
         if not profile:
             profile = models.UserContextProfile(user_id=user_id, profile_data={})
             db.add(profile)
 
-        # Merge new insights. A simple overwrite is robust for this structure.
-        updated_profile_data = {
-            "linguistic_profile": linguistic_insights or {},
-            "cognitive_profile": cognitive_insights or {}
-        }
+        updated_profile_data = dict(profile.profile_data or {})
+        for stage, key in PROFILE_KEYS.items():
+            if stage in results:
+                updated_profile_data[key] = results[stage] or {}
         profile.profile_data = updated_profile_data
         profile.last_updated = datetime.utcnow()
-
         db.commit()
-        print(f"Context Agent: Successfully processed journal {journal_id} for user {user_id}.")
-
-    except Exception as e:
-        print(f"Context Agent: An error occurred during processing: {e}")
+    except Exception:
         db.rollback()
+        raise
     finally:
         db.close()
+
+
+def process_journal(journal_id: int, user_id: int) -> bool:
+    """
+    The main function for the asynchronous context agent.
+    Fetches a completed journal, analyzes it, and updates the user's context profile.
+    Results of the stages that succeeded are saved even if another stage failed.
+    Returns whether every stage succeeded.
+    """
+    try:
+        texts = _load_journal_texts(journal_id)
+        if texts is None:
+            print(f"Context Agent: Journal with id {journal_id} not found.")
+            return False
+
+        # The database session is not held while the model calls run.
+        started = time.perf_counter()
+        results, errors, timings = run_stages(PROFILE_STAGES, texts)
+        record_run(timings, errors, time.perf_counter() - started)
+
+        if any(stage in results for stage in PROFILE_KEYS):
+            _save_profile(user_id, results)
+
+        timing_text = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items())
+        if errors:
+            print(f"Context Agent: Journal {journal_id} for user {user_id} partly processed ({timing_text}); "
+                  f"failed: {errors}")
+            return False
+        print(f"Context Agent: Successfully processed journal {journal_id} for user {user_id} ({timing_text}).")
+        return True
+
+    except Exception as e:
+        print(f"Context Agent: An error occurred during processing: {e}")
+        return False
+
+
+# --- Stage Statistics ---
+_stats_lock = threading.Lock()
+_stats = {"runs": 0, "failed_runs": 0, "total_seconds": 0.0, "stages": {}}
+
+def record_run(timings: dict, errors: dict, elapsed: float) -> None:
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["failed_runs"] += 1 if errors else 0
+        _stats["total_seconds"] += elapsed
+        for name in set(timings) | set(errors):
+            stage = _stats["stages"].setdefault(name, {"runs": 0, "failures": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stage["runs"] += 1
+            stage["failures"] += 1 if name in errors else 0
+            stage["total_seconds"] += timings.get(name, 0.0)
+            stage["max_seconds"] = max(stage["max_seconds"], timings.get(name, 0.0))
+
+def get_context_agent_stats() -> Dict[str, Any]:
+    """Run counts and per-stage timings of the context agent in this process."""
+    with _stats_lock:
+        stats = {**_stats, "stages": {name: dict(stage) for name, stage in _stats["stages"].items()}}
+    stats["avg_seconds"] = stats["total_seconds"] / stats["runs"] if stats["runs"] else 0.0
+    for stage in stats["stages"].values():
+        stage["avg_seconds"] = stage["total_seconds"] / stage["runs"] if stage["runs"] else 0.0
+    return stats
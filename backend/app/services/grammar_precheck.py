@@ -0,0 +1,490 @@
+"""
+Local pre-check for the chat quick correction.
+
+Many chat messages are acknowledgements ("ok", "yes, I did", "thanks") and
+need no model call to be checked. `precheck` answers those in-process, and
+corrects messages that match one of a set of explicit learner-error patterns
+("I goed", "he don't", "many advices"). Everything else returns None
+(escalate to the model): a message no pattern matches is not thereby correct
+("I have went", "I listen music"), so only acknowledgements and single
+dictionary words are cleared locally. Bahasa Indonesia and other
+non-English words are escalated too (the model translates those).
+
+The single-word spell check uses the optional `pyspellchecker` package;
+without it those messages are escalated as well.
+"""
+import re
+import threading
+from typing import Dict, Optional
+
+try:
+    from spellchecker import SpellChecker
+except ImportError:  # pragma: no cover - optional dependency
+    SpellChecker = None
+
+MIN_CORRECTION_RATIO = 20   # A spelling fix is confident if it is this much more common than the runner-up
+
+NO_ERRORS = {"status": "no_errors"}
+
+# --- Word Lists ---
+# Irregular verbs learners over-regularize: base -> (past, past participle).
+# Verbs with accepted regular forms (learn, dream, burn, ...) are left out on purpose.
+IRREGULAR_VERBS = {
+    "be": ("was", "been"), "become": ("became", "become"), "begin": ("began", "begun"),
+    "bite": ("bit", "bitten"), "break": ("broke", "broken"), "bring": ("brought", "brought"),
+    "build": ("built", "built"), "buy": ("bought", "bought"), "catch": ("caught", "caught"),
+    "choose": ("chose", "chosen"), "come": ("came", "come"), "do": ("did", "done"),
+    "draw": ("drew", "drawn"), "drink": ("drank", "drunk"), "drive": ("drove", "driven"),
+    "eat": ("ate", "eaten"), "fall": ("fell", "fallen"), "feel": ("felt", "felt"),
+    "fight": ("fought", "fought"), "find": ("found", "found"), "fly": ("flew", "flown"),
+    "forget": ("forgot", "forgotten"), "get": ("got", "gotten"), "give": ("gave", "given"),
+    "go": ("went", "gone"), "grow": ("grew", "grown"), "have": ("had", "had"),
+    "hear": ("heard", "heard"), "hold": ("held", "held"), "keep": ("kept", "kept"),
+    "know": ("knew", "known"), "leave": ("left", "left"), "lose": ("lost", "lost"),
+    "make": ("made", "made"), "meet": ("met", "met"), "pay": ("paid", "paid"),
+    "ride": ("rode", "ridden"), "run": ("ran", "run"), "say": ("said", "said"),
+    "see": ("saw", "seen"), "sell": ("sold", "sold"), "send": ("sent", "sent"),
+    "sing": ("sang", "sung"), "sit": ("sat", "sat"), "sleep": ("slept", "slept"),
+    "speak": ("spoke", "spoken"), "spend": ("spent", "spent"), "stand": ("stood", "stood"),
+    "swim": ("swam", "swum"), "take": ("took", "taken"), "teach": ("taught", "taught"),
+    "tell": ("told", "told"), "think": ("thought", "thought"), "throw": ("threw", "thrown"),
+    "understand": ("understood", "understood"), "wake": ("woke", "woken"), "wear": ("wore", "worn"),
+    "win": ("won", "won"), "write": ("wrote", "written"),
+}
+# Regular verbs common in journal chat, with their past forms spelled out.
+REGULAR_VERBS = {
+    "arrive": "arrived", "call": "called", "clean": "cleaned", "cook": "cooked", "enjoy": "enjoyed",
+    "finish": "finished", "help": "helped", "like": "liked", "listen": "listened", "live": "lived",
+    "love": "loved", "need": "needed", "play": "played", "start": "started", "stay": "stayed",
+    "study": "studied", "talk": "talked", "travel": "traveled", "try": "tried", "visit": "visited",
+    "walk": "walked", "want": "wanted", "watch": "watched", "work": "worked",
+}
+BASE_VERBS = frozenset(IRREGULAR_VERBS) - {"be"} | frozenset(REGULAR_VERBS)
+THIRD_PERSON = {"be": "is", "have": "has", "do": "does", "go": "goes"}
+# Over-regularized forms that happen to be real words.
+REAL_WORD_FORMS = {"seed", "singed", "sited", "wined", "waked"}
+
+UNCOUNTABLE_PLURALS = {
+    "advices": "advice", "equipments": "equipment", "furnitures": "furniture", "homeworks": "homework",
+    "informations": "information", "knowledges": "knowledge", "luggages": "luggage", "peoples": "people",
+    "childs": "children", "foots": "feet", "tooths": "teeth", "mans": "men", "womans": "women",
+}
+# Misspellings with a single obvious correction (dictionary candidates can be ambiguous for these).
+COMMON_MISSPELLINGS = {
+    "alot": "a lot", "tommorow": "tomorrow", "tomorow": "tomorrow", "wich": "which", "becuase": "because",
+    "beacuse": "because", "untill": "until", "recieve": "receive", "definately": "definitely",
+    "seperate": "separate", "freind": "friend", "beatiful": "beautiful", "beautifull": "beautiful",
+    "realy": "really", "wensday": "Wednesday", "thier": "their", "goverment": "government",
+    "enviroment": "environment", "occured": "occurred", "begining": "beginning", "writting": "writing",
+    "studing": "studying",
+}
+# Real words that are often the wrong one ("I was so exited"): the model decides.
+CONFUSABLE_WORDS = {"exited", "loose", "than", "then", "their", "there's", "your", "its", "it's", "quite", "quiet",
+                    "affect", "effect", "advise", "accept", "except", "bored", "boring", "interested",
+                    "interesting", "already", "since", "for", "during", "lend", "borrow", "said"}
+# British spellings the (American) dictionary does not know: our -> or, ise -> ize, ...
+BRITISH_SPELLINGS = [("our", "or"), ("ise", "ize"), ("isation", "ization"), ("yse", "yze"), ("tre", "ter"),
+                     ("lled", "led"), ("lling", "ling"), ("ogue", "og"), ("ence", "ense")]
+
+# Frequent Bahasa Indonesia words that are not also common English words.
+INDONESIAN_WORDS = frozenset("""
+    yang dan di ke dari ini itu saya aku kamu dia kami kita mereka tidak bukan sudah belum akan sedang
+    dengan untuk pada ada bisa juga karena tapi tetapi sangat apa bagaimana kenapa mengapa siapa dimana
+    kapan hari makan minum pergi pulang rumah sekolah kampus kuliah teman senang sedih capek lelah bagus
+    baik banyak sedikit hujan jalan kerja belajar tugas dosen mahasiswa kemarin besok sekarang tadi nanti
+    pagi siang malam terima kasih maaf tolong mau ingin suka lagi sama atau jadi kalau seperti lebih
+    paling sekali bahasa inggris artinya gimana nggak gak enggak udah aja banget sih kok deh nih yg dgn
+    tdk bgt apakah membuat melihat mendengar menulis membaca bermain berjalan tinggal keluarga ibu ayah
+    adik kakak orang waktu uang pasar kota desa pantai gunung liburan perjalanan pengalaman cerita tentang
+    hanya semua setiap harus boleh perlu masih pernah baru besar kecil cantik indah enak panas dingin
+    senin selasa rabu kamis jumat sabtu minggu
+""".split())
+
+SUBJECT_PRONOUNS = {"i", "you", "we", "they", "he", "she", "it"}
+PAST_MARKERS = re.compile(r"\b(yesterday|ago|last (night|week|weekend|month|year|monday|tuesday|wednesday|"
+                          r"thursday|friday|saturday|sunday|time))\b", re.IGNORECASE)
+# Words before a bare verb that make the base form correct ("did go", "can go", "to go", ...).
+BASE_FORM_TRIGGERS = {"did", "didn't", "does", "doesn't", "do", "don't", "can", "can't", "cannot", "could",
+                      "couldn't", "will", "won't", "would", "wouldn't", "should", "shouldn't", "must", "may",
+                      "might", "to", "let", "make", "help"}
+PARTICIPLE_TRIGGERS = {"have", "has", "had", "been", "was", "were", "is", "are", "am", "be", "being"}
+# Singular count nouns learners often use without an article ("I am student").
+ARTICLE_NOUNS = {"student", "teacher", "doctor", "engineer", "nurse", "lecturer", "farmer", "driver",
+                 "programmer", "designer", "artist", "writer", "singer", "manager", "employee", "athlete"}
+
+# Words that start a new clause: a past time marker before one of them does not date the verbs after it.
+CLAUSE_BOUNDARIES = {"and", "but", "so", "because", "when", "while", "after", "before", "if", "that", "what",
+                     "who", "which", "where", "since", "until", "although", "though"}
+# Words after which a pronoun starts a clause ("and he go", "today I go"); past time markers count too.
+CLAUSE_STARTERS = {"and", "but", "so", "because", "when", "then", "after", "before", "if",
+                   "today", "tonight", "now", "usually", "sometimes"}
+
+# Replies cleared without a model call (lowercase, words only). Anything longer that no rule corrects is escalated.
+ACKNOWLEDGEMENTS = frozenset([
+    "ok", "okay", "yes", "yeah", "yep", "no", "nope", "sure", "thanks", "thank you", "thank you so much",
+    "thanks a lot", "of course", "me too", "not really", "not yet", "i see", "i think so", "i don't think so",
+    "i hope so", "maybe", "maybe later", "good", "great", "nice", "cool", "fine", "alright", "all right",
+    "hi", "hello", "hey", "good morning", "good afternoon", "good evening", "good night", "bye", "see you",
+    "see you later", "you're welcome", "yes i did", "no i didn't", "yes i do", "no i don't", "yes it was",
+    "no it wasn't", "that sounds good", "sounds good", "got it",
+])
+
+WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+CONTRACTION_SUFFIXES = ("n't", "'s", "'re", "'ve", "'ll", "'d", "'m")
+IRREGULAR_NEGATIONS = {"can't": "can", "won't": "will", "shan't": "shall"}
+
+
+def _past(base: str) -> str:
+    return IRREGULAR_VERBS[base][0] if base in IRREGULAR_VERBS else REGULAR_VERBS[base]
+
+def _third_person(base: str) -> str:
+    if base in THIRD_PERSON:
+        return THIRD_PERSON[base]
+    if base.endswith(("s", "sh", "ch", "x", "o")):
+        return base + "es"
+    if base.endswith("y") and base[-2] not in "aeiou":
+        return base[:-1] + "ies"
+    return base + "s"
+
+def _overregularized_forms() -> Dict[str, str]:
+    """'goed' -> 'go', 'runned' -> 'run', 'maked' -> 'make', ..."""
+    forms = {}
+    for base in IRREGULAR_VERBS:
+        if base == "be":
+            continue
+        if base.endswith("e"):
+            candidates = {base + "d"}
+        elif base.endswith("y"):
+            candidates = {base + "ed"} if base[-2] in "aeiou" else {base + "ed", base[:-1] + "ied"}
+        else:
+            candidates = {base + "ed"}
+            if re.search(r"[^aeiou][aeiou][^aeiouwxy]$", base):  # run -> runned, swim -> swimmed
+                candidates.add(base + base[-1] + "ed")
+        for form in candidates - REAL_WORD_FORMS:
+            forms.setdefault(form, base)
+    return forms
+
+OVERREGULARIZED = _overregularized_forms()
+
+
+def _match_case(original: str, replacement: str) -> str:
+    return replacement[0].upper() + replacement[1:] if original[:1].isupper() else replacement
+
+def _correction(phrase: str, suggestion: str, explanation: str) -> dict:
+    return {
+        "incorrect_phrase": phrase,
+        "suggestion": suggestion,
+        "explanation": explanation,
+        "status": "correction_found",
+    }
+
+
+# --- Spell Checker ---
+_spell = None
+_spell_lock = threading.Lock()
+
+def _get_spell_checker():
+    """The English dictionary, loaded on first use (about 0.3 s); None without pyspellchecker."""
+    global _spell
+    if _spell is None and SpellChecker is not None:
+        with _spell_lock:
+            if _spell is None:
+                _spell = SpellChecker(distance=1)
+    return _spell
+
+def load_dictionary() -> None:
+    """Loads the dictionary up front, so the first chat message does not wait for it."""
+    _get_spell_checker()
+
+
+# --- Rules ---
+# Each rule looks at the message's words ([(text, start, end), ...]) and
+# returns a correction, or None if it has nothing to say.
+
+def _rule_overregularized(message, words):
+    for i, (word, start, end) in enumerate(words):
+        base = OVERREGULARIZED.get(word.lower())
+        if base is None:
+            continue
+        previous = words[i - 1][0].lower() if i else ""
+        if previous in PARTICIPLE_TRIGGERS:
+            form, kind = IRREGULAR_VERBS[base][1], "past participle"
+        elif previous in BASE_FORM_TRIGGERS:
+            form, kind = base, "base form"
+        else:
+            form, kind = IRREGULAR_VERBS[base][0], "past tense"
+        return _correction(word, _match_case(word, form),
+                           f"'{base.capitalize()}' is irregular: its {kind} is '{form}', not '{word.lower()}'.")
+    return None
+
+def _rule_past_after_auxiliary(message, words):
+    """'didn't went', 'can went', 'to went', 'did you saw' -> base form."""
+    past_to_base = {past: base for base, (past, _) in IRREGULAR_VERBS.items() if past != base and base != "be"}
+    auxiliaries = BASE_FORM_TRIGGERS - {"let", "make", "help"}
+    for i in range(1, len(words)):
+        word = words[i][0].lower()
+        if word not in past_to_base:
+            continue
+        # The auxiliary right before the verb, or before its subject in a question.
+        first = i - 1
+        if words[first][0].lower() in SUBJECT_PRONOUNS and first > 0 and words[first - 1][0].lower() in auxiliaries:
+            first -= 1
+        auxiliary = words[first][0].lower()
+        if auxiliary in auxiliaries:
+            base = past_to_base[word]
+            phrase = message[words[first][1]:words[i][2]]
+            return _correction(phrase, phrase[:words[i][1] - words[first][1]] + base,
+                               f"After '{auxiliary}', use the base form of the verb ('{base}'), not the past tense.")
+    return None
+
+def _ing(base: str) -> str:
+    if base.endswith("ie"):
+        return base[:-2] + "ying"
+    if base.endswith("e") and base not in {"be", "see"}:
+        return base[:-1] + "ing"
+    if re.search(r"[^aeiou][aeiou][^aeiouwxy]$", base) and base not in {"visit", "listen", "travel"}:
+        return base + base[-1] + "ing"
+    return base + "ing"
+
+def _rule_verb_patterns(message, words):
+    """'enjoyed to swim' -> 'enjoyed swimming', 'forward to meet' -> 'forward to meeting', 'said me' -> 'told me'."""
+    for i in range(len(words) - 2):
+        first, second, verb = (word.lower() for word, _, _ in words[i:i + 3])
+        phrase = message[words[i][1]:words[i + 2][2]]
+        if second == "to" and verb in BASE_VERBS | {"swim", "read", "dance"}:
+            if first in {"enjoy", "enjoyed", "enjoys", "finish", "finished", "avoid", "avoided", "mind"}:
+                return _correction(phrase, f"{words[i][0]} {_ing(verb)}",
+                                   f"'{first.capitalize()}' is followed by the -ing form: '{first} {_ing(verb)}'.")
+            if first == "forward":
+                return _correction(phrase, f"{words[i][0]} to {_ing(verb)}",
+                                   f"In 'look forward to', 'to' is a preposition, so use '{_ing(verb)}'.")
+    for i in range(len(words) - 1):
+        first, second = words[i][0].lower(), words[i + 1][0].lower()
+        phrase = message[words[i][1]:words[i + 1][2]]
+        if first == "said" and second in {"me", "him", "her", "us", "them"}:
+            return _correction(phrase, _match_case(phrase, f"told {second}"),
+                               "Use 'told' when you say who heard it ('told me'); 'said' needs 'to' ('said to me').")
+        # Only "I very like" / "she very liked": after anything else ("I was very enjoy") the fix is not a swap.
+        subject = words[i - 1][0].lower() if i else ""
+        if first == "very" and (
+                second in {"like", "love", "enjoy", "want", "hope"} and subject in {"i", "you", "we", "they"}
+                or second in {"liked", "loved", "enjoyed"} and subject in SUBJECT_PRONOUNS):
+            return _correction(phrase, _match_case(phrase, f"really {second}"),
+                               "'Very' cannot go with a verb; use 'really' (or 'very much' after the object).")
+    return None
+
+def _clause(message, words, i):
+    """Character span of the clause around word `i`: up to punctuation or a CLAUSE_BOUNDARIES word."""
+    start, end = 0, len(message)
+    for j in range(i - 1, -1, -1):
+        if re.search(r"[,;:.!?]", message[words[j][2]:words[j + 1][1]]) or words[j][0].lower() in CLAUSE_BOUNDARIES:
+            start = words[j][2]
+            break
+    for j in range(i + 1, len(words)):
+        if re.search(r"[,;:.!?]", message[words[j - 1][2]:words[j][1]]) or words[j][0].lower() in CLAUSE_BOUNDARIES:
+            end = words[j][1]
+            break
+    return start, end
+
+def _looks_like_verb(word: str) -> bool:
+    return (word in SUBJECT_PRONOUNS or word in BASE_VERBS or word.endswith("ed")
+            or word in {past for past, _ in IRREGULAR_VERBS.values()})
+
+def _dated_by(message, words, i, past_markers) -> Optional[bool]:
+    """
+    Whether the verb after subject `i` is dated by a past time marker of its
+    own clause: True, False (no marker in the clause), or None when a marker
+    is there but another subject or verb stands in between, as in a relative
+    clause ("the movie I watched last week") that the marker may belong to.
+    """
+    start, end = _clause(message, words, i)
+    for marker in past_markers:
+        if marker.start() < start or marker.end() > end:
+            continue
+        if marker.start() >= words[i + 1][2]:
+            between = [word for word, s, _ in words[i + 2:] if s < marker.start()]
+        else:
+            between = [word for word, s, e in words[:i] if s >= marker.end()]
+        if any(_looks_like_verb(word.lower()) for word in between):
+            return None
+        return True
+    return False
+
+def _rule_subject_verb(message, words, past_markers):
+    """'he go' -> 'he goes' (or 'he went' with a past time marker); 'yesterday I go' -> 'I went'."""
+    past_marker_ends = {marker.end() for marker in past_markers}
+    for i in range(len(words) - 1):
+        subject, verb = words[i][0].lower(), words[i + 1][0].lower()
+        if subject not in SUBJECT_PRONOUNS or verb not in BASE_VERBS:
+            continue
+        # Only a subject that starts a clause: not "did he go", "let it go", "help you find".
+        if (i and words[i - 1][0].lower() not in CLAUSE_STARTERS and words[i - 1][2] not in past_marker_ends
+                and not message[words[i - 1][2]:words[i][1]].strip()):
+            continue
+        phrase = message[words[i][1]:words[i + 1][2]]
+        dated = _dated_by(message, words, i, past_markers)
+        if dated is None:
+            return None  # The model works out which verb the time refers to
+        if dated:
+            # "have" may start a (wrong) present perfect, "have been there last year": the model decides.
+            if verb == "have" or IRREGULAR_VERBS.get(verb, (None,))[0] == verb:
+                continue
+            return _correction(phrase, f"{words[i][0]} {_past(verb)}",
+                               f"The sentence talks about the past, so use the past tense '{_past(verb)}'.")
+        if subject in {"he", "she", "it"}:
+            return _correction(phrase, f"{words[i][0]} {_third_person(verb)}",
+                               f"With '{subject}', the present tense verb takes -s: '{_third_person(verb)}'.")
+    return None
+
+AGREEMENT_PATTERNS = [
+    (re.compile(r"\b(he|she|it) don't\b", re.IGNORECASE), lambda m: f"{m.group(1)} doesn't",
+     "With 'he', 'she' or 'it', use 'doesn't'."),
+    (re.compile(r"\b(I|you|we|they) doesn't\b", re.IGNORECASE), lambda m: f"{m.group(1)} don't",
+     "With 'I', 'you', 'we' or 'they', use 'don't'."),
+    (re.compile(r"\b(you|we|they) was\b", re.IGNORECASE), lambda m: f"{m.group(1)} were",
+     "With 'you', 'we' or 'they', use 'were'."),
+    (re.compile(r"\b(he|she|it) have\b", re.IGNORECASE), lambda m: f"{m.group(1)} has",
+     "With 'he', 'she' or 'it', use 'has'."),
+    (re.compile(r"\bthere (is|was) (many|several|two|three|four|five)\b", re.IGNORECASE),
+     lambda m: f"there {'are' if m.group(1).lower() == 'is' else 'were'} {m.group(2)}",
+     "Use 'there are' / 'there were' with plural nouns."),
+    (re.compile(r"\bI am agree\b", re.IGNORECASE), lambda m: "I agree",
+     "'Agree' is a verb, so say 'I agree' without 'am'."),
+    (re.compile(r"\bmore (better|worse|bigger|smaller|taller|shorter|longer|faster|easier|harder|happier|older|"
+                r"younger|cheaper|nicer|stronger|busier|prettier)\b", re.IGNORECASE),
+     lambda m: m.group(1), "The comparative already means 'more', so drop 'more'."),
+    # Singular subjects only: "I am", "she was", "my mother is" (not "they are", "my parents are").
+    (re.compile(r"\b(I (?:am|was)|(?!(?:you|we|they)\b)[a-z']*[a-rt-z] (?:is|was)) ("
+                + "|".join(sorted(ARTICLE_NOUNS)) + r")\b", re.IGNORECASE),
+     lambda m: f"{m.group(1)} {'an' if m.group(2)[0].lower() in 'aeiou' else 'a'} {m.group(2)}",
+     "Singular jobs and roles need an article ('a' or 'an')."),
+    (re.compile(r"\ba ([aeio]\w+)\b", re.IGNORECASE), lambda m: f"an {m.group(1)}",
+     "Use 'an' before a word that starts with a vowel sound."),
+]
+AN_EXCEPTIONS = re.compile(r"^(one|once|eu|uni|use|usu|uti)", re.IGNORECASE)
+
+def _rule_patterns(message, words):
+    for pattern, fix, explanation in AGREEMENT_PATTERNS:
+        for match in pattern.finditer(message):
+            if fix(match).startswith("an ") and AN_EXCEPTIONS.match(match.group(1)):
+                continue
+            return _correction(match.group(0), _match_case(match.group(0), fix(match)), explanation)
+    return None
+
+def _rule_plurals_and_spelling(message, words):
+    for word, _, _ in words:
+        lower = word.lower()
+        if lower in UNCOUNTABLE_PLURALS:
+            fix = UNCOUNTABLE_PLURALS[lower]
+            return _correction(word, _match_case(word, fix),
+                               f"'{fix.capitalize()}' has no '{lower}' form here; use '{fix}'.")
+        if COMMON_MISSPELLINGS.get(lower):
+            fix = COMMON_MISSPELLINGS[lower]
+            return _correction(word, _match_case(word, fix), f"'{word}' is misspelled; it is spelled '{fix}'.")
+    return None
+
+def _rule_lowercase_i(message, words):
+    for word, _, _ in words:
+        if word == "i" or word.startswith("i'"):
+            return _correction(word, "I" + word[1:], "The pronoun 'I' is always written with a capital letter.")
+    return None
+
+
+# --- Entry Point ---
+
+def _known(spell, word: str) -> bool:
+    lower = word.lower()
+    if lower in IRREGULAR_NEGATIONS:
+        return True
+    for suffix in CONTRACTION_SUFFIXES:
+        if lower.endswith(suffix) and len(lower) > len(suffix):
+            lower = lower[:-len(suffix)]
+            break
+    return bool(spell.known([lower]))
+
+def _spelling_fix(spell, word: str) -> Optional[str]:
+    """The dictionary's correction for an unknown word, if it is clearly the intended one."""
+    candidates = sorted(spell.candidates(word.lower()) or (), key=spell.word_usage_frequency, reverse=True)
+    if not candidates:
+        return None
+    best = spell.word_usage_frequency(candidates[0])
+    runner_up = spell.word_usage_frequency(candidates[1]) if len(candidates) > 1 else 0.0
+    if best > 1e-6 and best >= MIN_CORRECTION_RATIO * runner_up:
+        return candidates[0]
+    return None
+
+def precheck(message: str) -> Optional[dict]:
+    """
+    Checks `message` locally. Returns {"status": "no_errors"}, a confident
+    correction in the quick-correction format, or None to escalate the
+    message to the model.
+    """
+    message = message or ""
+    words = [(m.group(0), m.start(), m.end()) for m in WORD_RE.finditer(message)]
+    if not words:
+        # Emoji, punctuation or nothing at all: nothing to correct. Numbers and other scripts: ask the model.
+        return _record(None if re.search(r"\w", message) else NO_ERRORS)
+    lowered = [word.lower() for word, _, _ in words]
+    # Capitalized words mid-sentence are names ("Dan", "Ibu Sari") and do not count.
+    if any(word in INDONESIAN_WORDS for word, (original, start, _) in zip(lowered, words)
+           if not (original[0].isupper() and start > 0)):
+        return _record(None)  # Translation request: the model answers those
+
+    past_markers = list(PAST_MARKERS.finditer(message))
+    for rule in (_rule_overregularized, _rule_past_after_auxiliary, _rule_patterns, _rule_verb_patterns,
+                 _rule_plurals_and_spelling):
+        correction = rule(message, words)
+        if correction:
+            return _record(correction)
+    correction = _rule_subject_verb(message, words, past_markers)
+    if correction:
+        return _record(correction)
+
+    # No rule fired, which says nothing about the rest of the sentence ("I have went", "I listen music"):
+    # only acknowledgements and single words are cleared here.
+    if " ".join(lowered) in ACKNOWLEDGEMENTS:
+        return _record(_rule_lowercase_i(message, words) or NO_ERRORS)
+    if len(words) > 1:
+        return _record(None)
+    return _record(_check_word(words[0][0]))
+
+def _check_word(word: str) -> Optional[dict]:
+    """A one-word message: cleared if the dictionary knows it, corrected if it is clearly misspelled."""
+    spell = _get_spell_checker()
+    if spell is None or word.lower() in CONFUSABLE_WORDS:
+        return None
+    if _known(spell, word):
+        return _rule_lowercase_i(word, [(word, 0, len(word))]) or NO_ERRORS
+    fix = _spelling_fix(spell, word)
+    if fix is None:
+        return None
+    if _is_british_spelling(word.lower(), fix):
+        return NO_ERRORS
+    return _correction(word, _match_case(word, fix), f"'{word}' is misspelled; it is spelled '{fix}'.")
+
+def _is_british_spelling(word: str, fix: str) -> bool:
+    return any(british in word and word.replace(british, american) == fix for british, american in BRITISH_SPELLINGS)
+
+
+# --- Statistics ---
+_stats_lock = threading.Lock()
+_stats = {"checked": 0, "no_errors": 0, "corrections": 0, "escalated": 0}
+
+def _record(result: Optional[dict]) -> Optional[dict]:
+    with _stats_lock:
+        _stats["checked"] += 1
+        if result is None:
+            _stats["escalated"] += 1
+        elif result["status"] == "no_errors":
+            _stats["no_errors"] += 1
+        else:
+            _stats["corrections"] += 1
+    return dict(result) if result is not None else None
+
+def get_precheck_stats() -> Dict[str, float]:
+    """How many quick corrections were answered locally, and how many went to the model."""
+    with _stats_lock:
+        stats = dict(_stats)
+    checked = stats["checked"]
+    stats["local_hit_rate"] = (checked - stats["escalated"]) / checked if checked else 0.0
+    return stats
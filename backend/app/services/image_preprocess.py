@@ -0,0 +1,92 @@
+"""
+Prepares journal images before they are sent to the vision model.
+
+Phone photos are often several megabytes and 4000+ pixels wide, far more
+than the model looks at. `prepare_for_model` applies the EXIF orientation,
+downscales to `MAX_DIMENSION`, drops all metadata (EXIF, GPS, ICC profiles)
+and re-encodes as JPEG. The result is cached by a hash of the original bytes,
+so an image sent again on a later chat turn is not decoded a second time.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+from PIL import Image, ImageOps
+
+MAX_DIMENSION = 1024         # Longest side sent to the model, in pixels
+JPEG_QUALITY = 85
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+PREPROCESS_VERSION = "1"     # Bump when the settings above change, so cached results are not reused
+
+
+def _encode(image_bytes: bytes) -> bytes:
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        # A small JPEG/PNG without metadata may be sent as it is, if re-encoding would not shrink it.
+        already_compact = (original.format in ("JPEG", "PNG") and max(original.size) <= MAX_DIMENSION
+                           and not original.info.get("exif") and not original.info.get("icc_profile"))
+
+        image = ImageOps.exif_transpose(original)  # Orientation lives in EXIF, which is about to be dropped
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+
+        out = io.BytesIO()
+        # A fresh save without exif=/icc_profile= arguments writes no metadata.
+        image.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    encoded = out.getvalue()
+    return image_bytes if already_compact and len(image_bytes) <= len(encoded) else encoded
+
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_cache_bytes = 0
+_stats = {"calls": 0, "cache_hits": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0}
+
+def prepare_for_model(image_bytes: bytes) -> bytes:
+    """
+    Returns the image to send to the model: downscaled, metadata-free JPEG
+    (or the original, if it is already a smaller metadata-free JPEG/PNG).
+    If the image cannot be decoded, the original bytes are returned unchanged.
+    """
+    global _cache_bytes
+    key = hashlib.sha256(PREPROCESS_VERSION.encode("utf-8") + image_bytes).hexdigest()
+    with _cache_lock:
+        _stats["calls"] += 1
+        _stats["bytes_in"] += len(image_bytes)
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            _stats["cache_hits"] += 1
+            _stats["bytes_out"] += len(cached)
+            return cached
+
+    try:
+        prepared = _encode(image_bytes)
+    except Exception as e:
+        print(f"Image preprocessing failed, sending the original: {e}")
+        prepared = image_bytes
+        with _cache_lock:
+            _stats["errors"] += 1
+    with _cache_lock:
+        _stats["bytes_out"] += len(prepared)
+        if key not in _cache:
+            _cache[key] = prepared
+            _cache_bytes += len(prepared)
+            while _cache_bytes > CACHE_MAX_BYTES and _cache:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= len(evicted)
+    return prepared
+
+
+def get_image_preprocess_stats() -> Dict[str, Any]:
+    with _cache_lock:
+        stats = {**_stats, "cached_images": len(_cache), "cached_bytes": _cache_bytes}
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    return stats
@@ -0,0 +1,88 @@
+"""
+Smaller variants of journal images for the frontend: a thumbnail for chat
+bubbles and cards and a medium size for galleries, each in WebP and JPEG.
+
+Variants are generated on first request (routers/images.py) and cached on
+disk. Their URL names the source file, which never changes content (it is
+named after its hash, or a uuid for older uploads), plus `VARIANTS_VERSION`,
+so responses can be cached by browsers and proxies as immutable.
+"""
+import os
+import uuid
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from gemini_api_client import SingleFlight
+from PIL import Image, ImageOps
+
+VARIANTS_VERSION = "v1"      # Bump when the sizes or quality change, so cached copies are not reused
+VARIANT_SIZES = {"thumb": 240, "medium": 960}  # Longest side, in pixels
+VARIANT_FORMATS = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+VARIANT_QUALITY = 80
+VARIANT_DIR = os.path.join("app/static/variants", VARIANTS_VERSION)
+VARIANT_URL_PREFIX = f"/api/images/{VARIANTS_VERSION}"
+
+# Concurrent requests for the same variant wait for one generation.
+_generating = SingleFlight()
+
+
+def variant_urls(file_path: Optional[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    """{"thumb": {"webp": url, "jpg": url}, "medium": {...}} for an image's URL path (JournalImage.file_path)."""
+    if not file_path:
+        return None
+    source_name = quote(os.path.basename(file_path))
+    return {
+        variant: {fmt: f"{VARIANT_URL_PREFIX}/{variant}/{source_name}.{fmt}" for fmt in VARIANT_FORMATS}
+        for variant in VARIANT_SIZES
+    }
+
+
+def _render(source_path: str, target_path: str, size: int, pil_format: str) -> None:
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if pil_format == "WEBP" and has_alpha:
+            image = image.convert("RGBA")
+        elif has_alpha:
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+        image.thumbnail((size, size), Image.LANCZOS)
+
+        temp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if pil_format == "JPEG":
+                image.save(temp_path, format="JPEG", quality=VARIANT_QUALITY, optimize=True, progressive=True)
+            else:
+                image.save(temp_path, format="WEBP", quality=VARIANT_QUALITY, method=4)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def get_variant(source_path: str, variant: str, fmt: str) -> str:
+    """
+    Path of the cached variant of `source_path`, generating it first if needed.
+    Raises KeyError for an unknown variant or format, FileNotFoundError if the
+    source is missing and PIL's errors if it cannot be decoded.
+    """
+    size = VARIANT_SIZES[variant]
+    pil_format = VARIANT_FORMATS[fmt][0]
+    target_dir = os.path.join(VARIANT_DIR, variant)
+    target_path = os.path.join(target_dir, f"{os.path.basename(source_path)}.{fmt}")
+    if os.path.exists(target_path):
+        return target_path
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(source_path)
+
+    def generate():
+        if not os.path.exists(target_path):
+            os.makedirs(target_dir, exist_ok=True)
+            _render(source_path, target_path, size, pil_format)
+        return target_path
+    return _generating.do(target_path, generate)
@@ -0,0 +1,162 @@
+"""
+Durable job queue on Postgres.
+
+Jobs are rows in the `jobs` table, so they survive restarts and deploys and
+run in a separate worker process (app/worker.py) instead of competing with
+request handling. Workers claim jobs with `SELECT ... FOR UPDATE SKIP LOCKED`,
+so any number of worker processes can poll the same table without two of
+them getting the same job.
+
+A claimed job is invisible to other workers until `locked_until` (the
+visibility timeout). A worker that dies mid-job leaves it to be claimed again
+once that passes. A job that raises is retried with exponential backoff
+and jitter until it has used `max_attempts`, then marked failed and its
+handler's `on_give_up` is called.
+"""
+import random
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .. import models
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_VISIBILITY_TIMEOUT = 300.0  # Seconds a claimed job stays invisible to other workers
+BACKOFF_BASE = 10.0                 # Seconds before the first retry; doubles per attempt
+BACKOFF_MAX = 600.0
+
+
+class JobHandler:
+    """
+    What a worker does with one kind of job.
+
+    Args:
+        run: Called with the job's payload as keyword arguments; raising retries the job.
+        on_give_up: Optional, called with the payload once the last attempt has failed.
+    """
+
+    def __init__(self, run: Callable[..., Any], on_give_up: Optional[Callable[..., Any]] = None):
+        self.run = run
+        self.on_give_up = on_give_up
+
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any], max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+            delay_seconds: float = 0.0) -> models.Job:
+    """
+    Adds a job in the caller's transaction: workers see it once the caller
+    commits, so a job is never run for data that was rolled back.
+    """
+    job = models.Job(kind=kind, payload=payload, max_attempts=max_attempts)
+    db.add(job)
+    db.flush()
+    if delay_seconds:
+        db.execute(text("UPDATE jobs SET run_after = now() + make_interval(secs => :delay) WHERE id = :id"),
+                   {"delay": delay_seconds, "id": job.id})
+    return job
+
+
+_CLAIM_SQL = text("""
+    UPDATE jobs
+    SET status = 'running',
+        attempts = attempts + 1,
+        locked_until = now() + make_interval(secs => :visibility_timeout),
+        locked_by = :worker_id
+    WHERE id IN (
+        SELECT id FROM jobs
+        WHERE (status = 'queued' AND run_after <= now())
+           OR (status = 'running' AND locked_until < now())
+        ORDER BY run_after, id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, payload, attempts, max_attempts
+""")
+
+def claim(db: Session, worker_id: str, limit: int = 1,
+          visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> list:
+    """
+    Claims up to `limit` due jobs (or jobs whose worker's lock expired) and
+    commits the claim. Returns rows with id, kind, payload, attempts and
+    max_attempts.
+    """
+    rows = db.execute(_CLAIM_SQL, {
+        "visibility_timeout": visibility_timeout, "worker_id": worker_id, "limit": limit
+    }).mappings().all()
+    db.commit()
+    return rows
+
+
+def complete(db: Session, job_id: int, worker_id: str) -> None:
+    # Only if we still hold the job: after a lock expiry another worker owns it.
+    db.execute(text("""
+        UPDATE jobs SET status = 'done', finished_at = now(), locked_until = NULL
+        WHERE id = :id AND status = 'running' AND locked_by = :worker_id
+    """), {"id": job_id, "worker_id": worker_id})
+    db.commit()
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before the retry after `attempts` failed attempts: exponential, capped, with jitter."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def fail(db: Session, job_id: int, worker_id: str, error: str, give_up: bool, attempts: int) -> None:
+    """Records a failed attempt: requeues the job after a backoff, or marks it failed for good."""
+    if give_up:
+        db.execute(text("""
+            UPDATE jobs SET status = 'failed', finished_at = now(), locked_until = NULL, last_error = :error
+            WHERE id = :id AND status = 'running' AND locked_by = :worker_id
+        """), {"id": job_id, "worker_id": worker_id, "error": error})
+    else:
+        db.execute(text("""
+            UPDATE jobs SET status = 'queued', locked_until = NULL, last_error = :error,
+                run_after = now() + make_interval(secs => :delay)
+            WHERE id = :id AND status = 'running' AND locked_by = :worker_id
+        """), {"id": job_id, "worker_id": worker_id, "error": error, "delay": backoff_seconds(attempts)})
+    db.commit()
+
+
+def run_job(db: Session, job, handlers: Dict[str, JobHandler], worker_id: str) -> bool:
+    """
+    Runs one claimed job with its handler and records the outcome.
+    Returns whether the job succeeded.
+    """
+    handler = handlers.get(job["kind"])
+    payload = job["payload"] or {}
+    give_up = job["attempts"] >= job["max_attempts"]
+
+    if handler is None:
+        error, give_up = f"No handler for job kind '{job['kind']}'", True
+    elif job["attempts"] > job["max_attempts"]:
+        # Claimed again after its last attempt's lock expired (the worker died).
+        error = "Visibility timeout expired on the last attempt"
+    else:
+        try:
+            handler.run(**payload)
+            complete(db, job["id"], worker_id)
+            return True
+        except Exception as e:
+            db.rollback()
+            error = f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}"
+
+    fail(db, job["id"], worker_id, error, give_up, job["attempts"])
+    if give_up and handler is not None and handler.on_give_up is not None:
+        try:
+            handler.on_give_up(**payload)
+        except Exception as e:
+            print(f"Job queue: on_give_up for job {job['id']} failed: {e}")
+    return False
+
+
+def get_queue_stats(db: Session) -> Dict[str, Any]:
+    """Job counts per kind and status, and the age of the oldest due job."""
+    counts: Dict[str, Dict[str, int]] = {}
+    for kind, status, count in db.execute(text("SELECT kind, status, count(*) FROM jobs GROUP BY kind, status")):
+        counts.setdefault(kind, {})[status] = count
+    oldest = db.execute(text(
+        "SELECT extract(epoch FROM now() - min(run_after)) FROM jobs WHERE status = 'queued' AND run_after <= now()"
+    )).scalar()
+    return {"jobs": counts, "oldest_due_seconds": float(oldest or 0.0)}
@@ -0,0 +1,64 @@
+from typing import Iterable, Optional
+
+from fastapi import Query
+from sqlalchemy.orm import Session, joinedload
+
+from .. import models, schemas
+
+
+class DeltaCursor:
+    """The newest chat message and image the client already has (0 = none)."""
+
+    def __init__(self, last_message_id: int, last_image_id: int):
+        self.last_message_id = last_message_id
+        self.last_image_id = last_image_id
+
+
+def get_delta_cursor(
+    since_message_id: Optional[int] = Query(None, description="Return only chat messages newer than this id (delta response)."),
+    since_image_id: Optional[int] = Query(None, description="Return only images newer than this id (delta response).")
+) -> Optional[DeltaCursor]:
+    """
+    Dependency for endpoints that can answer with a JournalDelta. Passing
+    either cursor switches the response to delta mode; a cursor left out
+    counts as "the client has none of these yet".
+    """
+    if since_message_id is None and since_image_id is None:
+        return None
+    return DeltaCursor(last_message_id=since_message_id or 0, last_image_id=since_image_id or 0)
+
+
+def build_journal_delta(
+    db: Session,
+    journal: models.Journal,
+    cursor: DeltaCursor,
+    changed_fields: Iterable[str] = ()
+) -> schemas.JournalDelta:
+    """
+    Builds the delta straight from the rows past the cursor, so the journal
+    never has to be re-fetched with all of its messages and images. The
+    journal itself must be fresh (e.g. refreshed after commit).
+    """
+    new_messages = db.query(models.ChatMessage).options(
+        joinedload(models.ChatMessage.image)
+    ).filter(
+        models.ChatMessage.journal_id == journal.id,
+        models.ChatMessage.id > cursor.last_message_id
+    ).order_by(models.ChatMessage.timestamp, models.ChatMessage.id).all()
+
+    new_images = db.query(models.JournalImage).filter(
+        models.JournalImage.journal_id == journal.id,
+        models.JournalImage.id > cursor.last_image_id
+    ).order_by(models.JournalImage.id).all()
+
+    fields = {
+        "id": journal.id,
+        "journal_date": journal.journal_date,
+        "writing_phase": journal.writing_phase.value,
+        "updated_at": journal.updated_at,
+        "new_chat_messages": [schemas.ChatMessageOut.model_validate(msg) for msg in new_messages],
+        "new_images": [schemas.JournalImageOut.model_validate(image) for image in new_images],
+    }
+    for name in changed_fields:
+        fields[name] = getattr(journal, name)
+    return schemas.JournalDelta(**fields)
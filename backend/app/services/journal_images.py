@@ -0,0 +1,199 @@
+"""
+Journal image uploads and their AI descriptions.
+
+Uploads are stored by content: the file is named after the SHA-256 of its
+bytes and has one StoredImage row, whose `ref_count` counts the JournalImage
+rows using it. Uploading the same photo again writes no new file and reuses
+the description already made for it (gc_uploads.py removes files nothing
+refers to any more).
+
+A new JournalImage row is committed right away with
+`description_status = "pending"`, together with a `describe_image` job (see
+job_queue.py). The worker process then asks the vision model for a
+description and sets the status to "done" (or "failed", with a fallback
+description, once the job has used its attempts). Clients poll
+GET /api/journals/{journal_date}/images/{image_id} until it is no longer
+pending.
+"""
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import aiofiles
+from fastapi import UploadFile
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from .. import database, models
+from ..config import settings
+from . import ai_service, job_queue
+
+# Directory for storing user-uploaded images, and the URL it is served under
+UPLOAD_DIR = "app/static/uploads"
+UPLOAD_URL_PREFIX = "/static/uploads/"
+UPLOAD_CHUNK_SIZE = 64 * 1024
+TEMP_PREFIX = ".upload-"     # In-progress uploads, before they are renamed to their content hash
+DESCRIPTION_JOB_KIND = "describe_image"
+ADD_IMAGE_ATTEMPTS = 3       # Tries at taking a reference while gc_uploads deletes the same row
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+class UploadRejected(ValueError):
+    """An upload that is too large or not an image; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_image_extension(head: bytes) -> Optional[str]:
+    """File extension of an image from its first bytes, or None if it is not a supported image type."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+class StoredUpload(NamedTuple):
+    content_hash: str
+    file_path: str  # URL path
+    size_bytes: int
+
+
+def upload_path(file_path: str) -> str:
+    """Location on disk of an image from its URL path (JournalImage.file_path)."""
+    return os.path.join(UPLOAD_DIR, os.path.basename(file_path))
+
+
+async def save_upload(file: UploadFile, max_bytes: Optional[int] = None) -> StoredUpload:
+    """
+    Streams an upload to a temporary file in the uploads directory, one chunk
+    at a time, hashing it on the way, then atomically renames it to its
+    content hash (replacing an identical file if it was uploaded before).
+    Memory use is one chunk, whatever the size of the upload.
+
+    Raises UploadRejected (and keeps nothing) if the upload is larger than
+    `max_bytes` (default: settings.max_upload_bytes) or does not start like
+    a JPEG, PNG, GIF or WebP image. The file extension comes from that
+    check, not from the client's file name. (Request bodies well over the
+    limit never get here: see request_limits.BodySizeLimitMiddleware.)
+    """
+    max_bytes = settings.max_upload_bytes if max_bytes is None else max_bytes
+    too_large = UploadRejected(413, f"Images can be at most {max_bytes // (1024 * 1024)} MB.")
+    if file.size is not None and file.size > max_bytes:
+        raise too_large  # Known from the parsed request: no need to copy it first
+    temp_path = os.path.join(UPLOAD_DIR, f"{TEMP_PREFIX}{uuid.uuid4().hex}")
+    hasher, size, extension = hashlib.sha256(), 0, None
+    try:
+        async with aiofiles.open(temp_path, 'wb') as out_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                if extension is None:
+                    extension = sniff_image_extension(chunk)
+                    if extension is None:
+                        raise UploadRejected(415, "Only JPEG, PNG, GIF and WebP images can be uploaded.")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large
+                hasher.update(chunk)
+                await out_file.write(chunk)
+        if extension is None:
+            raise UploadRejected(400, "The uploaded file is empty.")
+        content_hash = hasher.hexdigest()
+        filename = f"{content_hash}{extension}"
+        # Also refreshes the file's mtime, which gc_uploads checks before deleting it.
+        os.replace(temp_path, os.path.join(UPLOAD_DIR, filename))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return StoredUpload(content_hash, f"{UPLOAD_URL_PREFIX}{filename}", size)
+
+
+def add_image(db: Session, journal: models.Journal, upload: StoredUpload) -> models.JournalImage:
+    """
+    Adds the image row, taking a reference on its stored file, in the
+    caller's transaction. A file that was described before gives the new
+    image its description right away; otherwise a description job is queued.
+    """
+    for _ in range(ADD_IMAGE_ATTEMPTS):
+        db.execute(insert(models.StoredImage).values(
+            content_hash=upload.content_hash, file_path=upload.file_path, size_bytes=upload.size_bytes, ref_count=0
+        ).on_conflict_do_nothing(index_elements=["content_hash"]))
+        # The lock waits for a gc_uploads run that is deleting this row; once it is gone, insert it again.
+        stored = db.query(models.StoredImage).filter(
+            models.StoredImage.content_hash == upload.content_hash
+        ).with_for_update().one_or_none()
+        if stored is not None:
+            break
+    else:
+        raise RuntimeError(f"Stored image {upload.content_hash} kept disappearing")
+    stored.ref_count += 1
+    stored.last_referenced_at = datetime.utcnow()
+
+    db_image = models.JournalImage(journal_id=journal.id, file_path=stored.file_path, content_hash=stored.content_hash)
+    if stored.ai_description:
+        db_image.ai_description = stored.ai_description
+        db_image.description_status = "done"
+        db.add(db_image)
+        return db_image
+
+    db_image.description_status = "pending"
+    db.add(db_image)
+    db.flush()
+    job_queue.enqueue(db, DESCRIPTION_JOB_KIND, {"image_id": db_image.id})
+    return db_image
+
+
+def _set_description(image_id: int, description: str, status: str) -> None:
+    db = database.SessionLocal()
+    try:
+        image = db.query(models.JournalImage).filter(models.JournalImage.id == image_id).first()
+        if image:
+            image.ai_description = description
+            image.description_status = status
+            if status == "done" and image.content_hash:
+                # Shared with later uploads of the same file (failures are not).
+                db.query(models.StoredImage).filter(
+                    models.StoredImage.content_hash == image.content_hash,
+                    models.StoredImage.ai_description.is_(None)
+                ).update({"ai_description": description}, synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+
+
+def describe_image(image_id: int) -> None:
+    """Worker handler: describes one image. Raising lets the job queue retry it."""
+    db = database.SessionLocal()
+    try:
+        image = db.query(models.JournalImage).filter(models.JournalImage.id == image_id).first()
+        if not image or image.description_status != "pending":
+            return  # Deleted, or already described
+        path = upload_path(image.file_path)
+        # A duplicate upload of the same file may have been described since this one was queued.
+        stored = db.get(models.StoredImage, image.content_hash) if image.content_hash else None
+        description = stored.ai_description if stored else None
+    finally:
+        db.close()
+
+    if not description:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        description = ai_service.get_image_description(image_bytes)
+        if not description:
+            raise RuntimeError(f"No description for image {image_id}")
+    _set_description(image_id, description, "done")
+
+
+def description_failed(image_id: int) -> None:
+    """Called by the worker once the description job has used all its attempts."""
+    _set_description(image_id, ai_service.IMAGE_DESCRIPTION_FALLBACK, "failed")
@@ -0,0 +1,160 @@
+"""
+Paragraph-level evaluation feedback with a per-paragraph cache.
+
+The draft is split into paragraphs and each paragraph is evaluated on its
+own, for up to `MAX_ITEMS_PER_PARAGRAPH` items (more when there are too few
+paragraphs to reach `MIN_FEEDBACK_ITEMS` otherwise). Results are cached in
+`Journal.session_state["paragraph_feedback"]`, keyed by a hash of the
+paragraph text and that item limit:
+
+    {"<key>": {"note": "<one-sentence comment>", "feedback_items": [...]}}
+
+so pressing "feedback" again after a small edit only re-evaluates the
+paragraphs that changed. The per-paragraph results are then merged into one
+response: at most `MAX_FEEDBACK_ITEMS` items, spread across paragraphs, with
+no item whose phrase overlaps another's.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import threading
+from typing import Any, Dict, List
+
+from . import ai_service
+
+SESSION_STATE_KEY = "paragraph_feedback"
+PROMPT_VERSION = "2"        # Bump when the paragraph prompt changes, so cached results are not reused
+MIN_PARAGRAPH_CHARS = 80    # Shorter paragraphs are evaluated together with the next one
+MIN_FEEDBACK_ITEMS = 5      # Asked for across the draft; the model may find fewer worth mentioning
+MAX_FEEDBACK_ITEMS = 7
+MAX_ITEMS_PER_PARAGRAPH = 3
+MAX_SUMMARY_NOTES = 2
+EMPTY_DRAFT_SUMMARY = "There is nothing to give feedback on yet. Write a few sentences and try again."
+
+_BLANK_LINES_RE = re.compile(r"\n\s*\n")
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """
+    Splits a draft on blank lines (or on single line breaks if it has none),
+    joining very short paragraphs such as headings to the one that follows.
+    """
+    text = (text or "").strip()
+    parts = _BLANK_LINES_RE.split(text) if _BLANK_LINES_RE.search(text) else text.split("\n")
+    paragraphs, pending = [], ""
+    for part in (part.strip() for part in parts):
+        if not part:
+            continue
+        pending = f"{pending}\n{part}" if pending else part
+        if len(pending) >= MIN_PARAGRAPH_CHARS:
+            paragraphs.append(pending)
+            pending = ""
+    if pending:
+        if paragraphs:
+            paragraphs[-1] = f"{paragraphs[-1]}\n{pending}"
+        else:
+            paragraphs.append(pending)
+    return paragraphs
+
+
+def items_per_paragraph(paragraph_count: int) -> int:
+    """Item limit per paragraph: `MAX_ITEMS_PER_PARAGRAPH`, raised so that a short draft can still reach the minimum."""
+    return max(MAX_ITEMS_PER_PARAGRAPH, math.ceil(MIN_FEEDBACK_ITEMS / max(1, paragraph_count)))
+
+
+def paragraph_key(paragraph: str, max_items: int) -> str:
+    """Cache key of a paragraph: its text (whitespace-normalized), its item limit and the prompt version."""
+    normalized = " ".join(paragraph.split())
+    return hashlib.sha256(f"{PROMPT_VERSION}\n{max_items}\n{normalized}".encode("utf-8")).hexdigest()[:24]
+
+
+def _overlaps(phrase: str, chosen: List[str]) -> bool:
+    return any(phrase in other or other in phrase for other in chosen)
+
+
+def merge_feedback(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges per-paragraph results (in paragraph order) into one evaluation.
+    Items are taken round-robin, each paragraph's most important first, so
+    the cap does not spend every slot on the first paragraph; an item whose
+    phrase contains, or is contained in, an already chosen one is dropped.
+    No results (a draft without any text) merge into an empty evaluation.
+    """
+    queues = [list(result.get("feedback_items") or []) for result in results]
+    items, chosen_phrases = [], []
+    while len(items) < MAX_FEEDBACK_ITEMS and any(queues):
+        for queue in queues:
+            if not queue or len(items) >= MAX_FEEDBACK_ITEMS:
+                continue
+            item = queue.pop(0)
+            phrase = str(item.get("incorrect_phrase") or "").strip().lower()
+            if not phrase or _overlaps(phrase, chosen_phrases):
+                continue
+            chosen_phrases.append(phrase)
+            items.append(item)
+
+    if not results:
+        return {"high_level_summary": EMPTY_DRAFT_SUMMARY, "feedback_items": []}
+    notes = [result["note"].strip() for result in results if result.get("note")]
+    summary = " ".join(notes[:MAX_SUMMARY_NOTES]) or "Nice work on your journal entry!"
+    return {"high_level_summary": summary, "feedback_items": items}
+
+
+async def evaluate_paragraphs(text: str, cache: dict) -> tuple:
+    """
+    Evaluates the paragraphs of `text` that are not in `cache`, concurrently.
+    Returns the per-paragraph results in order (None for a failed paragraph)
+    and the cache entries of the current paragraphs only, so paragraphs that
+    were edited away do not pile up in session_state.
+    """
+    paragraphs = split_paragraphs(text)
+    max_items = items_per_paragraph(len(paragraphs))
+    keys = [paragraph_key(paragraph, max_items) for paragraph in paragraphs]
+    # A paragraph that appears twice is evaluated once.
+    missing = {key: paragraph for key, paragraph in zip(keys, paragraphs) if key not in cache}
+
+    evaluated = await asyncio.gather(*(
+        ai_service.async_get_paragraph_feedback(paragraph, max_items) for paragraph in missing.values()
+    ))
+    fresh = {key: result for key, result in zip(missing, evaluated) if result is not None}
+
+    record_request(
+        paragraphs=len(paragraphs),
+        cached=len(paragraphs) - sum(1 for key in keys if key in missing),
+        evaluated_chars=sum(len(paragraph) for paragraph in missing.values()),
+        total_chars=sum(len(paragraph) for paragraph in paragraphs),
+        failures=len(missing) - len(fresh)
+    )
+    results = [cache.get(key) or fresh.get(key) for key in keys]
+    current = {key: cache.get(key) or fresh[key] for key in keys if key in cache or key in fresh}
+    return results, current
+
+
+# --- Cache Statistics ---
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "paragraphs": 0,
+    "paragraphs_cached": 0,
+    "paragraphs_evaluated": 0,
+    "paragraph_failures": 0,
+    "chars_total": 0,
+    "chars_evaluated": 0,
+}
+
+def record_request(paragraphs: int, cached: int, evaluated_chars: int, total_chars: int, failures: int) -> None:
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["paragraphs"] += paragraphs
+        _stats["paragraphs_cached"] += cached
+        _stats["paragraphs_evaluated"] += paragraphs - cached
+        _stats["paragraph_failures"] += failures
+        _stats["chars_total"] += total_chars
+        _stats["chars_evaluated"] += evaluated_chars
+
+def get_paragraph_feedback_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["cache_hit_rate"] = stats["paragraphs_cached"] / stats["paragraphs"] if stats["paragraphs"] else 0.0
+    return stats
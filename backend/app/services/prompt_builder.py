@@ -0,0 +1,200 @@
+"""
+Prompt assembly with a token budget.
+
+Every ai_service prompt is a fixed template plus variable sections (drafts,
+outlines, chat history, profiles). `build_prompt` estimates the size of the
+result and, if it would exceed the model's budget, trims the least important
+sections first, each down to no less than its own minimum. It also records
+prompt sizes per call site so long journals show up in the admin stats
+before they show up as slow or failed calls.
+"""
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from gemini_api_client import MODEL_LITE, MODEL_FLASH
+
+# Token budgets per model. Far below the models' context windows on purpose:
+# prompt length drives latency, and the proxy rejects very large bodies.
+PROMPT_BUDGETS = {
+    MODEL_LITE: 12000,
+    MODEL_FLASH: 16000,
+}
+DEFAULT_PROMPT_BUDGET = 12000
+TRUNCATION_MARKER = " [...] "
+
+# Section priorities: lower numbers are trimmed last, ESSENTIAL ones never.
+ESSENTIAL = 0
+HIGH = 1
+NORMAL = 2
+LOW = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate: about four characters per token for ASCII text,
+    one token per non-ASCII character (a pessimistic bound for other scripts).
+    """
+    if not text:
+        return 0
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return (len(text) - non_ascii + 3) // 4 + non_ascii
+
+
+def compact_json(value: Any) -> str:
+    """JSON without indentation or padding; non-ASCII text is kept as is."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class Section:
+    """
+    One variable part of a prompt.
+
+    Args:
+        text: The section's content.
+        priority: ESSENTIAL, HIGH, NORMAL or LOW; lower-priority sections are trimmed first.
+        keep: Which part survives trimming: "head", "tail" (e.g. the end of a
+              draft or the latest chat messages) or "ends" (both ends).
+        min_tokens: Trimming never goes below this.
+    """
+
+    def __init__(self, text: Optional[str], priority: int = NORMAL, keep: str = "head", min_tokens: int = 200):
+        self.text = text or ""
+        self.priority = priority
+        self.keep = keep
+        self.min_tokens = min_tokens
+        self.value = None
+        self.trimmed = False
+        self.json_encoded = False  # Measured as the JSON string it is sent as (escapes included)
+
+    @classmethod
+    def from_value(cls, value: Any, priority: int = NORMAL, min_tokens: int = 0) -> "Section":
+        """
+        A section for a JSON context value. Strings are trimmed as text; any
+        other value is measured as compact JSON and, if it has to be trimmed,
+        sent as the cut-off JSON text instead.
+        """
+        if isinstance(value, str) or value is None:
+            return cls(value, priority=priority, min_tokens=min_tokens)
+        section = cls(compact_json(value), priority=priority, min_tokens=min_tokens)
+        section.value = value
+        return section
+
+    def as_value(self) -> Any:
+        if self.value is not None and not self.trimmed:
+            return self.value
+        return self.text
+
+    def tokens(self) -> int:
+        if self.json_encoded and (self.value is None or self.trimmed):
+            return estimate_tokens(compact_json(self.text))
+        return estimate_tokens(self.text)
+
+    def trim_to(self, max_tokens: int) -> bool:
+        """Shortens the text to about `max_tokens`; returns True if anything was cut."""
+        tokens = self.tokens()
+        if tokens <= max_tokens:
+            return False
+        keep_chars = max(0, int(len(self.text) * max_tokens / tokens) - len(TRUNCATION_MARKER))
+        if self.keep == "tail":
+            self.text = TRUNCATION_MARKER.lstrip() + self.text[len(self.text) - keep_chars:]
+        elif self.keep == "ends":
+            half = keep_chars // 2
+            self.text = self.text[:half] + TRUNCATION_MARKER + self.text[len(self.text) - half:]
+        else:
+            self.text = self.text[:keep_chars] + TRUNCATION_MARKER.rstrip()
+        self.trimmed = True
+        return True
+
+
+def fit_sections(sections: Dict[str, Section], available_tokens: int) -> int:
+    """
+    Trims `sections` in place until they fit in `available_tokens`, least
+    important first, and returns how many sections had to be trimmed.
+    """
+    overflow = sum(section.tokens() for section in sections.values()) - available_tokens
+    trimmed = 0
+    for section in sorted(sections.values(), key=lambda s: s.priority, reverse=True):
+        if overflow <= 0:
+            break
+        if section.priority == ESSENTIAL:
+            continue
+        tokens = section.tokens()
+        target = max(section.min_tokens, tokens - overflow)
+        if target < tokens and section.trim_to(target):
+            overflow -= tokens - section.tokens()
+            trimmed += 1
+    return trimmed
+
+
+def build_prompt(call_site: Optional[str], model: str, template: str, budget: Optional[int] = None, **sections: Any) -> str:
+    """
+    Renders `template` with `sections` (Section objects or plain strings,
+    which count as ESSENTIAL) within the token budget of `model`. A
+    `call_site` of None leaves the prompt out of the stats.
+    """
+    sections = {name: value if isinstance(value, Section) else Section(str(value), priority=ESSENTIAL)
+                for name, value in sections.items()}
+    fixed_text = template.format(**{name: "" for name in sections})
+    trimmed, untrimmed_tokens = _fit(model, budget, fixed_text, sections)
+
+    prompt = template.format(**{name: section.text for name, section in sections.items()})
+    _record(call_site, estimate_tokens(prompt), untrimmed_tokens, trimmed)
+    return prompt
+
+
+def build_context_prompt(call_site: Optional[str], model: str, instructions: str, context: Dict[str, Any],
+                         budget: Optional[int] = None) -> str:
+    """
+    `instructions` followed by `context` as compact JSON. Context values may
+    be Sections (see `Section.from_value`); anything else is sent in full.
+    """
+    sections = {name: value if isinstance(value, Section) else Section.from_value(value, priority=ESSENTIAL)
+                for name, value in context.items()}
+    for section in sections.values():
+        section.json_encoded = True
+    fixed_text = _render_context(instructions, {name: "" for name in sections})
+    trimmed, untrimmed_tokens = _fit(model, budget, fixed_text, sections)
+
+    prompt = _render_context(instructions, {name: section.as_value() for name, section in sections.items()})
+    _record(call_site, estimate_tokens(prompt), untrimmed_tokens, trimmed)
+    return prompt
+
+
+def _render_context(instructions: str, context: Dict[str, Any]) -> str:
+    return f"{instructions}\n\nHere is the current context:\n\n---\n{compact_json(context)}\n---"
+
+
+def _fit(model: str, budget: Optional[int], fixed_text: str, sections: Dict[str, Section]):
+    """Trims `sections` to what the budget leaves after `fixed_text`; returns (trimmed count, untrimmed tokens)."""
+    budget = budget or PROMPT_BUDGETS.get(model, DEFAULT_PROMPT_BUDGET)
+    fixed_tokens = estimate_tokens(fixed_text)
+    untrimmed_tokens = fixed_tokens + sum(section.tokens() for section in sections.values())
+    return fit_sections(sections, budget - fixed_tokens), untrimmed_tokens
+
+
+# --- Per-Call-Site Statistics ---
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, Any]] = {}
+
+def _record(call_site: Optional[str], tokens: int, untrimmed_tokens: int, trimmed_sections: int) -> None:
+    if call_site is None:
+        return
+    with _stats_lock:
+        entry = _stats.setdefault(call_site, {
+            "calls": 0, "trimmed_calls": 0, "total_tokens": 0, "max_tokens": 0, "max_untrimmed_tokens": 0,
+        })
+        entry["calls"] += 1
+        entry["total_tokens"] += tokens
+        entry["max_tokens"] = max(entry["max_tokens"], tokens)
+        entry["max_untrimmed_tokens"] = max(entry["max_untrimmed_tokens"], untrimmed_tokens)
+        if trimmed_sections:
+            entry["trimmed_calls"] += 1
+
+def get_prompt_stats() -> Dict[str, Dict[str, Any]]:
+    """Estimated prompt tokens per call site: average, maximum and how often trimming kicked in."""
+    with _stats_lock:
+        stats = {call_site: dict(entry) for call_site, entry in _stats.items()}
+    for entry in stats.values():
+        entry["avg_tokens"] = entry["total_tokens"] / entry["calls"]
+    return stats
@@ -0,0 +1,91 @@
+"""
+Worker process for the durable job queue (see services/job_queue.py).
+
+Run it next to the API, from the backend directory:
+
+    python -m app.worker --concurrency 4
+
+Each of the `--concurrency` threads claims one job at a time, runs it and
+records the outcome; when the queue is empty it waits `--poll-interval`
+seconds before looking again. Several worker processes can run at once.
+SIGINT/SIGTERM stop claiming new jobs and let running ones finish.
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+
+from . import database, models
+from .services import completion_pipeline, job_queue, journal_images
+
+# Every job kind a worker knows how to run.
+JOB_HANDLERS = {
+    completion_pipeline.PROFILE_JOB_KIND: job_queue.JobHandler(
+        completion_pipeline.run_profile_job,
+        on_give_up=completion_pipeline.profile_job_failed
+    ),
+    journal_images.DESCRIPTION_JOB_KIND: job_queue.JobHandler(
+        journal_images.describe_image,
+        on_give_up=journal_images.description_failed
+    ),
+}
+
+
+def _work(worker_id: str, stop: threading.Event, poll_interval: float, visibility_timeout: float) -> None:
+    while not stop.is_set():
+        db = database.SessionLocal()
+        try:
+            jobs = job_queue.claim(db, worker_id, limit=1, visibility_timeout=visibility_timeout)
+            for job in jobs:
+                started = time.perf_counter()
+                ok = job_queue.run_job(db, job, JOB_HANDLERS, worker_id)
+                print(f"Worker {worker_id}: job {job['id']} ({job['kind']}, attempt {job['attempts']}) "
+                      f"{'done' if ok else 'failed'} in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            # Database hiccup: back off and try again rather than killing the thread.
+            print(f"Worker {worker_id}: {e}")
+            db.rollback()
+            jobs = []
+        finally:
+            db.close()
+        if not jobs:
+            stop.wait(poll_interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs background jobs from the jobs table.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "2")),
+                        help="Jobs run at the same time by this process (default: $WORKER_CONCURRENCY or 2).")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Seconds to wait when the queue is empty.")
+    parser.add_argument("--visibility-timeout", type=float, default=job_queue.DEFAULT_VISIBILITY_TIMEOUT,
+                        help="Seconds before a job claimed by a dead worker is handed out again.")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+
+    stop = threading.Event()
+    def request_stop(signum, frame):
+        print("Worker: stopping after the running jobs finish...")
+        stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=_work, args=(f"{prefix}:{i}", stop, args.poll_interval, args.visibility_timeout),
+                         name=f"worker-{i}", daemon=True)
+        for i in range(max(1, args.concurrency))
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"Worker: {len(threads)} thread(s) running jobs: {', '.join(JOB_HANDLERS)}")
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+-- LingoJourn Migration: background image descriptions
+
+-- New tables (such as jobs) are created on startup, but columns added to
+-- existing tables are not. Run this once on databases created before image
+-- descriptions moved to the background worker:
+--   psql -U oftg -d lingojourn_db -f migrations/001_image_description_status.sql -h localhost
+
+-- Existing images were described at upload time, so they start as 'done'.
+ALTER TABLE journal_images
+ADD COLUMN IF NOT EXISTS description_status VARCHAR(20) NOT NULL DEFAULT 'done';
+
+\echo 'Migration 001 (image description status) applied.'
@@ -0,0 +1,23 @@
+-- LingoJourn Migration: content-addressed upload storage
+
+-- Creates the stored_images table (also created on startup) and links
+-- journal images to it. Run once on databases created before deduplication:
+--   psql -U oftg -d lingojourn_db -f migrations/002_stored_images.sql -h localhost
+
+CREATE TABLE IF NOT EXISTS stored_images (
+    content_hash VARCHAR(64) PRIMARY KEY,
+    file_path VARCHAR(512) NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL,
+    ai_description TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    last_referenced_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- Existing uploads keep their file and have no content hash.
+ALTER TABLE journal_images
+ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64) REFERENCES stored_images (content_hash);
+
+CREATE INDEX IF NOT EXISTS ix_journal_images_content_hash ON journal_images (content_hash);
+
+\echo 'Migration 002 (stored images) applied.'
@@ -0,0 +1,132 @@
+"""
+Chat-turn concurrency benchmark (one worker = one event loop).
+
+Runs N concurrent writing-phase chat turns with quick correction enabled,
+the way `POST /api/ai/chat/{journal_date}` executes them, against a fake proxy
+with fixed latency. Meanwhile a probe coroutine stands in for the other
+requests on the same worker (logins, autosaves) and records how long it waits
+for the event loop.
+
+  blocking     - the old handler: sync ai_service calls and sync DB work
+                 directly inside `async def`
+  non-blocking - DB work in the threadpool, AI calls awaited one after the
+                 other on the async client
+  concurrent   - the current handler: as non-blocking, but the conversation
+                 and quick-correction calls are fanned out together, so a
+                 turn costs max(latencies) instead of their sum
+
+Every turn sends a distinct message, with the response cache disabled, so no
+call is answered from the cache or coalesced onto another turn's request,
+and the message is one the local grammar pre-check escalates to the model.
+
+Usage:
+    python benchmarks/bench_chat_concurrency.py --turns 8 --latency 0.5
+"""
+import argparse
+import asyncio
+import time
+
+from common import bootstrap, quiet_logging, summarize
+from fake_proxy import FakeProxy
+
+PROBE_INTERVAL = 0.02
+
+
+async def probe(lags: list, stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run_scenario(turn_factory, turns: int):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    durations = []
+
+    async def timed_turn(i):
+        started = time.perf_counter()
+        await turn_factory(i)
+        durations.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_turn(i) for i in range(turns)))
+    wall = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    return wall, durations, lags
+
+
+def shed_count(client_module) -> int:
+    """Calls the concurrency limit turned away (they get the fallback answer)."""
+    return sum(guard["limiter"]["rejected"] for guard in client_module.get_resilience_stats().values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=8, help="concurrent chat turns on one worker")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--db-ms", type=float, default=5.0, help="simulated DB time per turn (load + save)")
+    args = parser.parse_args()
+
+    with FakeProxy(latency=args.latency) as proxy:
+        bootstrap(proxy.url)
+        import gemini_api_client
+        from app.services import ai_service, grammar_precheck
+        quiet_logging()
+        gemini_api_client.configure_cache(enabled=False)
+
+        db_seconds = args.db_ms / 1000.0
+
+        def message_for(scenario, i):
+            # No pre-check rule settles "have went", so the quick correction reaches the model.
+            return f"I have went to the market with {scenario} friend number {i}."
+        assert grammar_precheck.precheck(message_for("blocking", 0)) is None
+
+        async def blocking_turn(i):
+            message = message_for("blocking", i)
+            time.sleep(db_seconds / 2)
+            ai_service.get_writing_partner_response(message, "- market trip", "")
+            ai_service.get_quick_correction(message)
+            time.sleep(db_seconds / 2)
+
+        async def non_blocking_turn(i):
+            message = message_for("non-blocking", i)
+            await asyncio.to_thread(time.sleep, db_seconds / 2)
+            await ai_service.async_get_writing_partner_response(message, "- market trip", "")
+            await ai_service.async_get_quick_correction(message)
+            await asyncio.to_thread(time.sleep, db_seconds / 2)
+
+        async def concurrent_turn(i):
+            message = message_for("concurrent", i)
+            await asyncio.to_thread(time.sleep, db_seconds / 2)
+            await asyncio.gather(
+                ai_service.async_get_writing_partner_response(message, "- market trip", ""),
+                ai_service.async_get_quick_correction(message),
+                return_exceptions=True,
+            )
+            await asyncio.to_thread(time.sleep, db_seconds / 2)
+
+        print(f"{args.turns} concurrent turns, model latency {args.latency * 1000:.0f}ms, "
+              f"2 model calls per turn, response cache off\n")
+        for name, factory in (("blocking", blocking_turn), ("non-blocking", non_blocking_turn),
+                              ("concurrent", concurrent_turn)):
+            sent_before = proxy.request_count
+            shed_before = shed_count(gemini_api_client)
+            wall, durations, lags = asyncio.run(run_scenario(factory, args.turns))
+            print(f"[{name}]")
+            print(f"  wall time       : {wall:.2f}s ({args.turns / wall:.2f} turns/s)")
+            print(f"  turn latency    : {summarize(durations)}")
+            print(f"  event-loop lag  : {summarize(lags)}")
+            print(f"  proxy requests  : {proxy.request_count - sent_before}")
+            print(f"  calls shed      : {shed_count(gemini_api_client) - shed_before}")
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Microbenchmark for `extract_json_from_text`.
+
+Compares the current single-pass scanner (with and without orjson) against
+the previous approach, which tried `raw_decode` at every '{' / '[' and so
+went quadratic on long prose full of brackets. Inputs cover realistic model
+outputs (fenced block, bare object after prose, large evaluation payload)
+and adversarial ones (many stray brackets before, or instead of, the JSON).
+
+Usage:
+    python benchmarks/bench_extract_json.py --repeat 20
+    python benchmarks/bench_extract_json.py --repeat 3 --scale 4   # shows quadratic vs linear growth
+"""
+import argparse
+import json
+import logging
+import re
+import time
+
+from common import bootstrap
+
+bootstrap()
+import gemini_api_client.client as client  # noqa: E402
+
+
+def legacy_extract_json_from_text(text: str):
+    """The pre-scanner implementation, kept here as the baseline."""
+    match = re.search(r"```json\s*([\s\S]*?)\s*```", text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(1))
+        except json.JSONDecodeError:
+            pass
+    decoder = json.JSONDecoder()
+    idx = 0
+    while idx < len(text):
+        starts = [pos for pos in (text.find('{', idx), text.find('[', idx)) if pos != -1]
+        if not starts:
+            break
+        obj_start = min(starts)
+        try:
+            return decoder.raw_decode(text, obj_start)[0]
+        except json.JSONDecodeError:
+            idx = obj_start + 1
+    return None
+
+
+def build_inputs(scale: int):
+    feedback = {
+        "high_level_summary": "A vivid entry with a few tense slips.",
+        "feedback_items": [
+            {"category": "Grammar", "incorrect_phrase": f"I goed {i}", "suggestion": f"I went {i}",
+             "explanation": "Use the past tense of 'go' here. Escaped \"quotes\" and {braces} stay inside strings."}
+            for i in range(200)
+        ],
+    }
+    payload = json.dumps(feedback, indent=2)
+    prose = "The student wrote about their weekend trip to the mountains. " * 40
+    return {
+        "fenced block": f"Sure! Here is the evaluation:\n```json\n{payload}\n```\nLet me know.",
+        "bare object after prose": f"{prose}\n{payload}\nHope this helps.",
+        "large payload only": payload,
+        "brackets in prose, then JSON": ("Use [brackets] like {this} or [that]. " * 500 * scale) + payload,
+        "many unclosed braces, no JSON": "{ " * 5000 * scale + "no json here",
+        "unclosed brace before JSON": "Note: { this aside never closes. " + prose + payload,
+    }
+
+
+def time_call(fn, text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(text)
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--scale", type=int, default=1, help="size multiplier for the adversarial inputs")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    orjson_module = client.orjson
+    variants = [("legacy", legacy_extract_json_from_text)]
+    if orjson_module is not None:
+        variants.append(("scanner+orjson", client.extract_json_from_text))
+
+    def scanner_stdlib(text):
+        client.orjson = None
+        try:
+            return client.extract_json_from_text(text)
+        finally:
+            client.orjson = orjson_module
+    variants.insert(1, ("scanner", scanner_stdlib))
+
+    print(f"{'input':<32}{'chars':>8}" + "".join(f"{name:>18}" for name, _ in variants))
+    for label, text in build_inputs(args.scale).items():
+        row = f"{label:<32}{len(text):>8}"
+        baseline = None
+        for name, fn in variants:
+            seconds, result = time_call(fn, text, args.repeat)
+            if baseline is None:
+                baseline = result
+            elif result != baseline:
+                row += f"{'MISMATCH':>18}"
+                continue
+            row += f"{seconds * 1000:>16.3f}ms"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Quick-correction pre-check: hit rate and accuracy on labelled sample sets.
+
+Runs `grammar_precheck.precheck` over chat messages labelled "no_errors" or
+"correction_found" (with the expected fix where there is one) and reports
+how many messages are answered locally instead of going to the model, how
+often those local answers are right, and the per-message cost of the check.
+
+There are two sets in benchmarks/data:
+- quick_correction_samples.jsonl: the messages the rules were written
+  against. Its accuracy flatters the rules.
+- quick_correction_holdout.jsonl: messages written separately and never used
+  to tune the rules. Quote this one; when a held-out message leads to a rule
+  change, move it to the tuning set and add a fresh one here.
+
+Usage:
+    python benchmarks/bench_grammar_precheck.py
+    python benchmarks/bench_grammar_precheck.py --verbose   # list escalations and mistakes
+"""
+import argparse
+import json
+import os
+import time
+
+from common import bootstrap, percentile
+
+bootstrap()
+from app.services import grammar_precheck  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SAMPLE_SETS = {
+    "tuning set": os.path.join(DATA_DIR, "quick_correction_samples.jsonl"),
+    "held-out set": os.path.join(DATA_DIR, "quick_correction_holdout.jsonl"),
+}
+
+
+def load_samples(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def judge(sample, result):
+    """'escalated', 'correct', 'missed error', 'false alarm' or 'wrong fix'."""
+    if result is None:
+        return "escalated"
+    if sample["status"] == "no_errors":
+        return "correct" if result["status"] == "no_errors" else "false alarm"
+    if result["status"] == "no_errors":
+        return "missed error"
+    expected = sample.get("fix")
+    if expected is None or expected.lower() in result["suggestion"].lower():
+        return "correct"
+    return "wrong fix"
+
+
+def run(name, samples, verbose):
+    outcomes = {}
+    durations = []
+    for sample in samples:
+        started = time.perf_counter()
+        result = grammar_precheck.precheck(sample["message"])
+        durations.append(time.perf_counter() - started)
+        verdict = judge(sample, result)
+        outcomes.setdefault(verdict, []).append((sample, result))
+
+    local = len(samples) - len(outcomes.get("escalated", []))
+    correct = len(outcomes.get("correct", []))
+    print(f"{name}: {len(samples)} samples")
+    print(f"  answered local: {local} ({local / len(samples):.1%} hit rate), escalated: {len(samples) - local}")
+    print(f"  local accuracy: {correct}/{local} ({correct / local:.1%})" if local else "  local accuracy: n/a")
+    for verdict in ("missed error", "false alarm", "wrong fix"):
+        print(f"    {verdict + ':':<14}{len(outcomes.get(verdict, []))}")
+    print(f"  check time:     p50={percentile(durations, 50) * 1e6:.0f}us "
+          f"p99={percentile(durations, 99) * 1e6:.0f}us max={max(durations) * 1e6:.0f}us")
+
+    if verbose:
+        for verdict in ("missed error", "false alarm", "wrong fix", "escalated"):
+            for sample, result in outcomes.get(verdict, []):
+                print(f"  [{verdict}] {sample['message']!r} -> {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", help="Run only this sample file instead of both sets.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    grammar_precheck.load_dictionary()
+    sample_sets = {os.path.basename(args.samples): args.samples} if args.samples else SAMPLE_SETS
+    for name, path in sample_sets.items():
+        run(name, load_samples(path), args.verbose)
+    if grammar_precheck.SpellChecker is None:
+        print("(pyspellchecker is not installed: spell check disabled, more messages escalate)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Hedged-request benchmark.
+
+Two fake proxy endpoints answer most calls quickly but a fraction of calls
+hit a long tail (as model calls do). The same workload runs against the
+endpoint pool with hedging off and on; hedging should cut p99 sharply while
+sending only a small share of extra requests.
+
+A final scenario checks the sync client under saturation: calls to one
+model hang long enough to tie up every hedge worker, and hedge-enabled calls
+to another model must still answer at their normal latency instead of
+queueing behind them. The script exits non-zero if they do not.
+
+Usage:
+    python benchmarks/bench_hedging.py --calls 400 --concurrency 8
+"""
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+
+from common import bootstrap, quiet_logging, summarize
+from fake_proxy import DEFAULT_BODY, FakeProxy
+
+STUCK_MARKER = "[stuck]"
+
+
+def tail_latency(fast: float, slow: float, slow_share: float):
+    def latency():
+        return slow if random.random() < slow_share else fast * random.uniform(0.8, 1.2)
+    return latency
+
+
+async def run(client_module, calls: int, concurrency: int, hedge: bool):
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await client_module.async_query_api_with_retries(
+                f"hedge={hedge} call {i}", client_module.MODEL_LITE, use_cache=False, hedge=hedge
+            )
+            durations.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return durations
+
+
+def stuck_body(hang: float):
+    """Answers prompts carrying STUCK_MARKER only after `hang` extra seconds."""
+    def body(raw: bytes) -> str:
+        if STUCK_MARKER.encode() in raw:
+            time.sleep(hang)
+        return DEFAULT_BODY
+    return body
+
+
+def saturate(client_module, workers: int, hang: float, probes: int):
+    """
+    Ties up every hedge worker with hanging MODEL_FLASH calls, then times
+    sequential hedge-enabled MODEL_LITE calls made while they hang.
+    """
+    def call(prompt, model):
+        return client_module.query_api_with_retries(prompt, model, use_cache=False, hedge=True)
+
+    for i in range(25):  # Past HEDGE_MIN_SAMPLES, so these calls go through the hedge workers
+        call(f"warm-up {i}", client_module.MODEL_FLASH)
+
+    callers = [threading.Thread(target=call, args=(f"{STUCK_MARKER} {i}", client_module.MODEL_FLASH))
+               for i in range(workers + 4)]
+    for caller in callers:
+        caller.start()
+    time.sleep(0.3)  # Let them claim the workers
+
+    durations = []
+    for i in range(probes):
+        started = time.perf_counter()
+        call(f"probe {i}", client_module.MODEL_LITE)
+        durations.append(time.perf_counter() - started)
+    for caller in callers:
+        caller.join()
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fast", type=float, default=0.05, help="typical latency (s)")
+    parser.add_argument("--slow", type=float, default=1.0, help="tail latency (s)")
+    parser.add_argument("--slow-share", type=float, default=0.04, help="share of calls in the tail")
+    parser.add_argument("--hang", type=float, default=3.0, help="how long saturating calls hang (s)")
+    parser.add_argument("--probes", type=int, default=20, help="calls timed while the hedge workers are busy")
+    args = parser.parse_args()
+
+    latency = tail_latency(args.fast, args.slow, args.slow_share)
+    body = stuck_body(args.hang)
+    with FakeProxy(latency=latency, body=body) as first, FakeProxy(latency=latency, body=body) as second:
+        bootstrap(first.url)
+        import gemini_api_client
+        quiet_logging()
+        gemini_api_client.configure_endpoints([first.url, second.url])
+
+        for hedge in (False, True):
+            sent_before = first.request_count + second.request_count
+            durations = asyncio.run(run(gemini_api_client, args.calls, args.concurrency, hedge))
+            sent = first.request_count + second.request_count - sent_before
+            print(f"[hedge={'on' if hedge else 'off'}] {args.calls} calls, {sent} upstream requests "
+                  f"(+{(sent - args.calls) / args.calls:.1%})")
+            print(f"  latency: {summarize(durations)}")
+
+        stats = gemini_api_client.get_hedging_stats()[gemini_api_client.MODEL_LITE]
+        print("\nclient hedging stats:", {k: (round(v, 4) if isinstance(v, float) else v) for k, v in stats.items()})
+
+        from gemini_api_client.client import HEDGE_WORKERS
+        durations = saturate(gemini_api_client, HEDGE_WORKERS, args.hang, args.probes)
+        stats = gemini_api_client.get_hedging_stats()
+        print(f"\n[saturated] {HEDGE_WORKERS + 4} calls hanging for {args.hang:.1f}s, "
+              f"{args.probes} sync calls timed meanwhile")
+        print(f"  latency: {summarize(durations)}")
+        print(f"  ran without a free hedge worker: "
+              f"{sum(stats[model]['no_worker'] for model in stats)}")
+        if max(durations) >= args.hang / 2:
+            print("FAIL: hedge-enabled calls waited for busy hedge workers")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Writing-partner time-to-first-token benchmark.
+
+A fake proxy "generates" a writing-partner reply word by word (a fixed
+delay before the first word, then a delay per word). The same prompts are
+answered through the blocking-until-done service call and through the
+streaming one; for each we record when the first text is available to send
+to the student and when the reply is complete.
+
+Usage:
+    python benchmarks/bench_streaming.py --turns 10 --latency 0.3 --token-delay 0.03
+"""
+import argparse
+import asyncio
+import time
+
+from common import bootstrap, quiet_logging, summarize
+from fake_proxy import FakeProxy
+
+REPLY = ("That's a lovely start! You could describe what the park looked like and how you felt "
+         "when you arrived. Which moment of the afternoon do you remember most clearly, and why?")
+
+
+async def full_reply(ai_service, i):
+    started = time.perf_counter()
+    await ai_service.async_get_writing_partner_response(f"turn {i}: what should I add?", "", "")
+    done = time.perf_counter() - started
+    return done, done
+
+
+async def streamed_reply(ai_service, i):
+    started = time.perf_counter()
+    first = None
+    async for _ in ai_service.async_stream_writing_partner_response(f"turn {i}: what should I add?", "", ""):
+        if first is None:
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds to the first word")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="seconds per further word")
+    args = parser.parse_args()
+
+    with FakeProxy(latency=args.latency, body=REPLY, token_delay=args.token_delay) as proxy:
+        bootstrap(proxy.url)
+        from app.services import ai_service
+        quiet_logging()
+
+        async def run(turn):
+            first, total = [], []
+            for i in range(args.turns):
+                # Distinct prompts per scenario so the response cache never answers.
+                ttft, done = await turn(ai_service, f"{turn.__name__}-{i}")
+                first.append(ttft)
+                total.append(done)
+            return first, total
+
+        for turn in (full_reply, streamed_reply):
+            first, total = asyncio.run(run(turn))
+            print(f"[{turn.__name__}]")
+            print(f"  first text: {summarize(first)}")
+            print(f"  complete:   {summarize(total)}")
+
+
+if __name__ == "__main__":
+    main()
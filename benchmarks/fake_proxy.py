@@ -0,0 +1,122 @@
+"""
+A stand-in for the local Gemini proxy (`/poso`) used by the benchmarks.
+
+It answers every POST after a configurable delay with a body that satisfies
+all of our call sites: a fenced JSON block that parses as a scaffolding
+action and as a "no_errors" quick correction, and is harmless as plain text.
+It can also mimic token-by-token generation and stream the answer back in
+chunks to requests that ask for it with `"stream": true`.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BODY = "```json\n" + json.dumps({
+    "action": "ASK_QUESTION",
+    "payload": {"question": "What happened next?"},
+    "status": "no_errors",
+}) + "\n```"
+
+
+def _wants_stream(raw: bytes) -> bool:
+    try:
+        return bool(json.loads(raw).get("stream"))
+    except (ValueError, AttributeError):
+        return False
+
+
+class FakeProxy:
+    """
+    Runs a threaded HTTP server on a free local port.
+
+    Args:
+        latency: Seconds to wait before answering, or a zero-argument callable
+                 returning that number (for latency distributions).
+        body: Response body, or a callable taking the raw request bytes.
+        token_delay: Seconds the "model" spends per word after `latency`
+                     (time to first token). Streaming requests get each word
+                     as it is produced; others get the body once it is done.
+    """
+
+    def __init__(self, latency=0.5, body=DEFAULT_BODY, token_delay=0.0):
+        self.latency = latency
+        self.body = body
+        self.token_delay = token_delay
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/poso"
+
+    def _make_handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real proxy
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with proxy._lock:
+                    proxy.request_count += 1
+                delay = proxy.latency() if callable(proxy.latency) else proxy.latency
+                time.sleep(delay)
+                body = proxy.body(raw) if callable(proxy.body) else proxy.body
+                if proxy.token_delay:
+                    tokens = body.split(" ")
+                    tokens = [token + " " for token in tokens[:-1]] + tokens[-1:]
+                    if _wants_stream(raw):
+                        self._stream(tokens)
+                        return
+                    time.sleep(proxy.token_delay * len(tokens))
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up on this request (e.g. a losing hedge).
+
+            def _stream(self, tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        time.sleep(proxy.token_delay)
+                        data = token.encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeProxy":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self) -> "FakeProxy":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
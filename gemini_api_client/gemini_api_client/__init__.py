@@ -13,9 +13,45 @@ __version__ = "0.1.0"
 # `gemini_api_client.query_api_with_retries(...)`
 from .client import (
     query_api_with_retries,
+    stream_query_api,
     format_list_as_indexed_string,
     extract_json_from_text,
+    get_coalescing_stats,
     MODEL_LITE,
     MODEL_FLASH,
     API_URL
 )
+from .async_client import (
+    AsyncGeminiClient,
+    async_query_api_with_retries,
+    async_stream_query_api,
+    get_default_async_client,
+    aclose_default_async_client
+)
+from .cache import (
+    ResponseCache,
+    make_cache_key,
+    get_response_cache,
+    configure_cache,
+    get_cache_stats
+)
+from .singleflight import SingleFlight, AsyncSingleFlight
+from .endpoints import (
+    EndpointPool,
+    get_endpoint_pool,
+    configure_endpoints,
+    get_endpoint_stats
+)
+from .hedging import HedgePolicy, get_hedge_policy, get_hedging_stats
+from .ratelimit import (
+    RateLimiter,
+    get_rate_limiter,
+    configure_rate_limit,
+    get_rate_limit_stats
+)
+from .resilience import (
+    CircuitBreaker,
+    AdaptiveLimiter,
+    get_model_guard,
+    get_resilience_stats
+)
@@ -0,0 +1,431 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from .cache import get_response_cache, make_cache_key
+from .client import _build_request_kwargs, _parse_response_text
+from .endpoints import EndpointPool, get_endpoint_pool
+from .hedging import get_hedge_policy
+from .ratelimit import get_rate_limiter
+from .resilience import get_model_guard
+from .singleflight import AsyncSingleFlight
+
+# --- Pool Defaults ---
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 16
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+
+class AsyncGeminiClient:
+    """
+    Non-blocking counterpart of `query_api_with_retries`.
+
+    One instance owns an `httpx.AsyncClient` whose keep-alive connection pool
+    is shared by every call made through it. The underlying client is created
+    lazily on first use. A pool cannot be shared across event loops, so each
+    loop the instance is used from gets its own; `aclose` closes all of them.
+    Connections of a loop that was closed without `aclose` (e.g. an
+    `asyncio.run` in a script) died with it and are dropped.
+
+    Requests go to `api_url` if given, otherwise they are balanced over the
+    shared endpoint pool (see `configure_endpoints`).
+
+    Usage:
+        async with AsyncGeminiClient() as client:
+            result = await client.query(prompt, MODEL_LITE)
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    ):
+        self.api_url = api_url
+        self._pool = EndpointPool([api_url]) if api_url else None
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._connect_timeout = connect_timeout
+        self._clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._clients_lock = threading.Lock()
+        self._inflight = AsyncSingleFlight()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                for other in [other for other in self._clients if other.is_closed()]:
+                    # Its connections went with the loop; they cannot be closed from this one.
+                    del self._clients[other]
+                client = self._clients[loop] = httpx.AsyncClient(limits=self._limits)
+        return client
+
+    async def _post(self, url: str, prompt: str, model: str, image: Optional[bytes], timeout: float) -> httpx.Response:
+        client = self._get_client()
+        response = await client.post(
+            url,
+            timeout=httpx.Timeout(timeout, connect=min(self._connect_timeout, timeout)),
+            **_build_request_kwargs(prompt, model, image)
+        )
+        response.raise_for_status()  # Raises httpx.HTTPStatusError for 4xx/5xx
+        return response
+
+    async def _request_with_retries(
+        self,
+        prompt: str,
+        model: str,
+        image: Optional[bytes],
+        max_retries: int,
+        initial_backoff: float,
+        timeout: float,
+        outjson: bool,
+        tried: Optional[set] = None
+    ) -> Optional[Dict[str, Any]]:
+        guard = get_model_guard(model)
+        pool = self._pool or get_endpoint_pool()
+        limiter = get_rate_limiter()
+        tried = set() if tried is None else tried
+        backoff = initial_backoff
+        attempt = 0
+
+        while attempt < max_retries:
+            if limiter is not None:
+                await limiter.acquire_async()
+            if not await guard.enter_async():
+                return None
+
+            endpoint = pool.select(exclude=tried)
+            tried.add(endpoint.url)
+            logging.info(f"Attempt {attempt + 1}/{max_retries} to query API (async) for model {model} via {endpoint.url}...")
+            started = time.monotonic()
+            healthy = False
+            cancelled = False
+            try:
+                response = await self._post(endpoint.url, prompt, model, image, timeout)
+                healthy = True
+                parsed_data = _parse_response_text(response.text, outjson)
+                logging.info("Successfully received and parsed API response.")
+                get_hedge_policy(model).observe(time.monotonic() - started)
+                return parsed_data
+
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            except httpx.HTTPError as e:
+                logging.error(f"A network-related error occurred: {e}")
+                if pool.has_alternative(tried):
+                    logging.info("Failing over to another endpoint.")
+                    continue
+            except ValueError as e:
+                logging.error(f"A data-related error occurred: {e}")
+            finally:
+                if cancelled:
+                    # Cancelled by us (losing hedge) or by the caller: not the endpoint's fault.
+                    pool.abandon(endpoint)
+                    guard.abandon()
+                else:
+                    latency = time.monotonic() - started
+                    pool.release(endpoint, healthy, latency)
+                    guard.exit(healthy, latency)
+
+            attempt += 1
+            if attempt < max_retries:
+                logging.info(f"Retrying in {backoff:.2f} seconds...")
+                await asyncio.sleep(backoff)
+                backoff *= 2
+            else:
+                logging.critical("All API query retries failed. Giving up.")
+
+        return None
+
+    async def _hedged_request(
+        self,
+        prompt: str,
+        model: str,
+        image: Optional[bytes],
+        max_retries: int,
+        initial_backoff: float,
+        timeout: float,
+        outjson: bool
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Runs the request and, if it has not answered by the model's hedge
+        delay (a high percentile of recent latency), sends a duplicate,
+        preferably to another endpoint. The first valid response wins and the
+        other request is cancelled.
+        """
+        policy = get_hedge_policy(model)
+        delay = policy.delay()
+        started = time.monotonic()
+        args = (prompt, model, image, max_retries, initial_backoff, timeout, outjson)
+
+        if delay is None:
+            result = await self._request_with_retries(*args)
+            policy.record_call(time.monotonic() - started, hedge_won=False)
+            return result
+
+        tried = set()
+        tasks = [asyncio.ensure_future(self._request_with_retries(*args, tried))]
+        result, winner = None, None
+        pending = set(tasks)
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and policy.try_start_hedge():
+                logging.info(f"No answer from model {model} after {delay:.2f}s; sending a hedged request.")
+                tasks.append(asyncio.ensure_future(self._request_with_retries(*args, tried)))
+                pending.add(tasks[1])
+
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    value = task.result()
+                    if value is not None and winner is None:
+                        result, winner = value, task
+        finally:
+            for task in pending:
+                task.cancel()
+
+        policy.record_call(time.monotonic() - started, hedge_won=len(tasks) > 1 and winner is tasks[1])
+        return result
+
+    async def query(
+        self,
+        prompt: str,
+        model: str,
+        image: Optional[bytes] = None,
+        max_retries: int = 1,
+        initial_backoff: float = 1.0,
+        timeout: float = 90,
+        outjson: bool = True,
+        use_cache: bool = True,
+        coalesce: bool = True,
+        hedge: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Posts a prompt and an optional image to the API without blocking the
+        event loop. Same arguments, retry/backoff, caching, coalescing,
+        hedging and JSON-extraction semantics as `query_api_with_retries`.
+
+        Returns:
+            The parsed response as a dictionary or text, or None if all retries fail.
+        """
+        cache = get_response_cache() if use_cache else None
+        request_key = make_cache_key(model, prompt, image, outjson)
+        if cache is not None:
+            cached = cache.get(request_key)
+            if cached is not None:
+                logging.info(f"Serving cached API response for model {model}.")
+                return cached
+
+        async def fetch():
+            request = self._hedged_request if hedge else self._request_with_retries
+            parsed_data = await request(
+                prompt, model, image, max_retries, initial_backoff, timeout, outjson
+            )
+            if cache is not None:
+                cache.set(request_key, parsed_data)
+            return parsed_data
+
+        if coalesce:
+            return await self._inflight.do(request_key, fetch)
+        return await fetch()
+
+    async def stream(
+        self,
+        prompt: str,
+        model: str,
+        image: Optional[bytes] = None,
+        max_retries: int = 1,
+        initial_backoff: float = 1.0,
+        timeout: float = 90,
+        use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Yields a plain-text answer in pieces as the proxy sends them. Same
+        retry, failover, caching and early-close semantics as
+        `stream_query_api`; `timeout` applies to each read, not the whole answer.
+        """
+        cache = get_response_cache() if use_cache else None
+        request_key = make_cache_key(model, prompt, image, False)
+        if cache is not None:
+            cached = cache.get(request_key)
+            if cached is not None:
+                logging.info(f"Serving cached API response for model {model}.")
+                yield cached
+                return
+
+        guard = get_model_guard(model)
+        pool = self._pool or get_endpoint_pool()
+        limiter = get_rate_limiter()
+        tried = set()
+        backoff = initial_backoff
+        attempt = 0
+
+        while attempt < max_retries:
+            if limiter is not None:
+                await limiter.acquire_async()
+            if not await guard.enter_async():
+                return
+
+            endpoint = pool.select(exclude=tried)
+            tried.add(endpoint.url)
+            logging.info(f"Attempt {attempt + 1}/{max_retries} to stream API response (async) for model {model} via {endpoint.url}...")
+            started = time.monotonic()
+            healthy = False
+            abandoned = False
+            pieces = []
+            try:
+                async with self._get_client().stream(
+                    "POST",
+                    endpoint.url,
+                    timeout=httpx.Timeout(timeout, connect=min(self._connect_timeout, timeout)),
+                    **_build_request_kwargs(prompt, model, image, stream=True)
+                ) as response:
+                    response.raise_for_status()
+                    async for text in response.aiter_text():
+                        if text:
+                            pieces.append(text)
+                            yield text
+                healthy = True
+
+            except (GeneratorExit, asyncio.CancelledError):
+                abandoned = True
+                raise
+            except httpx.HTTPError as e:
+                logging.error(f"A network-related error occurred while streaming: {e}")
+                if pieces:
+                    raise
+                if pool.has_alternative(tried):
+                    logging.info("Failing over to another endpoint.")
+                    continue
+            finally:
+                if abandoned:
+                    # The caller stopped reading or went away; not the endpoint's fault.
+                    pool.abandon(endpoint)
+                    guard.abandon()
+                else:
+                    latency = time.monotonic() - started
+                    pool.release(endpoint, healthy, latency)
+                    guard.exit(healthy, latency)
+
+            if pieces:
+                logging.info("Successfully streamed API response.")
+                if cache is not None:
+                    cache.set(request_key, "".join(pieces))
+                return
+            if healthy:
+                logging.error("A data-related error occurred: the streamed response was empty.")
+
+            attempt += 1
+            if attempt < max_retries:
+                logging.info(f"Retrying in {backoff:.2f} seconds...")
+                await asyncio.sleep(backoff)
+                backoff *= 2
+            else:
+                logging.critical("All API query retries failed. Giving up.")
+
+    def coalescing_stats(self) -> Dict[str, int]:
+        return self._inflight.stats()
+
+    async def aclose(self) -> None:
+        """
+        Closes the connection pools of every event loop this client has been
+        used from (a pool on another running loop is closed on that loop). The
+        client can still be reused afterwards.
+        """
+        with self._clients_lock:
+            clients, self._clients = self._clients, {}
+        current = asyncio.get_running_loop()
+        for loop, client in clients.items():
+            if client.is_closed or loop.is_closed():
+                continue
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    async def __aenter__(self) -> "AsyncGeminiClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+# --- Shared Default Client ---
+_default_client: Optional[AsyncGeminiClient] = None
+
+def get_default_async_client() -> AsyncGeminiClient:
+    """Returns the process-wide client used by `async_query_api_with_retries`."""
+    global _default_client
+    if _default_client is None:
+        _default_client = AsyncGeminiClient()
+    return _default_client
+
+async def aclose_default_async_client() -> None:
+    """Closes the shared pool; call this on application shutdown."""
+    if _default_client is not None:
+        await _default_client.aclose()
+
+async def async_query_api_with_retries(
+    prompt: str,
+    model: str,
+    image: Optional[bytes] = None,
+    max_retries: int = 1,
+    initial_backoff: float = 1.0,
+    timeout: float = 90,
+    outjson: bool = True,
+    use_cache: bool = True,
+    coalesce: bool = True,
+    hedge: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Async drop-in for `query_api_with_retries` that goes through the shared,
+    keep-alive connection pool of the default `AsyncGeminiClient`.
+    """
+    return await get_default_async_client().query(
+        prompt=prompt,
+        model=model,
+        image=image,
+        max_retries=max_retries,
+        initial_backoff=initial_backoff,
+        timeout=timeout,
+        outjson=outjson,
+        use_cache=use_cache,
+        coalesce=coalesce,
+        hedge=hedge
+    )
+
+def async_stream_query_api(
+    prompt: str,
+    model: str,
+    image: Optional[bytes] = None,
+    max_retries: int = 1,
+    initial_backoff: float = 1.0,
+    timeout: float = 90,
+    use_cache: bool = True
+) -> AsyncIterator[str]:
+    """
+    Async counterpart of `stream_query_api`, on the shared connection pool
+    of the default `AsyncGeminiClient`. Use with `async for`; closing the
+    returned iterator early ends the upstream request right away.
+    """
+    return get_default_async_client().stream(
+        prompt=prompt,
+        model=model,
+        image=image,
+        max_retries=max_retries,
+        initial_backoff=initial_backoff,
+        timeout=timeout,
+        use_cache=use_cache
+    )
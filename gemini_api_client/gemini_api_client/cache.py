@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# --- Defaults (overridable per deployment) ---
+DEFAULT_MAX_ENTRIES = int(os.environ.get('GEMINI_CACHE_SIZE', '512'))
+DEFAULT_TTL = float(os.environ.get('GEMINI_CACHE_TTL', '600'))
+DEFAULT_PATH = os.environ.get('GEMINI_CACHE_PATH') or None
+
+
+def make_cache_key(model: str, prompt: str, image: Optional[bytes] = None, outjson: bool = True) -> str:
+    """
+    Content-addressed key for one API request: (model, prompt hash, image hash, outjson).
+    """
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    image_hash = hashlib.sha256(image).hexdigest() if image else '-'
+    raw = f"{model}\0{prompt_hash}\0{image_hash}\0{int(bool(outjson))}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of successful API responses with a per-entry TTL.
+
+    Values are stored as JSON text, so every hit hands the caller a fresh
+    copy that is safe to mutate. If `path` is given, entries are also written
+    to an SQLite file, which lets them survive restarts and be shared between
+    worker processes on the same host.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, json_text)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if path:
+            self._open_disk(path)
+
+    # --- On-disk layer ---
+    def _open_disk(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        row = self._db.execute(
+            "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        return expires_at, value
+
+    def _disk_set(self, key: str, expires_at: float, value: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at)
+        )
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+    # --- Public API ---
+    def get(self, key: str) -> Optional[Any]:
+        """Returns a copy of the cached value, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+
+            if self._db is not None:
+                try:
+                    entry = self._disk_get(key, now)
+                except sqlite3.Error as e:
+                    logging.error(f"Response cache disk read failed: {e}")
+                    entry = None
+                if entry is not None:
+                    self._store(key, entry)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return json.loads(entry[1])
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Caches a successful response. Falsy values are never cached."""
+        if not value:
+            return
+        try:
+            text = json.dumps(value)
+        except (TypeError, ValueError):
+            return
+        entry = (time.time() + self.ttl, text)
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                try:
+                    self._disk_set(key, *entry)
+                except sqlite3.Error as e:
+                    logging.error(f"Response cache disk write failed: {e}")
+
+    def _store(self, key: str, entry: tuple) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "persistent": self._db is not None,
+            }
+
+
+# --- Shared Default Cache ---
+_response_cache: Optional[ResponseCache] = ResponseCache(path=DEFAULT_PATH)
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Returns the cache used by the query functions, or None if disabled."""
+    return _response_cache
+
+def configure_cache(
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    ttl: float = DEFAULT_TTL,
+    path: Optional[str] = None,
+    enabled: bool = True
+) -> Optional[ResponseCache]:
+    """Replaces the shared cache (e.g. to enable disk persistence or disable caching)."""
+    global _response_cache
+    _response_cache = ResponseCache(max_entries=max_entries, ttl=ttl, path=path) if enabled else None
+    return _response_cache
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the shared cache, for monitoring saved proxy traffic."""
+    if _response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_response_cache.stats()}
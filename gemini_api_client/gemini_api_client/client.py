@@ -1,9 +1,25 @@
 import requests
+import requests.adapters
+import codecs
 import json
 import time
 import re
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up, see the 'fast' extra.
+    orjson = None
+
+from .cache import get_response_cache, make_cache_key
+from .endpoints import DEFAULT_API_URLS, get_endpoint_pool
+from .hedging import get_hedge_policy
+from .ratelimit import get_rate_limiter
+from .resilience import get_model_guard
+from .singleflight import SingleFlight
 
 # --- Configuration (remains the same) ---
 logging.basicConfig(
@@ -11,8 +27,10 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# --- Constants (remains the same) ---
-API_URL = 'http://localhost:5200/poso'
+# --- Constants ---
+# The proxy location(s) can be overridden per deployment with GEMINI_API_URL or
+# GEMINI_API_URLS (see endpoints.py). API_URL is the primary endpoint.
+API_URL = DEFAULT_API_URLS[0]
 MODEL_LITE = "gemini-2.5-flash-lite-preview-09-2025"
 MODEL_FLASH = "gemini-2.5-flash-preview-09-2025"
 
@@ -20,37 +38,366 @@ MODEL_FLASH = "gemini-2.5-flash-preview-09-2025"
 def format_list_as_indexed_string(items: List[str]) -> str:
     return "\n".join(f"{i}. {info}" for i, info in enumerate(items))
 
+def _loads(json_str: str):
+    """json.loads, via orjson when it is installed (several times faster on large payloads)."""
+    if orjson is not None:
+        return orjson.loads(json_str)
+    return json.loads(json_str)
+
+_DECODER = json.JSONDecoder()
+_OPENERS = {'{': '}', '[': ']'}
+_MAX_RESCANS = 3  # Restarts after a span that never closes (e.g. a stray '{' in prose)
+# Only a bracket followed by something JSON can continue with starts a
+# candidate, so prose like "[sic]" or "{name}" is skipped without a parse.
+_CANDIDATE_RE = re.compile(r'\{\s*["}]|\[\s*[-"\d\[\]{tfn]')
+_STRUCTURAL_RE = re.compile(r'[{}\[\]"]')
+_STRING_TAIL_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+def _scan_json_candidates(text: str, start: int):
+    """
+    One pass of `_iter_json_candidates` from `start`. Returns the start of a
+    span left open at the end of the text, or -1.
+    """
+    stack = []          # expected closers of the open brackets
+    outer_start = -1
+    children = []       # closed spans directly inside the current outer span
+    child_start = -1
+    i = start
+    while True:
+        if not stack:
+            match = _CANDIDATE_RE.search(text, i)
+            if match is None:
+                return -1
+            outer_start, children = match.start(), []
+            stack.append(_OPENERS[text[outer_start]])
+            i = outer_start + 1
+            continue
+        match = _STRUCTURAL_RE.search(text, i)
+        if match is None:
+            break
+        ch, i = match.group(), match.end()
+        if ch == '"':
+            # Skip the string literal, escapes included.
+            string_end = _STRING_TAIL_RE.match(text, i)
+            if string_end is None:
+                break
+            i = string_end.end()
+        elif ch in _OPENERS:
+            if len(stack) == 1:
+                child_start = match.start()
+            stack.append(_OPENERS[ch])
+        elif ch != stack[-1]:
+            # Not JSON after all; give up on this span but keep its children.
+            stack = []
+            yield from children
+        else:
+            stack.pop()
+            if not stack:
+                yield text[outer_start:i]
+                yield from children
+            elif len(stack) == 1:
+                children.append(text[child_start:i])
+    yield from children
+    return outer_start
+
+def _iter_json_candidates(text: str):
+    """
+    Yields the substrings of `text` that could be a JSON object or array, in
+    order of their start position, without re-parsing from every bracket.
+
+    Outside a candidate, prose is skipped (quotes there are not strings).
+    Inside one, brackets are matched with a stack while string literals and
+    their escapes are skipped, so '{' or ']' inside a string don't count. A
+    closed top-level span is yielded first; its direct children follow as
+    fallbacks in case the outer span turns out not to be valid JSON (e.g.
+    prose wrapped around an object). A span still open at the end of the
+    text usually started at a stray bracket or quote, so scanning resumes
+    just after it, a bounded number of times. The work is therefore linear
+    in len(text), unlike trying `raw_decode` at every bracket.
+    """
+    start = 0
+    for _ in range(_MAX_RESCANS + 1):
+        unclosed = yield from _scan_json_candidates(text, start)
+        if unclosed < 0:
+            return
+        start = unclosed + 1
+
 def extract_json_from_text(text: str):
-    match = re.search(r"```json\s*([\s\S]*?)\s*```", text, re.DOTALL)
-    if match:
-        json_str = match.group(1)
+    # Same as matching ```json\s*(.*?)\s*``` but without the regex backtracking.
+    fence_start = text.find("```json")
+    fence_end = text.find("```", fence_start + 7) if fence_start != -1 else -1
+    if fence_end != -1:
+        json_str = text[fence_start + 7:fence_end].strip()
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
+            return _loads(json_str)
+        except ValueError as e:
             logging.error(f"JSON in markdown block failed to parse: {e}")
-    decoder = json.JSONDecoder()
-    idx = 0
-    while idx < len(text):
-        obj_start = -1
-        brace_start = text.find('{', idx)
-        bracket_start = text.find('[', idx)
-        if brace_start != -1 and bracket_start != -1:
-            obj_start = min(brace_start, bracket_start)
-        elif brace_start != -1:
-            obj_start = brace_start
-        elif bracket_start != -1:
-            obj_start = bracket_start
-        else:
-            break
+    # Usually the first candidate is the answer; let the C decoder try it in
+    # place before paying for the scan. Only once: a failed raw_decode costs
+    # O(position) just to build its error message.
+    first = _CANDIDATE_RE.search(text)
+    if first is None:
+        logging.warning("Could not find any valid JSON object in the response text.")
+        return None
+    try:
+        return _DECODER.raw_decode(text, first.start())[0]
+    except ValueError:
+        pass
+    for candidate in _iter_json_candidates(text):
         try:
-            result, _ = decoder.raw_decode(text, obj_start)
-            return result
-        except json.JSONDecodeError:
-            idx = obj_start + 1
+            return _loads(candidate)
+        except ValueError:
+            continue
     logging.warning("Could not find any valid JSON object in the response text.")
     return None
 
-# --- Core API Interaction (MODIFIED) ---
+# --- Shared Request/Response Helpers ---
+# Used by both the blocking client below and the async client in
+# `async_client.py`, so the two stay byte-for-byte compatible on the wire.
+
+# Magic bytes of the image formats the vision models accept.
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'GIF87a', 'image/gif', 'gif'),
+    (b'GIF89a', 'image/gif', 'gif'),
+)
+
+def _image_type(image: bytes):
+    """(MIME type, file extension) of an image, from its first bytes; JPEG if unknown."""
+    if image[:4] == b'RIFF' and image[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    for signature, mime, extension in _IMAGE_SIGNATURES:
+        if image.startswith(signature):
+            return mime, extension
+    return 'image/jpeg', 'jpg'
+
+def _build_request_kwargs(prompt: str, model: str, image: Optional[bytes] = None, stream: bool = False) -> Dict[str, Any]:
+    """
+    Builds the keyword arguments for the POST to the proxy. Sends JSON if no
+    image is provided, and multipart/form-data if an image is included (with
+    the MIME type read from the image's own bytes).
+    With `stream`, asks the proxy to send the answer back in chunks as the
+    model produces it; a proxy that ignores the flag just answers in one go.
+    The returned dict works with both `requests` and `httpx`.
+    """
+    payload = {"prompt": prompt, "model": model}
+    if stream:
+        payload["stream"] = True
+    if image:
+        # --- If an image exists, send as multipart/form-data ---
+        logging.info("Image detected, sending as multipart/form-data.")
+        # The key 'image' here must match the key your Flask app expects in request.files.
+        # The HTTP library sets the multipart 'Content-Type' header itself; do NOT set it manually.
+        mime, extension = _image_type(image)
+        return {
+            "data": payload,   # Text fields go here
+            "files": {'image': (f'image.{extension}', image, mime)},  # File data goes here
+        }
+    # --- If no image, send as JSON (original behavior) ---
+    logging.info("No image, sending as application/json.")
+    return {
+        "headers": {'Content-Type': 'application/json'},
+        "json": payload,
+    }
+
+def _parse_response_text(text: str, outjson: bool):
+    """
+    Turns the raw response body into the value returned to callers.
+    Raises ValueError if nothing usable could be extracted.
+    """
+    parsed_data = extract_json_from_text(text) if outjson else text
+    if not parsed_data:
+        raise ValueError("Response did not contain valid, extractable data.")
+    return parsed_data
+
+# --- Connection Pooling ---
+# A single session keeps TCP connections to the proxy alive between calls
+# instead of opening a new one for every request.
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+# --- Request Coalescing ---
+# Concurrent threads asking for the exact same request share one upstream call.
+_inflight = SingleFlight()
+
+def get_coalescing_stats() -> Dict[str, Any]:
+    """Counters for calls that were coalesced onto an identical in-flight request."""
+    from .async_client import get_default_async_client
+    return {"threads": _inflight.stats(), "async": get_default_async_client().coalescing_stats()}
+
+# --- Hedging ---
+# Hedged calls run on this pool so the caller can wait on whichever finishes first.
+# A losing call cannot be interrupted and keeps its worker until it finishes, so
+# work is only handed to the pool when a worker is free: it never queues there.
+HEDGE_WORKERS = 16
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="gemini-hedge")
+_hedge_workers_free = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+def _run_on_hedge_worker(*args) -> Optional[Future]:
+    """Starts `_request_with_retries(*args)` on a free hedge worker, or returns None if all are busy."""
+    if not _hedge_workers_free.acquire(blocking=False):
+        return None
+
+    def run():
+        try:
+            return _request_with_retries(*args)
+        finally:
+            _hedge_workers_free.release()
+    try:
+        return _hedge_executor.submit(run)
+    except BaseException:
+        _hedge_workers_free.release()
+        raise
+
+# --- Core API Interaction ---
+
+def _request_with_retries(
+    prompt: str,
+    model: str,
+    image: Optional[bytes],
+    max_retries: int,
+    initial_backoff: float,
+    timeout: int,
+    outjson: bool,
+    tried: Optional[set] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    The retry loop itself: one upstream call per attempt, no caching. Every
+    attempt waits for the process rate limit, if one is configured, then
+    passes through the model's circuit breaker and concurrency limit;
+    if either refuses, the call fails fast with None so callers drop straight
+    into their fallback responses. Attempts are routed over the endpoint
+    pool, and a network-level failure fails over to an untried endpoint
+    right away without using up a retry. `tried` may be shared with a
+    concurrent hedge so the two prefer different endpoints.
+    """
+    guard = get_model_guard(model)
+    pool = get_endpoint_pool()
+    limiter = get_rate_limiter()
+    tried = set() if tried is None else tried
+    backoff = initial_backoff
+    attempt = 0
+
+    while attempt < max_retries:
+        if limiter is not None:
+            limiter.acquire()
+        if not guard.enter():
+            return None
+
+        endpoint = pool.select(exclude=tried)
+        tried.add(endpoint.url)
+        logging.info(f"Attempt {attempt + 1}/{max_retries} to query API for model {model} via {endpoint.url}...")
+        started = time.monotonic()
+        healthy = False
+        try:
+            response = _get_session().post(
+                endpoint.url,
+                timeout=timeout,
+                **_build_request_kwargs(prompt, model, image)
+            )
+            response.raise_for_status()  # This will raise an HTTPError for bad responses (4xx or 5xx)
+            healthy = True
+
+            parsed_data = _parse_response_text(response.text, outjson)
+            logging.info("Successfully received and parsed API response.")
+            get_hedge_policy(model).observe(time.monotonic() - started)
+            return parsed_data
+
+        except requests.exceptions.RequestException as e:
+            logging.error(f"A network-related error occurred: {e}")
+            if pool.has_alternative(tried):
+                logging.info("Failing over to another endpoint.")
+                continue
+        except ValueError as e:
+            logging.error(f"A data-related error occurred: {e}")
+        finally:
+            latency = time.monotonic() - started
+            pool.release(endpoint, healthy, latency)
+            guard.exit(healthy, latency)
+
+        attempt += 1
+        if attempt < max_retries:
+            logging.info(f"Retrying in {backoff:.2f} seconds...")
+            time.sleep(backoff)
+            backoff *= 2
+        else:
+            logging.critical("All API query retries failed. Giving up.")
+
+    return None
+
+def _hedged_request(
+    prompt: str,
+    model: str,
+    image: Optional[bytes],
+    max_retries: int,
+    initial_backoff: float,
+    timeout: int,
+    outjson: bool
+) -> Optional[Dict[str, Any]]:
+    """
+    Runs the request and, if it has not answered by the model's hedge delay
+    (a high percentile of recent latency), sends a duplicate, preferably to
+    another endpoint. The first valid response wins. A blocking `requests`
+    call cannot be interrupted, so the losing call is abandoned: it finishes
+    in the background and its result is dropped. While abandoned calls keep
+    every hedge worker busy, requests run unhedged on the caller's thread
+    rather than waiting for a worker.
+    """
+    policy = get_hedge_policy(model)
+    delay = policy.delay()
+    started = time.monotonic()
+    args = (prompt, model, image, max_retries, initial_backoff, timeout, outjson)
+
+    if delay is None:
+        result = _request_with_retries(*args)
+        policy.record_call(time.monotonic() - started, hedge_won=False)
+        return result
+
+    tried = set()
+    primary = _run_on_hedge_worker(*args, tried)
+    if primary is None:
+        policy.record_no_worker()
+        result = _request_with_retries(*args, tried)
+        policy.record_call(time.monotonic() - started, hedge_won=False)
+        return result
+
+    futures = [primary]
+    done, _ = wait(futures, timeout=delay)
+    if not done and policy.try_start_hedge():
+        hedge = _run_on_hedge_worker(*args, tried)
+        if hedge is None:
+            policy.cancel_hedge()
+            policy.record_no_worker()
+        else:
+            logging.info(f"No answer from model {model} after {delay:.2f}s; sending a hedged request.")
+            futures.append(hedge)
+
+    result, winner = None, None
+    pending = set(futures)
+    while pending and winner is None:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            value = future.result()
+            if value is not None and winner is None:
+                result, winner = value, future
+    for future in pending:
+        future.cancel()
+
+    policy.record_call(time.monotonic() - started, hedge_won=len(futures) > 1 and winner is futures[1])
+    return result
 
 def query_api_with_retries(
     prompt: str,
@@ -59,7 +406,10 @@ def query_api_with_retries(
     max_retries: int = 1,
     initial_backoff: float = 1.0,
     timeout: int = 90,
-    outjson: bool = True
+    outjson: bool = True,
+    use_cache: bool = True,
+    coalesce: bool = True,
+    hedge: bool = False
 ) -> Optional[Dict[str, Any]]:
     """
     Posts a prompt and an optional image to the API. It sends JSON if no
@@ -74,66 +424,136 @@ def query_api_with_retries(
         initial_backoff: Initial wait time in seconds before the first retry.
         timeout: How many seconds to wait for the server to send data.
         outjson: Whether to parse the response as JSON.
+        use_cache: Whether to serve/store this request via the shared response cache.
+        coalesce: Whether to share an identical request already in flight on another thread.
+        hedge: Whether to send a duplicate request if this one is slow (for interactive calls).
 
     Returns:
         The parsed response as a dictionary or text, or None if all retries fail.
     """
-    backoff = initial_backoff
+    cache = get_response_cache() if use_cache else None
+    request_key = make_cache_key(model, prompt, image, outjson)
+    if cache is not None:
+        cached = cache.get(request_key)
+        if cached is not None:
+            logging.info(f"Serving cached API response for model {model}.")
+            return cached
 
-    for attempt in range(max_retries):
-        logging.info(f"Attempt {attempt + 1}/{max_retries} to query API for model {model}...")
-        try:
-            # Prepare the text-based payload
-            payload = {"prompt": prompt, "model": model}
-
-            if image:
-                # --- If an image exists, send as multipart/form-data ---
-                logging.info("Image detected, sending as multipart/form-data.")
-                # The key 'image' here must match the key your Flask app expects in request.files
-                files = {'image': ('image.jpg', image, 'image/jpeg')}
-
-                # When using 'files', 'requests' automatically sets the correct
-                # 'Content-Type' header. Do NOT set it manually.
-                response = requests.post(
-                    API_URL,
-                    data=payload,   # Text fields go here
-                    files=files,    # File data goes here
-                    timeout=timeout
-                )
-            else:
-                # --- If no image, send as JSON (original behavior) ---
-                logging.info("No image, sending as application/json.")
-                headers = {'Content-Type': 'application/json'}
-                response = requests.post(
-                    API_URL,
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout
-                )
+    def fetch():
+        request = _hedged_request if hedge else _request_with_retries
+        parsed_data = request(prompt, model, image, max_retries, initial_backoff, timeout, outjson)
+        if cache is not None:
+            cache.set(request_key, parsed_data)
+        return parsed_data
 
-            response.raise_for_status()  # This will raise an HTTPError for bad responses (4xx or 5xx)
+    if coalesce:
+        return _inflight.do(request_key, fetch)
+    return fetch()
 
-            if outjson:
-                parsed_data = extract_json_from_text(response.text)
-            else:
-                parsed_data = response.text
+# --- Streaming ---
 
-            if parsed_data:
-                logging.info("Successfully received and parsed API response.")
-                return parsed_data
-            else:
-                raise ValueError("Response did not contain valid, extractable data.")
+def stream_query_api(
+    prompt: str,
+    model: str,
+    image: Optional[bytes] = None,
+    max_retries: int = 1,
+    initial_backoff: float = 1.0,
+    timeout: int = 90,
+    use_cache: bool = True
+) -> Iterator[str]:
+    """
+    Posts a prompt like `query_api_with_retries` (plain text, `outjson=False`)
+    but yields the answer in pieces as the proxy sends them, so callers can
+    show the first words long before the model has finished.
+
+    Retries and endpoint failover only happen before the first piece has been
+    yielded; a connection lost mid-answer raises, since the caller has already
+    used part of it. Yields nothing if every attempt fails or the model's
+    circuit is open. A complete answer is stored in the response cache under
+    the same key as the non-streaming call, and a cached answer is yielded as
+    a single piece. Closing the generator early ends the upstream request.
+    """
+    cache = get_response_cache() if use_cache else None
+    request_key = make_cache_key(model, prompt, image, False)
+    if cache is not None:
+        cached = cache.get(request_key)
+        if cached is not None:
+            logging.info(f"Serving cached API response for model {model}.")
+            yield cached
+            return
+
+    guard = get_model_guard(model)
+    pool = get_endpoint_pool()
+    limiter = get_rate_limiter()
+    tried = set()
+    backoff = initial_backoff
+    attempt = 0
+
+    while attempt < max_retries:
+        if limiter is not None:
+            limiter.acquire()
+        if not guard.enter():
+            return
+
+        endpoint = pool.select(exclude=tried)
+        tried.add(endpoint.url)
+        logging.info(f"Attempt {attempt + 1}/{max_retries} to stream API response for model {model} via {endpoint.url}...")
+        started = time.monotonic()
+        healthy = False
+        abandoned = False
+        pieces = []
+        try:
+            with _get_session().post(
+                endpoint.url,
+                timeout=timeout,
+                stream=True,
+                **_build_request_kwargs(prompt, model, image, stream=True)
+            ) as response:
+                response.raise_for_status()
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                for raw in response.iter_content(chunk_size=None):
+                    text = decoder.decode(raw)
+                    if text:
+                        pieces.append(text)
+                        yield text
+                text = decoder.decode(b'', final=True)
+                if text:
+                    pieces.append(text)
+                    yield text
+            healthy = True
 
+        except GeneratorExit:
+            abandoned = True
+            raise
         except requests.exceptions.RequestException as e:
-            logging.error(f"A network-related error occurred: {e}")
-        except ValueError as e:
-            logging.error(f"A data-related error occurred: {e}")
+            logging.error(f"A network-related error occurred while streaming: {e}")
+            if pieces:
+                raise
+            if pool.has_alternative(tried):
+                logging.info("Failing over to another endpoint.")
+                continue
+        finally:
+            if abandoned:
+                # The caller stopped reading; says nothing about the endpoint.
+                pool.abandon(endpoint)
+                guard.abandon()
+            else:
+                latency = time.monotonic() - started
+                pool.release(endpoint, healthy, latency)
+                guard.exit(healthy, latency)
+
+        if pieces:
+            logging.info("Successfully streamed API response.")
+            if cache is not None:
+                cache.set(request_key, "".join(pieces))
+            return
+        if healthy:
+            logging.error("A data-related error occurred: the streamed response was empty.")
 
-        if attempt < max_retries - 1:
+        attempt += 1
+        if attempt < max_retries:
             logging.info(f"Retrying in {backoff:.2f} seconds...")
             time.sleep(backoff)
             backoff *= 2
         else:
             logging.critical("All API query retries failed. Giving up.")
-
-    return None
\ No newline at end of file
@@ -0,0 +1,211 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+# --- Defaults ---
+# Comma-separated list of proxy URLs; falls back to the single GEMINI_API_URL.
+DEFAULT_API_URLS = [
+    url.strip() for url in
+    os.environ.get('GEMINI_API_URLS', os.environ.get('GEMINI_API_URL', 'http://localhost:5200/poso')).split(',')
+    if url.strip()
+]
+LEAST_OUTSTANDING = "least_outstanding"
+LATENCY_WEIGHTED = "latency_weighted"
+EJECT_AFTER_FAILURES = 3           # Consecutive failures before an endpoint is ejected
+BASE_EJECTION_SECONDS = 10.0       # Doubles with every repeated ejection...
+MAX_EJECTION_SECONDS = 120.0       # ...up to this cap
+HEALTH_CHECK_INTERVAL = 5.0
+HEALTH_CHECK_TIMEOUT = 2.0
+
+
+class Endpoint:
+    """Live bookkeeping for one proxy URL."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.requests = 0
+        self.failures = 0
+
+    def is_ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": not self.is_ejected(now),
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+        }
+
+
+class EndpointPool:
+    """
+    Spreads requests over several proxy endpoints.
+
+    Selection is either least-outstanding-requests (ties broken by smoothed
+    latency) or latency-weighted random choice. An endpoint that fails
+    `eject_after` times in a row is ejected for an exponentially growing
+    period; a background health checker probes ejected endpoints and brings
+    them back early once they answer again. If every endpoint is ejected the
+    pool still hands out the one due back soonest rather than nothing.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        strategy: str = LEAST_OUTSTANDING,
+        eject_after: int = EJECT_AFTER_FAILURES,
+        base_ejection_seconds: float = BASE_EJECTION_SECONDS,
+        max_ejection_seconds: float = MAX_EJECTION_SECONDS,
+        health_check_interval: float = HEALTH_CHECK_INTERVAL,
+    ):
+        self.endpoints: List[Endpoint] = [Endpoint(url) for url in urls]
+        if not self.endpoints:
+            raise ValueError("EndpointPool needs at least one URL.")
+        if strategy not in (LEAST_OUTSTANDING, LATENCY_WEIGHTED):
+            raise ValueError(f"Unknown endpoint selection strategy: {strategy}")
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.base_ejection_seconds = base_ejection_seconds
+        self.max_ejection_seconds = max_ejection_seconds
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._checker: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    # --- Selection ---
+    def select(self, exclude: Iterable[str] = ()) -> Endpoint:
+        """Picks an endpoint and counts the request as outstanding on it."""
+        exclude = set(exclude)
+        now = time.monotonic()
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if not ep.is_ejected(now) and ep.url not in exclude]
+            if not candidates:
+                candidates = [ep for ep in self.endpoints if not ep.is_ejected(now)] or \
+                             [min(self.endpoints, key=lambda ep: ep.ejected_until)]
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            elif self.strategy == LATENCY_WEIGHTED:
+                chosen = self._pick_latency_weighted(candidates)
+            else:
+                chosen = min(candidates, key=lambda ep: (ep.outstanding, ep.ewma_latency or 0.0))
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    @staticmethod
+    def _pick_latency_weighted(candidates: List[Endpoint]) -> Endpoint:
+        known = [ep.ewma_latency for ep in candidates if ep.ewma_latency]
+        default_latency = sum(known) / len(known) if known else 1.0
+        weights = [1.0 / ((ep.ewma_latency or default_latency) * (ep.outstanding + 1)) for ep in candidates]
+        return random.choices(candidates, weights=weights, k=1)[0]
+
+    def has_alternative(self, exclude: Iterable[str]) -> bool:
+        """True if a healthy endpoint outside `exclude` is available for failover."""
+        exclude = set(exclude)
+        now = time.monotonic()
+        with self._lock:
+            return any(not ep.is_ejected(now) and ep.url not in exclude for ep in self.endpoints)
+
+    # --- Outcome tracking ---
+    def release(self, endpoint: Endpoint, ok: bool, latency: float) -> None:
+        start_checker = False
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.ewma_latency = latency if endpoint.ewma_latency is None \
+                    else 0.8 * endpoint.ewma_latency + 0.2 * latency
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.eject_after and len(self.endpoints) > 1:
+                self._eject(endpoint)
+                start_checker = True
+        if start_checker:
+            self._ensure_health_checker()
+
+    def abandon(self, endpoint: Endpoint) -> None:
+        """Ends a request we cancelled ourselves; says nothing about the endpoint's health."""
+        with self._lock:
+            endpoint.outstanding -= 1
+
+    def _eject(self, endpoint: Endpoint) -> None:
+        duration = min(self.max_ejection_seconds, self.base_ejection_seconds * (2 ** endpoint.ejections))
+        endpoint.ejections += 1
+        endpoint.consecutive_failures = 0
+        endpoint.ejected_until = time.monotonic() + duration
+        logging.warning(f"Ejecting endpoint {endpoint.url} for {duration:.0f}s after repeated failures.")
+
+    def _readmit(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            if endpoint.ejected_until:
+                logging.info(f"Endpoint {endpoint.url} passed its health check; readmitting.")
+            endpoint.ejected_until = 0.0
+            endpoint.consecutive_failures = 0
+
+    # --- Active health checks ---
+    def health_check(self) -> None:
+        """Probes every ejected endpoint once; any non-5xx answer readmits it."""
+        now = time.monotonic()
+        for endpoint in [ep for ep in self.endpoints if ep.is_ejected(now)]:
+            try:
+                response = requests.get(endpoint.url, timeout=HEALTH_CHECK_TIMEOUT)
+            except requests.exceptions.RequestException:
+                continue
+            if response.status_code < 500:
+                self._readmit(endpoint)
+
+    def _ensure_health_checker(self) -> None:
+        with self._lock:
+            if self._checker is not None and self._checker.is_alive():
+                return
+            self._checker = threading.Thread(target=self._run_health_checks, name="gemini-endpoint-health", daemon=True)
+            self._checker.start()
+
+    def _run_health_checks(self) -> None:
+        # Runs only while something is ejected; restarted on the next ejection.
+        while True:
+            time.sleep(self.health_check_interval)
+            self.health_check()
+            now = time.monotonic()
+            with self._lock:
+                if not any(ep.is_ejected(now) for ep in self.endpoints):
+                    self._checker = None
+                    return
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [ep.stats(now) for ep in self.endpoints]
+
+
+# --- Shared Default Pool ---
+_endpoint_pool = EndpointPool(DEFAULT_API_URLS)
+
+def get_endpoint_pool() -> EndpointPool:
+    return _endpoint_pool
+
+def configure_endpoints(urls: Iterable[str], strategy: str = LEAST_OUTSTANDING, **kwargs) -> EndpointPool:
+    """Replaces the shared pool, e.g. to add proxy processes during class sessions."""
+    global _endpoint_pool
+    _endpoint_pool = EndpointPool(urls, strategy=strategy, **kwargs)
+    return _endpoint_pool
+
+def get_endpoint_stats() -> List[Dict[str, Any]]:
+    return _endpoint_pool.stats()
@@ -0,0 +1,118 @@
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+# --- Defaults ---
+HEDGE_PERCENTILE = 95.0      # Send the duplicate once a call is slower than this share of recent calls
+HEDGE_MIN_SAMPLES = 20       # No hedging until this many latencies have been observed
+HEDGE_MIN_DELAY = 0.05       # Never hedge sooner than this (seconds)
+HEDGE_MAX_RATIO = 0.1        # At most this share of hedge-enabled calls may send a duplicate
+LATENCY_WINDOW = 500         # Recent latencies kept per model
+
+
+def _percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class HedgePolicy:
+    """
+    Decides when a hedge-enabled call to one model sends a duplicate request,
+    and keeps the numbers needed to judge whether hedging pays off.
+
+    `observe` is fed the latency of every successful upstream attempt, hedged
+    or not; this distribution is the "before" picture and also sets the hedge
+    delay. `record_call` is fed the end-to-end latency of hedge-enabled calls,
+    i.e. the latency users actually saw ("after").
+    """
+
+    def __init__(
+        self,
+        model: str,
+        percentile: float = HEDGE_PERCENTILE,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        min_delay: float = HEDGE_MIN_DELAY,
+        max_ratio: float = HEDGE_MAX_RATIO,
+    ):
+        self.model = model
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self._lock = threading.Lock()
+        self._attempt_latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._call_latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.no_worker = 0
+
+    def observe(self, latency: float) -> None:
+        with self._lock:
+            self._attempt_latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little history."""
+        with self._lock:
+            if len(self._attempt_latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, _percentile(self._attempt_latencies, self.percentile))
+
+    def try_start_hedge(self) -> bool:
+        """Claims hedge budget; False if hedging now would exceed `max_ratio`."""
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * (self.calls + 1):
+                return False
+            self.hedged += 1
+            return True
+
+    def cancel_hedge(self) -> None:
+        """Returns budget claimed by `try_start_hedge` for a hedge that was not sent after all."""
+        with self._lock:
+            self.hedged -= 1
+
+    def record_no_worker(self) -> None:
+        """Counts a call that ran, or a hedge that was skipped, because every hedge worker was busy."""
+        with self._lock:
+            self.no_worker += 1
+
+    def record_call(self, latency: float, hedge_won: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            if hedge_won:
+                self.hedge_wins += 1
+            self._call_latencies.append(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "no_worker": self.no_worker,
+                "hedge_delay": (max(self.min_delay, _percentile(self._attempt_latencies, self.percentile))
+                                if len(self._attempt_latencies) >= self.min_samples else None),
+                "p50_unhedged": _percentile(self._attempt_latencies, 50),
+                "p99_unhedged": _percentile(self._attempt_latencies, 99),
+                "p50_hedged": _percentile(self._call_latencies, 50),
+                "p99_hedged": _percentile(self._call_latencies, 99),
+            }
+
+
+# --- Per-Model Registry ---
+_policies: Dict[str, HedgePolicy] = {}
+_policies_lock = threading.Lock()
+
+def get_hedge_policy(model: str) -> HedgePolicy:
+    policy = _policies.get(model)
+    if policy is None:
+        with _policies_lock:
+            policy = _policies.setdefault(model, HedgePolicy(model))
+    return policy
+
+def get_hedging_stats() -> Dict[str, Any]:
+    """Hedge counts and unhedged-vs-hedged latency percentiles per model."""
+    return {model: policy.stats() for model, policy in list(_policies.items())}
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# --- Defaults (overridable per deployment) ---
+# Unset means no limit; batch jobs set one so they cannot flood the proxy.
+DEFAULT_RATE_PER_MINUTE = float(os.environ.get('GEMINI_RATE_LIMIT_PER_MINUTE', '0')) or None
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread of the process: at most
+    `rate_per_minute` upstream calls per minute on average, with bursts of up
+    to `burst` calls. Callers over the rate wait for a token instead of failing.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = float(burst if burst is not None else max(1, int(rate_per_minute // 60)))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._acquired = 0
+        self._waited = 0
+        self._wait_seconds = 0.0
+
+    def _take(self, waited: float) -> Optional[float]:
+        """Takes one token if available (returns None), else returns how long to wait for one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self._acquired += 1
+                if waited:
+                    self._waited += 1
+                    self._wait_seconds += waited
+                return None
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Takes one token, sleeping until one is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            delay = self._take(waited)
+            if delay is None:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self) -> float:
+        """Like `acquire`, but waits without blocking the event loop."""
+        waited = 0.0
+        while True:
+            delay = self._take(waited)
+            if delay is None:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate_per_minute": self.rate * 60.0,
+                "burst": self.burst,
+                "acquired": self._acquired,
+                "waited": self._waited,
+                "wait_seconds": round(self._wait_seconds, 3),
+            }
+
+
+# --- Shared Default Limiter ---
+_rate_limiter: Optional[RateLimiter] = RateLimiter(DEFAULT_RATE_PER_MINUTE) if DEFAULT_RATE_PER_MINUTE else None
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Returns the limiter applied to upstream calls, sync and async, or None if unlimited."""
+    return _rate_limiter
+
+def configure_rate_limit(rate_per_minute: Optional[float], burst: Optional[int] = None) -> Optional[RateLimiter]:
+    """Limits the process's upstream calls to `rate_per_minute` (None or 0 removes the limit)."""
+    global _rate_limiter
+    _rate_limiter = RateLimiter(rate_per_minute, burst) if rate_per_minute else None
+    logging.info(f"Upstream rate limit: {f'{rate_per_minute:g}/min' if rate_per_minute else 'off'}")
+    return _rate_limiter
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    if _rate_limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **_rate_limiter.stats()}
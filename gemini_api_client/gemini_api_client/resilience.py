@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# --- Circuit Breaker Defaults ---
+BREAKER_WINDOW_SECONDS = 60.0      # Outcomes older than this are forgotten
+BREAKER_MIN_CALLS = 10             # Don't judge a model on fewer calls than this
+BREAKER_FAILURE_RATE = 0.5         # Trip when this share of calls fail...
+BREAKER_SLOW_CALL_SECONDS = 30.0   # ...or when calls slower than this...
+BREAKER_SLOW_CALL_RATE = 0.5       # ...make up this share of the window
+BREAKER_OPEN_SECONDS = 30.0        # How long to fail fast before probing again
+
+# --- Adaptive Concurrency Limit Defaults (overridable per deployment) ---
+# Sized for a class of ~30 students sending a chat turn at once: two calls
+# per turn on one model. Overload cuts the limit quickly, so starting high
+# costs little.
+LIMIT_INITIAL = int(os.environ.get('GEMINI_CONCURRENCY_LIMIT', '32'))
+LIMIT_MIN = 2
+LIMIT_MAX = 128
+LIMIT_BACKOFF_RATIO = 0.7          # Multiplicative decrease on failure / latency spike
+LIMIT_LATENCY_TOLERANCE = 3.0      # A call is a "spike" above this multiple of the baseline
+LIMIT_QUEUE_TIMEOUT = float(os.environ.get('GEMINI_QUEUE_TIMEOUT', '10'))  # Max seconds a call waits for a free slot
+
+
+class CircuitBreaker:
+    """
+    Tracks call outcomes and latencies over a sliding time window.
+
+    closed    -> calls flow; trips to open when the failure or slow-call rate
+                 crosses its threshold.
+    open      -> calls are rejected immediately for `open_seconds`.
+    half_open -> a single trial call is let through; success closes the
+                 breaker, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = BREAKER_WINDOW_SECONDS,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate: float = BREAKER_SLOW_CALL_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque()  # (timestamp, ok, slow)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.rejected = 0
+        self.trips = 0
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool, latency: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                if ok:
+                    logging.info(f"Circuit for {self.name} closed after a successful trial call.")
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip(now)
+                return
+
+            self._outcomes.append((now, ok, latency >= self.slow_call_seconds))
+            self._prune(now)
+            total = len(self._outcomes)
+            if state != self.CLOSED or total < self.min_calls:
+                return
+            failures = sum(1 for _, good, _ in self._outcomes if not good)
+            slow = sum(1 for _, _, is_slow in self._outcomes if is_slow)
+            if failures / total >= self.failure_rate or slow / total >= self.slow_call_rate:
+                self._trip(now)
+
+    def cancel_trial(self) -> None:
+        """Gives back a half-open trial slot for a call that never ran."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _trip(self, now: float) -> None:
+        logging.warning(f"Circuit for {self.name} opened; failing fast for {self.open_seconds:.0f}s.")
+        self._state = self.OPEN
+        self._opened_at = now
+        self._trial_in_flight = False
+        self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, good, _ in self._outcomes if not good)
+            slow = sum(1 for _, _, is_slow in self._outcomes if is_slow)
+            return {
+                "state": self._current_state(now),
+                "window_calls": total,
+                "failure_rate": failures / total if total else 0.0,
+                "slow_call_rate": slow / total if total else 0.0,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: the number of in-flight calls allowed grows by
+    roughly one per "full" round of successful calls (additive increase) and
+    is cut by `backoff_ratio` whenever a call fails or its latency spikes
+    above `latency_tolerance` times the smoothed baseline (multiplicative
+    decrease). Usable from threads and from event loops at the same time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = LIMIT_INITIAL,
+        min_limit: int = LIMIT_MIN,
+        max_limit: int = LIMIT_MAX,
+        backoff_ratio: float = LIMIT_BACKOFF_RATIO,
+        latency_tolerance: float = LIMIT_LATENCY_TOLERANCE,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._baseline: Optional[float] = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters: deque = deque()  # (loop, future)
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _try_acquire_locked(self) -> bool:
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def acquire(self, timeout: float = LIMIT_QUEUE_TIMEOUT) -> bool:
+        """Blocks until a slot is free; returns False if none frees up in time."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._try_acquire_locked():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    async def acquire_async(self, timeout: float = LIMIT_QUEUE_TIMEOUT) -> bool:
+        """Event-loop version of `acquire`; waits without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._lock:
+                if self._try_acquire_locked():
+                    return True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self, ok: bool, latency: float, adjust: bool = True) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if adjust:
+                self._adjust(ok, latency)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, deque()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _adjust(self, ok: bool, latency: float) -> None:
+        spiked = self._baseline is not None and latency > self._baseline * self.latency_tolerance
+        if ok:
+            # Smoothed baseline of healthy latencies.
+            self._baseline = latency if self._baseline is None else 0.9 * self._baseline + 0.1 * latency
+        if not ok or spiked:
+            self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+        elif self._in_flight + 1 >= int(self._limit) // 2:
+            # Only grow while the limit is actually being used.
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "baseline_latency": self._baseline,
+                "rejected": self.rejected,
+            }
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelGuard:
+    """The circuit breaker and concurrency limiter guarding calls to one model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.breaker = CircuitBreaker(model)
+        self.limiter = AdaptiveLimiter(model)
+
+    def _admit(self) -> bool:
+        if not self.breaker.allow_request():
+            logging.warning(f"Circuit open for model {self.model}; failing fast.")
+            return False
+        return True
+
+    def enter(self, timeout: float = LIMIT_QUEUE_TIMEOUT) -> bool:
+        """Admits a blocking call. Must be paired with `exit` when True."""
+        if not self._admit():
+            return False
+        if not self.limiter.acquire(timeout):
+            logging.warning(f"Concurrency limit reached for model {self.model}; shedding request.")
+            self.breaker.cancel_trial()
+            return False
+        return True
+
+    async def enter_async(self, timeout: float = LIMIT_QUEUE_TIMEOUT) -> bool:
+        """Admits a non-blocking call. Must be paired with `exit` when True."""
+        if not self._admit():
+            return False
+        if not await self.limiter.acquire_async(timeout):
+            logging.warning(f"Concurrency limit reached for model {self.model}; shedding request.")
+            self.breaker.cancel_trial()
+            return False
+        return True
+
+    def exit(self, ok: bool, latency: float) -> None:
+        self.limiter.release(ok, latency)
+        self.breaker.record(ok, latency)
+
+    def abandon(self) -> None:
+        """Frees the slot of a call cancelled by us (e.g. a losing hedge) without judging it."""
+        self.limiter.release(True, 0.0, adjust=False)
+        self.breaker.cancel_trial()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.stats(), "limiter": self.limiter.stats()}
+
+
+# --- Per-Model Registry ---
+_guards: Dict[str, ModelGuard] = {}
+_guards_lock = threading.Lock()
+
+def get_model_guard(model: str) -> ModelGuard:
+    guard = _guards.get(model)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(model, ModelGuard(model))
+    return guard
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """Breaker state and concurrency limit for every model seen so far."""
+    return {model: guard.stats() for model, guard in list(_guards.items())}
@@ -0,0 +1,96 @@
+import asyncio
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls across threads: while a call for a key is in
+    flight, other callers with the same key wait for it and get its result
+    (or its exception) instead of starting their own.
+
+    Followers receive a deep copy, so no two callers share a mutable result.
+    """
+
+    class _Call:
+        __slots__ = ("event", "result", "error")
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "SingleFlight._Call"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = SingleFlight._Call()
+                self.leaders += 1
+                is_leader = True
+            else:
+                self.coalesced += 1
+                is_leader = False
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    The event-loop counterpart of `SingleFlight`. The shared call runs as its
+    own task, so a caller that gets cancelled (e.g. a client disconnect)
+    does not cancel the work the remaining callers are waiting on.
+    """
+
+    def __init__(self):
+        self._calls: Dict[tuple, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Tasks are bound to a loop, so scope keys by loop as well.
+        loop_key = (id(asyncio.get_running_loop()), key)
+        task = self._calls.get(loop_key)
+        if task is not None:
+            self.coalesced += 1
+            return copy.deepcopy(await asyncio.shield(task))
+
+        self.leaders += 1
+        task = asyncio.ensure_future(fn())
+        self._calls[loop_key] = task
+        task.add_done_callback(lambda t: self._finish(loop_key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, loop_key: tuple, task: asyncio.Task) -> None:
+        if self._calls.get(loop_key) is task:
+            del self._calls[loop_key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller went away.
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}